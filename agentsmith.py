@@ -0,0 +1,19 @@
+"""
+AgentSmith - Command line entry point
+
+    python agentsmith.py --help
+    python agentsmith.py triage --since 2d --dry-run
+
+See src/cli.py for the commands and their options.
+"""
+
+import os
+import sys
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from cli import main
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""
+Offline Benchmarks - Measure the agent without real accounts
+
+Runs GmailHelper, EmailAgent and the web GUI against in-process fakes
+(see fakes.py) and reports, for each benchmark:
+
+- throughput (messages per second)
+- p50 / p95 / p99 latency per operation
+- Gmail and Anthropic API call counts
+- peak Python memory
+
+Usage:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --mailbox-size 5000 --emails 500 \\
+        --gmail-latency 0.05 --model-latency 0.8 --error-rate 0.01
+    python benchmarks/run_benchmarks.py --only process_inbox --json results.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, ROOT)
+
+from fakes import FakeAnthropic, FakeGmailService  # noqa: E402
+from gmail_helper import GmailHelper  # noqa: E402
+from agent import EmailAgent  # noqa: E402
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class BenchmarkRun:
+    """Collects timings for one benchmark."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: Dict[str, List[float]] = {}
+        self.messages = 0
+        self.elapsed = 0.0
+        self.peak_memory = 0
+        self.api_calls: Dict[str, int] = {}
+
+    @contextlib.contextmanager
+    def stage(self, stage: str):
+        """Time one operation of the given stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.latencies.setdefault(stage, []).append(time.perf_counter() - start)
+
+    def report(self) -> Dict:
+        return {
+            'name': self.name,
+            'messages': self.messages,
+            'seconds': round(self.elapsed, 4),
+            'messages_per_second': round(self.messages / self.elapsed, 1) if self.elapsed else 0,
+            'peak_memory_mb': round(self.peak_memory / 1e6, 2),
+            'stages': {
+                stage: {
+                    'count': len(values),
+                    'p50_ms': round(percentile(values, 50) * 1000, 2),
+                    'p95_ms': round(percentile(values, 95) * 1000, 2),
+                    'p99_ms': round(percentile(values, 99) * 1000, 2),
+                    'mean_ms': round(statistics.fmean(values) * 1000, 2),
+                }
+                for stage, values in self.latencies.items()
+            },
+            'api_calls': self.api_calls,
+        }
+
+
+class Benchmarks:
+    """The benchmark scenarios, each run against fresh fakes."""
+
+    def __init__(self, args):
+        self.args = args
+
+    def make_agent(self) -> EmailAgent:
+        args = self.args
+        service = FakeGmailService(mailbox_size=args.mailbox_size, latency=args.gmail_latency,
+                                   error_rate=args.error_rate, seed=args.seed)
+        client = FakeAnthropic(latency=args.model_latency, error_rate=args.error_rate,
+                               seed=args.seed)
+        gmail = GmailHelper(service=service)
+        agent = EmailAgent(api_key='fake-key', gmail=gmail, client=client)
+        if args.concurrency:
+            agent.pipeline_workers = {'fetch': 2 * args.concurrency, 'analyze': args.concurrency}
+        return agent
+
+    def run(self, name: str, scenario: Callable[[EmailAgent, BenchmarkRun], None]) -> Dict:
+        agent = self.make_agent()
+        run = BenchmarkRun(name)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        # The agent prints progress for every email - keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            scenario(agent, run)
+        run.elapsed = time.perf_counter() - start
+        run.peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        service, client = agent.gmail.service, agent.client
+        run.api_calls = dict(sorted(service.calls.items()))
+        run.api_calls['anthropic.messages.create'] = client.calls
+        run.api_calls['anthropic.input_tokens'] = client.input_tokens
+        run.api_calls['anthropic.output_tokens'] = client.output_tokens
+        for call, times in service.call_times.items():
+            run.latencies[f"gmail:{call}"] = times
+        if client.call_times:
+            run.latencies['anthropic:messages.create'] = client.call_times
+        return run.report()
+
+    # Scenarios
+
+    def get_recent_emails(self, agent: EmailAgent, run: BenchmarkRun):
+        for _ in range(self.args.repeat):
+            with run.stage('get_recent_emails'):
+                emails = agent.gmail.get_recent_emails(max_results=self.args.emails)
+            run.messages += len(emails)
+
+    def analyze_email(self, agent: EmailAgent, run: BenchmarkRun):
+        emails = agent.gmail.get_recent_emails(max_results=self.args.emails)
+        agent.gmail.service.calls.clear()
+        agent.gmail.service.call_times.clear()
+        for email in emails:
+            with run.stage('analyze_email'):
+                agent.analyze_email(email)
+            run.messages += 1
+
+    def process_inbox(self, agent: EmailAgent, run: BenchmarkRun):
+        for _ in range(self.args.repeat):
+            with run.stage('process_inbox'):
+                results = agent.process_inbox(max_emails=self.args.emails, auto_apply=True)
+            run.messages += len(results)
+
+    def web_gui(self, agent: EmailAgent, run: BenchmarkRun):
+        import web_gui
+
+        from draft_cache import DraftCache, ReplyDrafter
+
+        web_gui.agent = agent
+        web_gui.drafter = ReplyDrafter(agent, DraftCache(path=None))
+        client = web_gui.app.test_client()
+        headers = {'Accept-Encoding': 'gzip'}
+
+        with run.stage('POST /api/fetch_emails'):
+            response = client.post('/api/fetch_emails', json={'max_emails': self.args.emails})
+        ids = [e['id'] for e in response.get_json()['emails']]
+
+        with run.stage('POST /api/analyze_all'):
+            response = client.post('/api/analyze_all')
+        run.messages += len(ids)
+
+        # Open the replies of emails needing action (drafted in the background)
+        for result in response.get_json().get('results', []):
+            if not result['analysis'].get('action_needed'):
+                continue
+            email_id = result['email_id']
+            with run.stage('GET /api/draft'):
+                client.get(f'/api/draft/{email_id}?wait=1')
+
+        # Simulate idle dashboards polling: first request, then revalidation
+        etags = {}
+        for _ in range(self.args.repeat):
+            for path in ['/api/stats', '/api/prompts', '/api/prompt/email_analysis'] + \
+                        [f'/api/email/{i}' for i in ids]:
+                request_headers = dict(headers)
+                if path in etags:
+                    request_headers['If-None-Match'] = etags[path]
+                stage = f"GET {path.rsplit('/', 1)[0] if path.startswith('/api/email/') else path}"
+                with run.stage(stage):
+                    response = client.get(path, headers=request_headers)
+                if response.headers.get('ETag'):
+                    etags[path] = response.headers['ETag']
+
+        web_gui.drafter.close()
+        web_gui.agent = web_gui.drafter = None
+
+
+SCENARIOS = ['get_recent_emails', 'analyze_email', 'process_inbox', 'web_gui']
+
+
+def print_report(report: Dict):
+    print(f"\n=== {report['name']} ===")
+    print(f"messages: {report['messages']}  time: {report['seconds']}s  "
+          f"throughput: {report['messages_per_second']} msg/s  "
+          f"peak memory: {report['peak_memory_mb']} MB")
+    print(f"  {'stage':<36} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, stats in report['stages'].items():
+        print(f"  {stage:<36} {stats['count']:>6} {stats['p50_ms']:>9} "
+              f"{stats['p95_ms']:>9} {stats['p99_ms']:>9}")
+    print("  API calls: " + ", ".join(f"{k}={v}" for k, v in report['api_calls'].items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run offline AgentSmith benchmarks")
+    parser.add_argument('--mailbox-size', type=int, default=1000,
+                        help="Messages in the fake mailbox (default: 1000)")
+    parser.add_argument('--emails', type=int, default=100,
+                        help="Emails fetched/processed per run (default: 100)")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Repetitions of repeatable scenarios (default: 3)")
+    parser.add_argument('--gmail-latency', type=float, default=0.0,
+                        help="Mean seconds per Gmail call (default: 0)")
+    parser.add_argument('--model-latency', type=float, default=0.0,
+                        help="Mean seconds per Anthropic call (default: 0)")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="Probability that a fake call fails (default: 0)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument('--concurrency', type=int, default=0,
+                        help="Concurrent analyses in process_inbox (fetching uses twice as "
+                             "many threads; default: the agent's own settings)")
+    parser.add_argument('--only', choices=SCENARIOS, action='append',
+                        help="Run only this scenario (repeatable)")
+    parser.add_argument('--json', metavar='FILE', help="Also write results as JSON")
+    args = parser.parse_args(argv)
+
+    benchmarks = Benchmarks(args)
+    reports = []
+    for name in args.only or SCENARIOS:
+        if name == 'web_gui':
+            try:
+                import flask  # noqa: F401
+            except ImportError:
+                print("\n(skipping web_gui: Flask is not installed)")
+                continue
+        report = benchmarks.run(name, getattr(benchmarks, name))
+        print_report(report)
+        reports.append(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': vars(args), 'results': reports}, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    return reports
+
+
+if __name__ == '__main__':
+    main()
@@ -18,6 +18,7 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from agent import EmailAgent
+import metrics
 
 
 def main():
@@ -141,3 +142,4 @@ def main():
 
 if __name__ == '__main__':
     main()
+    metrics.print_summary()
@@ -8,6 +8,13 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from agent import EmailAgent
+from analysis_memo import AnalysisMemo
+from sender_profiles import SenderProfileStore
+from journal import Journal
+import metrics
+
+# Progress is journaled here, so an interrupted run picks up where it stopped
+JOURNAL_FILE = os.path.join('.cache', 'auto_label_30.journal')
 
 
 def main():
@@ -25,9 +32,16 @@ def main():
     try:
         # Create agent
         print("\n📡 Connecting...")
-        agent = EmailAgent()
+        # Recurring newsletters/receipts reuse earlier analyses, and predictable
+        # senders are classified from their history (analysis_memo.py, sender_profiles.py)
+        agent = EmailAgent(memo=AnalysisMemo(), profiles=SenderProfileStore())
         print("✅ Connected!\n")
 
+        journal = Journal(JOURNAL_FILE)
+        resumed = journal.replay(agent.apply_action)
+        if resumed:
+            print(f"🔁 Finished {len(resumed)} email(s) left over from an interrupted run\n")
+
         # Get 30 unread emails
         print("📬 Fetching up to 30 unread emails...")
         emails = agent.gmail.get_unread_emails(max_results=30)
@@ -46,31 +60,29 @@ def main():
             print(f"Subject: {email['subject'][:60]}...")
             print(f"From: {email['from'][:50]}")
 
-            # Analyze
-            analysis = agent.analyze_email(email)
-
-            if "error" in analysis:
-                print(f"  ⚠️  Analysis failed: {analysis['error']}")
+            if journal.is_finished(email['id']):
+                print("  ⏭️  Already done in an earlier run")
                 continue
 
+            # Analyze (reusing the analysis from an interrupted run, if any)
+            analysis = journal.analysis(email['id'])
+            if analysis is None:
+                analysis = agent.analyze_email(email)
+
+                if "error" in analysis:
+                    print(f"  ⚠️  Analysis failed: {analysis['error']}")
+                    continue
+                journal.record_analysis(email['id'], analysis)
+
             print(f"  📊 Category: {analysis.get('category')}")
             print(f"  📊 Priority: {analysis.get('priority')}")
             print(f"  📊 Summary: {analysis.get('summary', 'N/A')[:70]}...")
 
-            # Apply labels
+            # Apply labels, and mark as read if low priority
             actions_taken = []
-
-            # Add suggested labels
-            for label in analysis.get('suggested_labels', []):
-                if agent.gmail.add_label(email['id'], label):
-                    print(f"  ✅ Added label: {label}")
-                    actions_taken.append(f"Label: {label}")
-
-            # Mark as read if low priority
-            if analysis.get('priority') == 'low':
-                if agent.gmail.mark_as_read(email['id']):
-                    print(f"  ✅ Marked as read")
-                    actions_taken.append("Marked as read")
+            for action in agent.apply_actions(email['id'], agent.plan_actions(analysis), journal):
+                print(f"  ✅ {agent.describe_action(action)}")
+                actions_taken.append(agent.describe_action(action))
 
             if actions_taken:
                 results.append({
@@ -119,3 +131,4 @@ def main():
 
 if __name__ == '__main__':
     main()
+    metrics.print_summary()
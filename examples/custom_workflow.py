@@ -13,6 +13,9 @@ Example workflow:
 4. Generate weekly reports
 
 💡 Use this as a template to build your own agent!
+
+Prefer configuration to code? rule_workflow.py does the newsletter and
+VIP handling below from a rules file (rules.json).
 """
 
 import sys
@@ -22,6 +25,11 @@ from datetime import datetime
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from agent import EmailAgent
+from analysis_memo import AnalysisMemo
+from sender_profiles import SenderProfileStore
+from mail_index import MailIndex
+from mail_sync import MailSync
+import metrics
 
 
 class CustomWorkflow:
@@ -32,7 +40,11 @@ class CustomWorkflow:
     """
 
     def __init__(self):
-        self.agent = EmailAgent()
+        # Recurring newsletters reuse earlier analyses, and predictable senders
+        # are classified from their history (analysis_memo.py, sender_profiles.py)
+        self.agent = EmailAgent(memo=AnalysisMemo(), profiles=SenderProfileStore())
+        # Searches are answered from a local index when possible (see mail_index.py)
+        self.agent.gmail.index = MailIndex()
         self.stats = {
             'processed': 0,
             'important': 0,
@@ -49,6 +61,11 @@ class CustomWorkflow:
         print("=" * 60)
         print()
 
+        # Bring the local search index up to date (fast after the first run)
+        stats = MailSync(self.agent.gmail).sync()
+        print(f"🔄 Synced ({stats['mode']}): {stats['added']} new, "
+              f"{stats['relabeled']} relabeled, {stats['deleted']} deleted\n")
+
         # Example: Process newsletter emails
         self.process_newsletters()
 
@@ -66,7 +83,7 @@ class CustomWorkflow:
 
         # Search for common newsletter patterns
         query = 'from:newsletter OR from:noreply OR subject:unsubscribe'
-        emails = self.agent.gmail.get_recent_emails(max_results=20, query=query)
+        emails = self.agent.gmail.search(query, max_results=20)
 
         print(f"   Found {len(emails)} newsletter-like emails")
 
@@ -104,10 +121,7 @@ class CustomWorkflow:
         ]
 
         for sender in vip_senders:
-            emails = self.agent.gmail.get_recent_emails(
-                max_results=5,
-                query=f'from:{sender} is:unread'
-            )
+            emails = self.agent.gmail.search(f'from:{sender} is:unread', max_results=5)
 
             if not emails:
                 continue
@@ -265,3 +279,4 @@ def main():
 
 if __name__ == '__main__':
     main()
+    metrics.print_summary()
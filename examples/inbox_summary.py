@@ -15,6 +15,7 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from agent import EmailAgent
+import metrics
 
 
 def main():
@@ -65,3 +66,4 @@ def main():
 
 if __name__ == '__main__':
     main()
+    metrics.print_summary()
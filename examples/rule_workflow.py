@@ -0,0 +1,83 @@
+"""
+LEVEL 4: Rule-Based Workflow
+
+The same newsletter and VIP handling as custom_workflow.py, written as a
+rules file (rules.json) instead of Python code.
+
+All rules are checked against the whole batch at once, Claude is only
+asked about emails a rule needs an analysis for, and the resulting
+changes are applied in a few batched Gmail calls.
+
+Run:
+    python examples/rule_workflow.py                  # dry run: show what would change
+    python examples/rule_workflow.py --apply          # make the changes
+    python examples/rule_workflow.py my_rules.yaml --max-emails 500
+"""
+
+import argparse
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from agent import EmailAgent
+from action_planner import ActionPlanner
+from analysis_memo import AnalysisMemo
+from sender_profiles import SenderProfileStore
+from rules import load_rules
+import metrics
+
+DEFAULT_RULES = os.path.join(os.path.dirname(__file__), 'rules.json')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply a rules file to recent email')
+    parser.add_argument('rules', nargs='?', default=DEFAULT_RULES, help='Rules file (.json or .yaml)')
+    parser.add_argument('--max-emails', type=int, default=100, help='How many recent emails to check')
+    parser.add_argument('--query', default='in:inbox', help='Gmail query selecting the emails')
+    parser.add_argument('--apply', action='store_true', help='Make the changes (default: dry run)')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("📜 RULE-BASED WORKFLOW")
+    print("=" * 60)
+
+    rules = load_rules(args.rules)
+    print(f"\n✅ Loaded {len(rules)} rules from {args.rules}")
+
+    profiles = SenderProfileStore()
+    agent = EmailAgent(memo=AnalysisMemo(), profiles=profiles)
+    planner = ActionPlanner(agent.gmail)
+
+    print(f"📬 Fetching up to {args.max_emails} emails ({args.query})...")
+    emails = agent.gmail.get_recent_emails(max_results=args.max_emails, query=args.query)
+    if not emails:
+        print("✅ Nothing to do!\n")
+        return
+
+    result = rules.plan(emails, planner, analyze_many=agent.analyze_emails, profiles=profiles)
+
+    print(f"\n📊 {len(result.matches)} of {len(emails)} emails matched a rule "
+          f"({result.analyzed} needed a Claude analysis)\n")
+    for name, count in result.rule_counts().items():
+        print(f"   {name}: {count}")
+
+    subjects = {email['id']: email['subject'] for email in emails}
+    print()
+    for email_id, actions in result.plan.actions.items():
+        print(f"   {subjects[email_id][:50]}")
+        for action in actions:
+            print(f"      → {EmailAgent.describe_action(action)}")
+
+    print(f"\n🏷️  {result.plan.report()}")
+    if not args.apply:
+        print("\n💡 Dry run - add --apply to make these changes\n")
+        return
+
+    applied = planner.apply(result.plan)
+    print(f"✅ Updated {len(applied)} emails: {result.plan.report()}\n")
+
+
+if __name__ == '__main__':
+    main()
+    metrics.print_summary()
@@ -0,0 +1,80 @@
+"""
+LEVEL 4: Scheduled Agent
+
+Keep your inbox triaged without cron: this script stays running and
+does the work of auto_label.py and inbox_summary.py on a timetable.
+
+- Triage (label, mark low priority as read) every 15 minutes
+- Write an inbox summary every weekday morning at 8:00
+
+Only one triage runs at a time, even if you start this script twice;
+runs missed while the computer was asleep are made up once, not once
+per missed slot (see src/scheduler.py).
+
+Run:
+    python examples/scheduled_agent.py
+    python examples/scheduled_agent.py --triage "*/5 * * * *" --jitter 60
+    python examples/scheduled_agent.py --once triage      # run one job now and exit
+"""
+
+import argparse
+import sys
+import os
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from agent import EmailAgent
+from analysis_memo import AnalysisMemo
+from sender_profiles import SenderProfileStore
+from journal import Journal
+from scheduler import Scheduler
+import metrics
+
+# Emails finished by earlier runs are skipped (see journal.py)
+JOURNAL_FILE = os.path.join('.cache', 'scheduled_triage.journal')
+SUMMARY_DIR = 'summaries'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the email agent on a schedule')
+    parser.add_argument('--triage', default='*/15 * * * *', help='Cron spec for triage')
+    parser.add_argument('--summary', default='0 8 * * mon-fri', help='Cron spec for the summary')
+    parser.add_argument('--max-emails', type=int, default=50, help='Emails per triage run')
+    parser.add_argument('--jitter', type=float, default=30,
+                        help='Start runs up to this many seconds late (spreads load)')
+    parser.add_argument('--once', choices=['triage', 'summary'], help='Run one job now and exit')
+    args = parser.parse_args()
+
+    agent = EmailAgent(memo=AnalysisMemo(), profiles=SenderProfileStore())
+
+    def triage():
+        with Journal(JOURNAL_FILE) as journal:
+            results = agent.process_inbox(max_emails=args.max_emails, auto_apply=True,
+                                          journal=journal)
+            journal.compact()
+        print(f"   🏷️  Triaged {len(results)} email(s)")
+
+    def summary():
+        emails = agent.gmail.get_recent_emails(max_results=50)
+        if not emails:
+            return
+        os.makedirs(SUMMARY_DIR, exist_ok=True)
+        filename = os.path.join(SUMMARY_DIR, f"inbox_summary_{datetime.now():%Y-%m-%d_%H%M}.md")
+        with open(filename, 'w') as f:
+            f.write(agent.summarize_inbox(emails))
+        print(f"   📊 Summary saved to {filename}")
+
+    scheduler = Scheduler()
+    scheduler.add('triage', args.triage, triage, jitter=args.jitter)
+    scheduler.add('summary', args.summary, summary, jitter=args.jitter)
+
+    if args.once:
+        scheduler.run_now(args.once)
+    else:
+        scheduler.run_forever()
+
+
+if __name__ == '__main__':
+    main()
+    metrics.print_summary()
@@ -6,7 +6,10 @@ This agent generates draft replies to your emails.
 NEW FEATURES:
 - Analyzes email content
 - Drafts appropriate replies
-- Saves drafts to Gmail (doesn't send!)
+- Saves drafts to Gmail, in the right conversation (doesn't send!)
+- Drafts replies to many emails at once ('all')
+- Starts writing a reply in the background as soon as an email turns
+  out to need one
 
 💡 Perfect for:
    - Quick responses to common emails
@@ -20,6 +23,8 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from agent import EmailAgent
+from draft_cache import ReplyDrafter
+import metrics
 
 
 def main():
@@ -32,6 +37,7 @@ def main():
         # Create agent
         print("📡 Connecting...")
         agent = EmailAgent()
+        drafter = ReplyDrafter(agent)
         print("✅ Connected!\n")
 
         # Get unread emails
@@ -60,7 +66,15 @@ def main():
 
         # Determine which emails to process
         if choice.lower() == 'all':
-            selected_emails = emails
+            # Draft every reply at once and save them together
+            print(f"\n📝 Drafting {len(emails)} replies...")
+            results = agent.draft_replies(emails)
+            for email in emails:
+                result = results[email['id']]
+                status = "✅ saved" if result['draft_id'] else "❌ not saved"
+                print(f"   {status}: Re: {email['subject'][:50]}")
+            print("\n💡 Review the drafts in Gmail before sending!\n")
+            return
         else:
             try:
                 idx = int(choice) - 1
@@ -87,6 +101,10 @@ def main():
                 print(f"❌ Analysis failed: {analysis['error']}")
                 continue
 
+            # Start writing the reply now - it is being drafted while you
+            # read and answer the questions below (see draft_cache.py)
+            drafter.schedule(email, analysis)
+
             print(f"Category: {analysis.get('category')}")
             print(f"Action needed: {'Yes' if analysis.get('action_needed') else 'No'}")
 
@@ -100,8 +118,12 @@ def main():
             print("\n📝 Drafting reply...")
             context = input("Any specific points to include? (press Enter to skip): ").strip()
 
-            # Draft the reply
-            reply = agent.draft_reply(email, context)
+            # Draft the reply (with extra points it has to be written afresh)
+            if context:
+                reply = agent.draft_reply(email, context)
+            else:
+                draft = drafter.get(email, wait=True)
+                reply = draft['reply'] if draft else ""
 
             if reply:
                 print("\n" + "-" * 60)
@@ -119,19 +141,12 @@ def main():
                 action = input("\nChoice (1/2/3): ").strip()
 
                 if action == '1':
-                    # Extract sender email
-                    sender = email['from']
-                    # Simple email extraction (you might want to improve this)
-                    if '<' in sender:
-                        sender_email = sender.split('<')[1].split('>')[0]
-                    else:
-                        sender_email = sender
-
-                    # Create draft
-                    subject = f"Re: {email['subject']}"
-                    if agent.gmail.create_draft(sender_email, subject, reply):
+                    # Saved in the same conversation, addressed to the sender
+                    # (or their Reply-To address)
+                    draft_ids = agent.gmail.create_reply_drafts([(email, reply)])
+                    if draft_ids.get(email['id']):
                         print("\n✅ Draft saved to Gmail!")
-                        print("   Check your Drafts folder.")
+                        print("   You'll find it in the conversation and in your Drafts folder.")
                     else:
                         print("\n❌ Failed to save draft")
 
@@ -155,3 +170,4 @@ def main():
 
 if __name__ == '__main__':
     main()
+    metrics.print_summary()
@@ -107,6 +107,7 @@ def check_gmail_connection():
         from gmail_helper import GmailHelper
 
         gmail = GmailHelper()
+        gmail.service  # Authentication is lazy - force it now
         print("   ✅ Gmail connection successful!")
 
         # Try to fetch one email
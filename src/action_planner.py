@@ -0,0 +1,257 @@
+"""
+Action Planner - Change only what needs changing
+
+The agent's analysis says what an email *should* look like ("labeled
+Work, marked as read"). Usually part of that is already true - the label
+was added on an earlier run, or the email was read on your phone. Calling
+Gmail anyway costs quota and time for nothing.
+
+The planner compares each email's current labels with the wanted ones
+and keeps only the difference:
+
+    wanted:   add_label Work, add_label Urgent, mark_as_read
+    current:  labels = [INBOX, Label_12 (Work)]          <- already read
+    planned:  add_label Urgent                           (2 skipped)
+
+Emails that need the same change are then applied together with
+messages.batchModify, so labeling 200 emails "Newsletter" is one API call
+instead of 200. Reprocessing an inbox that is already triaged makes no
+changes at all.
+
+Supported actions: add_label, remove_label, mark_as_read, mark_as_unread,
+archive_email and star_email (named after the GmailHelper methods).
+
+Whole conversations work the same way: plan_thread() keeps the actions
+some message still needs, and apply_thread() makes them with one
+threads.modify call.
+
+Usage:
+    planner = ActionPlanner(gmail)
+    plan = planner.plan([(email, agent.plan_actions(analysis)) for ...])
+    applied = planner.apply(plan)
+    print(plan.report())
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from journal import Journal
+
+# Actions that add or remove a fixed system label: name -> (label ID, added?)
+SYSTEM_LABEL_ACTIONS = {
+    'mark_as_read': ('UNREAD', False),
+    'mark_as_unread': ('UNREAD', True),
+    'archive_email': ('INBOX', False),
+    'star_email': ('STARRED', True),
+}
+
+
+class ActionPlan:
+    """Minimal changes per email, plus counts of what was skipped."""
+
+    def __init__(self):
+        self.actions: Dict[str, List[tuple]] = {}   # email ID -> actions to apply
+        self.planned = 0        # actions still needed
+        self.skipped = 0        # actions that were already true
+        self.api_calls = 0      # Gmail modify calls made by ActionPlanner.apply
+        self.unchanged: List[str] = []  # emails that need nothing
+        self.failed: List[str] = []     # emails left unfinished (labels couldn't be resolved)
+
+    def __len__(self):
+        return self.planned
+
+    def report(self) -> str:
+        text = f"{self.planned} changes planned, {self.skipped} skipped (already applied)"
+        if self.api_calls:
+            text += f", {self.api_calls} API calls"
+        if self.failed:
+            text += f", {len(self.failed)} emails left for the next run"
+        return text
+
+
+class ActionPlanner:
+    """Computes and applies the minimal label changes for a set of emails."""
+
+    def __init__(self, gmail):
+        """
+        Args:
+            gmail: GmailHelper used to look up label IDs and apply changes
+        """
+        self.gmail = gmail
+
+    def label_ids(self) -> Optional[Dict[str, str]]:
+        """The account's labels as {name: ID}, or None if Gmail couldn't be asked."""
+        try:
+            return self.gmail.get_label_ids()
+        except Exception as e:
+            print(f"Error listing labels: {e}")
+            return None
+
+    def diff(self, email: Dict, actions: List[tuple],
+             label_ids: Optional[Dict[str, str]] = None) -> Tuple[List[tuple], int]:
+        """
+        Drop actions that would not change the email.
+
+        Args:
+            email: The email, with its current label IDs
+            actions: Wanted actions
+            label_ids: {name: ID} of the account's labels (default: looked up)
+
+        Returns:
+            (actions still needed, number of actions skipped)
+        """
+        if label_ids is None:
+            label_ids = self.gmail.get_label_ids()
+        current = set(email.get('labels') or [])
+        needed = []
+        for action in actions:
+            if action[0] == 'add_label':
+                label_id = label_ids.get(action[1])
+                if label_id is not None and label_id in current:
+                    continue
+            elif action[0] == 'remove_label':
+                if label_ids.get(action[1]) not in current:
+                    continue
+            elif action[0] in SYSTEM_LABEL_ACTIONS:
+                label_id, added = SYSTEM_LABEL_ACTIONS[action[0]]
+                if (label_id in current) == added:
+                    continue
+            if action not in needed:
+                needed.append(action)
+        return needed, len(actions) - len(needed)
+
+    def plan(self, items: Iterable[Tuple[Dict, List[tuple]]]) -> ActionPlan:
+        """
+        Plan the changes for many emails.
+
+        Args:
+            items: (email, wanted actions) pairs; actions as returned by
+                   EmailAgent.plan_actions, e.g. [('add_label', 'Work')]
+
+        If the labels can't be listed, emails that need a user label are
+        left out of the plan (in plan.failed) so a later run retries them.
+        """
+        plan = ActionPlan()
+        label_ids = self.label_ids()
+        for email, actions in items:
+            if label_ids is None and any(a[0] in ('add_label', 'remove_label') for a in actions):
+                plan.failed.append(email['id'])
+                continue
+            needed, skipped = self.diff(email, actions, label_ids or {})
+            plan.skipped += skipped
+            if needed:
+                plan.actions[email['id']] = needed
+                plan.planned += len(needed)
+            else:
+                plan.unchanged.append(email['id'])
+        return plan
+
+    def plan_thread(self, thread: Dict, actions: List[tuple]) -> Tuple[List[tuple], int]:
+        """
+        Drop actions that no message of a thread needs.
+
+        Returns:
+            (actions still needed by at least one message, number skipped);
+            ([], 0) with a printed error if the labels can't be listed
+        """
+        label_ids = self.label_ids()
+        if label_ids is None:
+            return [], 0
+        needed = [action for action in actions
+                  if any(self.diff(message, [action], label_ids)[0]
+                         for message in thread['messages'])]
+        return needed, len(actions) - len(needed)
+
+    def apply_thread(self, thread_id: str, actions: List[tuple]) -> bool:
+        """Apply actions to a whole thread with a single threads.modify call."""
+        change = self._label_change(actions)
+        if change is None:
+            return False
+        add, remove = change
+        if not add and not remove:
+            return True
+        return self.gmail.modify_thread(thread_id, list(add), list(remove))
+
+    def apply(self, plan: ActionPlan,
+              journal: Optional[Journal] = None) -> Dict[str, List[tuple]]:
+        """
+        Apply a plan, grouping emails that need the same change.
+
+        With a journal, each email's plan is logged before anything is
+        changed and marked done afterwards (see journal.py). Emails whose
+        labels can't be found or created are not changed at all and stay
+        unfinished; they are added to plan.failed.
+
+        Returns:
+            {email_id: actions applied}
+        """
+        if journal is not None:
+            for email_id in plan.unchanged:
+                if not journal.is_finished(email_id):
+                    journal.record_finished(email_id)
+
+        pending = {}
+        for email_id, actions in plan.actions.items():
+            if journal is not None:
+                if journal.is_finished(email_id):
+                    continue
+                if not journal.has_plan(email_id):
+                    journal.record_plan(email_id, actions)
+                actions = journal.pending_actions(email_id)
+            pending[email_id] = actions
+
+        # Group emails by the exact label change they need
+        groups: Dict[tuple, List[str]] = {}
+        for email_id, actions in pending.items():
+            change = self._label_change(actions)
+            if change is None:
+                plan.failed.append(email_id)
+                continue
+            add, remove = change
+            if add or remove:
+                groups.setdefault((add, remove), []).append(email_id)
+            elif journal is not None:
+                journal.record_finished(email_id)
+
+        applied: Dict[str, List[tuple]] = {}
+        for (add, remove), email_ids in groups.items():
+            if len(email_ids) == 1:
+                ok = self.gmail.modify_labels(email_ids[0], list(add), list(remove))
+                plan.api_calls += 1
+            else:
+                ok = self.gmail.batch_modify(email_ids, list(add), list(remove))
+                plan.api_calls += -(-len(email_ids) // self.gmail.BATCH_MODIFY_LIMIT)
+            if not ok:
+                continue
+
+            for email_id in email_ids:
+                applied[email_id] = pending[email_id]
+                if journal is not None:
+                    for action in pending[email_id]:
+                        journal.record_done(email_id, action)
+                    journal.record_finished(email_id)
+
+        return applied
+
+    def _label_change(self, actions: List[tuple]) -> Optional[Tuple[tuple, tuple]]:
+        """Label IDs to add and remove for a list of actions (None if a label can't be resolved)."""
+        add, remove = set(), set()
+        for action in actions:
+            if action[0] == 'add_label':
+                label_id = self.gmail._get_or_create_label(action[1])
+                if not label_id:
+                    return None
+                add.add(label_id)
+            elif action[0] == 'remove_label':
+                label_ids = self.label_ids()
+                if label_ids is None:
+                    return None
+                # A label that doesn't exist is already "removed"
+                label_id = label_ids.get(action[1])
+                if label_id:
+                    remove.add(label_id)
+            elif action[0] in SYSTEM_LABEL_ACTIONS:
+                label_id, added = SYSTEM_LABEL_ACTIONS[action[0]]
+                (add if added else remove).add(label_id)
+            else:
+                raise ValueError(f"Unknown action: {action[0]}")
+        return tuple(sorted(add)), tuple(sorted(remove))
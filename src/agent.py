@@ -6,14 +6,65 @@ This is where the "agent" behavior lives - the perception-thought-action loop.
 
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional
-from anthropic import Anthropic
-from dotenv import load_dotenv
 
+from action_planner import ActionPlanner
+from analysis_memo import AnalysisMemo
+from sender_profiles import SenderProfileStore
 from gmail_helper import GmailHelper
+from journal import Journal
+from model_calls import ModelCallExecutor
+import connections
+import metrics
+import tracing
+from dedupe import StreamingDeduplicator, cluster_emails
+from pipeline import Pipeline, Stage
+from summarizer import MapReduceSummarizer
 import prompts
 
 
+_env_loaded = False
+
+
+def load_env():
+    """Load variables from .env once per process (later calls are free)."""
+    global _env_loaded
+    if not _env_loaded:
+        # Imported here so that importing this module stays fast
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+
+def parse_json_response(response_text: str) -> Dict:
+    """
+    Parse Claude's JSON answer, tolerating a markdown code block around it.
+
+    Raises:
+        json.JSONDecodeError: If the text is not valid JSON
+    """
+    # Strip markdown code blocks if present
+    if response_text.strip().startswith('```'):
+        # Remove ```json or ``` from start
+        response_text = response_text.strip()
+        if response_text.startswith('```json'):
+            response_text = response_text[7:]
+        elif response_text.startswith('```'):
+            response_text = response_text[3:]
+        # Remove ``` from end
+        if response_text.endswith('```'):
+            response_text = response_text[:-3]
+        response_text = response_text.strip()
+
+    return json.loads(response_text)
+
+
+def _quiet(*args, **kwargs):
+    """Stand-in for print() when output is turned off."""
+
+
 class EmailAgent:
     """
     An AI agent that can analyze and manage your Gmail inbox.
@@ -24,33 +75,74 @@ class EmailAgent:
     3. ACT - Take actions based on analysis
     """
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None,
+                 gmail: Optional[GmailHelper] = None, client=None,
+                 memo: Optional[AnalysisMemo] = None,
+                 profiles: Optional[SenderProfileStore] = None,
+                 executor: Optional[ModelCallExecutor] = None):
         """
         Initialize the agent.
 
+        Construction is cheap: the Anthropic client and the Gmail
+        connection are only created the first time they are used.
+
         Args:
             api_key: Anthropic API key (or set ANTHROPIC_API_KEY in .env)
+            gmail: Ready-made GmailHelper to use instead of the default one
+            client: Ready-made Anthropic client to use instead of the default one
+            memo: AnalysisMemo that lets recurring template mail (newsletters,
+                  receipts...) reuse an earlier analysis instead of calling Claude
+            profiles: SenderProfileStore that classifies predictable senders
+                      without Claude and adds sender history to other prompts
+            executor: ModelCallExecutor for Claude calls (deadlines, retries,
+                      circuit breaker); default: one with standard settings
         """
-        # Load environment variables
-        load_dotenv()
-
-        # Initialize AI client
-        self.api_key = api_key or os.getenv('ANTHROPIC_API_KEY')
-        if not self.api_key:
-            raise ValueError(
-                "No Anthropic API key found. Set ANTHROPIC_API_KEY in .env file "
-                "or pass it to EmailAgent(api_key='...')"
-            )
-
-        self.client = Anthropic(api_key=self.api_key)
-
-        # Initialize Gmail helper
-        self.gmail = GmailHelper()
+        self._api_key = api_key
+        self._client = client
+        self._gmail = gmail
+        self.memo = memo
+        self.profiles = profiles
+        self.executor = executor if executor is not None else ModelCallExecutor()
 
         # Agent configuration
         self.model = "claude-sonnet-4-5-20250929"  # Latest Claude model
         self.max_tokens = 4096
 
+        # Worker threads per process_inbox stage (Gmail calls are I/O bound;
+        # analysis concurrency is limited by your Anthropic rate limits)
+        self.pipeline_workers = {'fetch': 8, 'analyze': 4}
+
+        # Splits big inboxes into chunks and remembers chunk summaries
+        self.summarizer = MapReduceSummarizer(complete=self._complete)
+
+    @property
+    def api_key(self) -> str:
+        """Anthropic API key, read from .env on first access."""
+        if not self._api_key:
+            load_env()
+            self._api_key = os.getenv('ANTHROPIC_API_KEY')
+            if not self._api_key:
+                raise ValueError(
+                    "No Anthropic API key found. Set ANTHROPIC_API_KEY in .env file "
+                    "or pass it to EmailAgent(api_key='...')"
+                )
+        return self._api_key
+
+    @property
+    def client(self):
+        """Anthropic client, created on first use (see connections.py)."""
+        if self._client is None:
+            # Shared by every agent with this key, so connections are reused
+            self._client = connections.anthropic_client(self.api_key)
+        return self._client
+
+    @property
+    def gmail(self) -> GmailHelper:
+        """Gmail helper (authentication happens on its first API call)."""
+        if self._gmail is None:
+            self._gmail = GmailHelper()
+        return self._gmail
+
     def analyze_email(self, email: Dict) -> Dict:
         """
         Analyze a single email using Claude.
@@ -64,50 +156,90 @@ class EmailAgent:
         Returns:
             Analysis results as a dictionary
         """
+        with tracing.start_span('analyze_email', email_id=email['id']) as span:
+            if self.memo is None:
+                analysis = self._analyze_with_profile(email)
+            else:
+                analysis = self.memo.analyze(email, self._analyze_with_profile)
+            if span is not None:
+                span.set_attribute('memo_hit', 'template_of' in analysis)
+                span.set_attribute('resolved_by_profile', 'resolved_by' in analysis)
+            return analysis
+
+    def _analyze_with_profile(self, email: Dict) -> Dict:
+        """Use the sender's history when there is one, then learn from the result."""
+        if self.profiles is None:
+            return self._analyze_email(email)
+
+        analysis = self.profiles.resolve(email)
+        if analysis is not None:
+            return analysis
+
+        analysis = self._analyze_email(email, self.profiles.hint(email))
+        self.profiles.record(email, analysis)
+        return analysis
+
+    def _analyze_email(self, email: Dict, sender_hint: str = '') -> Dict:
+        response_text = None
         try:
             # Get the prompt
-            prompt = prompts.get_email_analysis_prompt(email)
+            prompt = prompts.get_email_analysis_prompt(email, sender_hint)
 
             # Ask Claude to analyze
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                messages=[{
-                    "role": "user",
-                    "content": prompt
-                }]
-            )
-
-            # Get the response text
-            response_text = response.content[0].text
-
-            # Strip markdown code blocks if present
-            if response_text.strip().startswith('```'):
-                # Remove ```json or ``` from start
-                response_text = response_text.strip()
-                if response_text.startswith('```json'):
-                    response_text = response_text[7:]
-                elif response_text.startswith('```'):
-                    response_text = response_text[3:]
-                # Remove ``` from end
-                if response_text.endswith('```'):
-                    response_text = response_text[:-3]
-                response_text = response_text.strip()
+            response_text = self._complete(prompt, 'email_analysis')
 
             # Parse the JSON response
-            analysis = json.loads(response_text)
-
-            return analysis
+            with tracing.start_span('parse_analysis'):
+                return parse_json_response(response_text)
 
         except json.JSONDecodeError as e:
             print(f"⚠️ Could not parse AI response as JSON: {e}")
             # Return raw response if JSON parsing fails
-            return {"error": "JSON parsing failed", "raw": response.content[0].text}
+            return {"error": "JSON parsing failed", "raw": response_text}
 
         except Exception as e:
             print(f"❌ Error analyzing email: {e}")
             return {"error": str(e)}
 
+    def analyze_emails(self, emails: List[Dict], dedupe: bool = True) -> Dict[str, Dict]:
+        """
+        Analyze many emails, skipping near-duplicates.
+
+        Look-alike emails from the same sender (CI alerts, shipping updates,
+        social pings...) are grouped first. Only one email per group is sent
+        to Claude; the others get a copy of its analysis with a
+        'duplicate_of' field pointing at the analyzed email.
+
+        Args:
+            emails: Emails to analyze
+            dedupe: Set to False to analyze every email individually
+
+        Returns:
+            Dictionary mapping email ID to its analysis
+        """
+        if dedupe:
+            clusters = cluster_emails(emails)
+        else:
+            clusters = [[email] for email in emails]
+
+        analyses = {}
+        for cluster in clusters:
+            representative = cluster[0]
+            analysis = self.analyze_email(representative)
+            analyses[representative['id']] = analysis
+
+            for email in cluster[1:]:
+                shared = dict(analysis)
+                if "error" not in analysis:
+                    shared['duplicate_of'] = representative['id']
+                analyses[email['id']] = shared
+
+        if len(clusters) < len(emails):
+            print(f"🧩 Grouped {len(emails)} emails into {len(clusters)} clusters "
+                  f"({len(emails) - len(clusters)} analyses saved)")
+
+        return analyses
+
     def draft_reply(self, email: Dict, context: str = "") -> str:
         """
         Draft a reply to an email using Claude.
@@ -121,26 +253,52 @@ class EmailAgent:
         """
         try:
             prompt = prompts.get_reply_draft_prompt(email, context)
-
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                messages=[{
-                    "role": "user",
-                    "content": prompt
-                }]
-            )
-
-            return response.content[0].text
+            return self._complete(prompt, 'reply_draft')
 
         except Exception as e:
             print(f"❌ Error drafting reply: {e}")
             return ""
 
+    def draft_replies(self, emails: List[Dict], context: str = "",
+                      save: bool = True) -> Dict[str, Dict]:
+        """
+        Draft replies to many emails and save them to Gmail together.
+
+        Replies are written in parallel (as many at once as the 'analyze'
+        pipeline stage uses), then saved as drafts in their conversations
+        (see GmailHelper.create_reply_drafts).
+
+        Args:
+            emails: Emails to reply to
+            context: Additional instructions for every reply
+            save: Save the replies as Gmail drafts
+
+        Returns:
+            {email_id: {'reply': text ('' if drafting failed),
+                        'draft_id': Gmail draft ID or None}}
+        """
+        with tracing.start_span('draft_replies', emails=len(emails)):
+            workers = max(1, min(self.pipeline_workers.get('analyze', 4), len(emails)))
+            draft = tracing.propagate(lambda email: self.draft_reply(email, context))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                texts = list(pool.map(draft, emails))
+
+            results = {email['id']: {'reply': text, 'draft_id': None}
+                       for email, text in zip(emails, texts)}
+            if save:
+                replies = [(email, text) for email, text in zip(emails, texts) if text]
+                for email_id, draft_id in self.gmail.create_reply_drafts(replies).items():
+                    results[email_id]['draft_id'] = draft_id
+            return results
+
     def summarize_inbox(self, emails: List[Dict]) -> str:
         """
         Generate a summary of multiple emails.
 
+        Large inboxes are summarized map-reduce style: chunks of emails are
+        summarized in parallel, then the partial summaries are merged.
+        See summarizer.py for details.
+
         Args:
             emails: List of email dictionaries
 
@@ -148,24 +306,59 @@ class EmailAgent:
             Summary text
         """
         try:
-            prompt = prompts.get_summary_prompt(emails)
-
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                messages=[{
-                    "role": "user",
-                    "content": prompt
-                }]
-            )
-
-            return response.content[0].text
+            with tracing.start_span('summarize_inbox', emails=len(emails)):
+                return self.summarizer.summarize(emails)
 
         except Exception as e:
             print(f"❌ Error generating summary: {e}")
             return ""
 
-    def process_email(self, email: Dict, auto_apply: bool = False) -> Dict:
+    def _complete(self, prompt: str, prompt_type: str = 'custom') -> str:
+        """
+        Send a single prompt to Claude and return the response text.
+
+        Temporary failures are retried within a deadline, and calls fail
+        fast while the API is down (see model_calls.py). Latency, errors
+        and token usage are recorded in metrics under prompt_type
+        (e.g. 'email_analysis', 'reply_draft').
+        """
+        with tracing.start_span('anthropic.messages.create', model=self.model,
+                                prompt_type=prompt_type) as span:
+            attempts = []
+
+            def attempt(timeout: float):
+                attempts.append(timeout)
+                # Retries are ours to make; the client should try just once
+                client = self.client
+                if hasattr(client, 'with_options'):
+                    client = client.with_options(timeout=timeout, max_retries=0)
+                with metrics.record_model_call(self.model, prompt_type):
+                    return client.messages.create(
+                        model=self.model,
+                        max_tokens=self.max_tokens,
+                        messages=[{
+                            "role": "user",
+                            "content": prompt
+                        }]
+                    )
+
+            try:
+                response = self.executor.call(attempt, operation=prompt_type)
+            finally:
+                if span is not None:
+                    span.set_attribute('attempts', len(attempts))
+
+            usage = getattr(response, 'usage', None)
+            metrics.record_token_usage(self.model, prompt_type, usage)
+            if span is not None and usage is not None:
+                span.set_attribute('input_tokens', usage.input_tokens)
+                span.set_attribute('output_tokens', usage.output_tokens)
+
+        return response.content[0].text
+
+    def process_email(self, email: Dict, auto_apply: bool = False,
+                      analysis: Optional[Dict] = None, verbose: bool = True,
+                      journal: Optional[Journal] = None) -> Dict:
         """
         Full processing pipeline for a single email.
 
@@ -176,76 +369,365 @@ class EmailAgent:
         Args:
             email: Email to process
             auto_apply: If True, automatically apply recommendations
+            analysis: Analysis computed earlier (e.g. by analyze_emails);
+                      the email is analyzed here if not given
+            verbose: Print progress (turned off when many emails are
+                     processed concurrently)
+            journal: Record the analysis and actions so an interrupted run
+                     can resume (see journal.py)
 
         Returns:
             Dictionary with analysis and actions taken
         """
-        print(f"\n📧 Processing: {email['subject']}")
-        print(f"   From: {email['from']}")
+        with tracing.start_span('process_email', email_id=email['id'],
+                                thread_id=email.get('thread_id', '')):
+            say = print if verbose else _quiet
+
+            say(f"\n📧 Processing: {email['subject']}")
+            say(f"   From: {email['from']}")
+
+            # THINK: Analyze the email (unless an earlier run already did)
+            if analysis is None and journal is not None:
+                analysis = journal.analysis(email['id'])
+            if analysis is None:
+                analysis = self.analyze_email(email)
+                if journal is not None and "error" not in analysis:
+                    journal.record_analysis(email['id'], analysis)
+
+            if "error" in analysis:
+                say(f"   ⚠️ Analysis failed: {analysis['error']}")
+                tracing.set_attribute('analysis_error', str(analysis['error']))
+                return {"email": email, "analysis": analysis, "actions": []}
+
+            # Display analysis
+            say(f"   Category: {analysis.get('category', 'Unknown')}")
+            say(f"   Priority: {analysis.get('priority', 'Unknown')}")
+            say(f"   Summary: {analysis.get('summary', 'N/A')}")
+
+            actions_taken = []
+
+            # ACT: Apply recommendations (if enabled), skipping what's already done
+            skipped = 0
+            if auto_apply:
+                planner = ActionPlanner(self.gmail)
+                plan = planner.plan([(email, self.plan_actions(analysis))])
+                skipped = plan.skipped
+                for action in planner.apply(plan, journal).get(email['id'], []):
+                    actions_taken.append(self.describe_action(action))
+                    say(f"   ✓ {self.describe_action(action)}")
+                if skipped:
+                    say(f"   ⏭️  {skipped} action(s) already applied")
+
+            return {
+                "email": email,
+                "analysis": analysis,
+                "actions": actions_taken
+            }
+
+    @staticmethod
+    def plan_actions(analysis: Dict) -> List[tuple]:
+        """
+        Turn an analysis into Gmail actions, e.g.
+        [('add_label', 'Work'), ('mark_as_read',)]
+        """
+        actions = [('add_label', label) for label in analysis.get('suggested_labels', [])]
+        # Mark as read if low priority
+        if analysis.get('priority') == 'low':
+            actions.append(('mark_as_read',))
+        return actions
+
+    @staticmethod
+    def describe_action(action: tuple) -> str:
+        """Human-readable description of a planned action."""
+        if action[0] == 'add_label':
+            return f"Added label: {action[1]}"
+        if action[0] == 'remove_label':
+            return f"Removed label: {action[1]}"
+        if action[0] == 'mark_as_read':
+            return "Marked as read"
+        if action[0] == 'mark_as_unread':
+            return "Marked as unread"
+        if action[0] == 'archive_email':
+            return "Archived"
+        if action[0] == 'star_email':
+            return "Starred"
+        return " ".join(str(part) for part in action)
+
+    def apply_action(self, email_id: str, action: tuple) -> bool:
+        """Apply one planned action, e.g. ('add_label', 'Work'). Returns True on success."""
+        name, args = action[0], action[1:]
+        with tracing.start_span(f'action.{name}', **({'label': args[0]} if args else {})):
+            return bool(getattr(self.gmail, name)(email_id, *args))
+
+    def apply_actions(self, email_id: str, actions: List[tuple],
+                      journal: Optional[Journal] = None) -> List[tuple]:
+        """
+        Apply planned actions, returning the ones that succeeded.
+
+        With a journal, the plan is logged before anything is changed and
+        each action once it succeeds; if the email already has a plan from
+        an interrupted run, only its unfinished actions are applied.
+        """
+        if journal is not None:
+            return journal.run_plan(email_id, actions, self.apply_action)
+        return [action for action in actions if self.apply_action(email_id, action)]
+
+    def process_inbox(self, max_emails: int = 10, auto_apply: bool = False,
+                      workers: Optional[Dict[str, int]] = None,
+                      journal: Optional[Journal] = None,
+                      query: str = 'is:unread') -> List[Dict]:
+        """
+        Process multiple emails from the inbox.
+
+        Fetching and analyzing run as a pipeline (see pipeline.py): while
+        one email is being analyzed, the next ones are already being
+        fetched. Near-duplicate emails share a single analysis. Label
+        changes are applied at the end, skipping those already in place
+        and batching the rest (see action_planner.py).
+
+        Args:
+            max_emails: Maximum number of emails to process
+            auto_apply: If True, automatically apply recommendations
+            workers: Threads per stage, e.g. {'fetch': 8, 'analyze': 4}
+                     (missing stages use self.pipeline_workers)
+            journal: Journal (or path to one) that makes the run resumable:
+                     finished emails are skipped, recorded analyses reused
+                     and interrupted actions completed first
+            query: Gmail query selecting the emails (default: unread ones)
+
+        Returns:
+            List of processing results
+        """
+        if isinstance(journal, str):
+            journal = Journal(journal)
+
+        with tracing.start_span('process_inbox', max_emails=max_emails,
+                                auto_apply=auto_apply):
+            print(f"\n🤖 Agent starting - processing up to {max_emails} emails...")
+
+            # Finish what an interrupted run started before looking for new work
+            if journal is not None and auto_apply:
+                resumed = journal.replay(self.apply_action)
+                if resumed:
+                    print(f"🔁 Resumed {len(resumed)} emails from an interrupted run "
+                          f"({sum(len(a) for a in resumed.values())} pending actions applied)")
+
+            # PERCEIVE: Find the emails (fetched by the pipeline)
+            try:
+                email_ids = self.gmail.list_message_ids(max_results=max_emails, query=query)
+            except Exception as e:
+                print(f"❌ Error listing emails: {e}")
+                return []
+
+            if not email_ids:
+                print("✅ No matching emails found!" if query != 'is:unread'
+                      else "✅ No unread emails found!")
+                return []
+
+            return self._process_ids(email_ids, auto_apply,
+                                     {**self.pipeline_workers, **(workers or {})}, journal)
+
+    def process_message_ids(self, email_ids: List[str], auto_apply: bool = False,
+                            workers: Optional[Dict[str, int]] = None,
+                            journal: Optional[Journal] = None) -> List[Dict]:
+        """
+        Process specific emails, like process_inbox() does.
 
-        # THINK: Analyze the email
-        analysis = self.analyze_email(email)
+        Useful for working through a long list in batches: each call
+        analyzes its emails and then applies their changes together.
+        """
+        with tracing.start_span('process_message_ids', emails=len(email_ids),
+                                auto_apply=auto_apply):
+            return self._process_ids(email_ids, auto_apply,
+                                     {**self.pipeline_workers, **(workers or {})}, journal)
+
+    def _process_ids(self, email_ids: List[str], auto_apply: bool,
+                     workers: Dict[str, int],
+                     journal: Optional[Journal] = None) -> List[Dict]:
+
+        if journal is not None and auto_apply:
+            finished = [i for i in email_ids if journal.is_finished(i)]
+            if finished:
+                print(f"⏭️  Skipping {len(finished)} emails finished in an earlier run")
+                email_ids = [i for i in email_ids if not journal.is_finished(i)]
+
+        print(f"📬 Found {len(email_ids)} emails to process\n")
+
+        # THINK: near-duplicates wait for and share one analysis
+        dedupe = StreamingDeduplicator()
+        print_lock = threading.Lock()
+
+        def analyze(email):
+            recorded = journal.analysis(email['id']) if journal is not None else None
+            if recorded is not None:
+                return email, recorded
+            analysis, duplicate_of = dedupe.run(email, self.analyze_email)
+            if duplicate_of and "error" not in analysis:
+                analysis = dict(analysis, duplicate_of=duplicate_of)
+            if journal is not None and "error" not in analysis:
+                journal.record_analysis(email['id'], analysis)
+            return email, analysis
+
+        # Report each email as soon as it is analyzed; changes are applied
+        # afterwards in batches
+        def report(item):
+            email, analysis = item
+            result = {"email": email, "analysis": analysis, "actions": []}
+            with print_lock:
+                self._print_result(result)
+            return result
+
+        pipeline = Pipeline([
+            Stage('fetch', self.gmail.get_email, workers=workers['fetch']),
+            Stage('analyze', analyze, workers=workers['analyze']),
+            Stage('report', report, workers=1),
+        ])
+        results = pipeline.run(email_ids)
+
+        # ACT: apply only the label changes still needed, grouped into batchModify calls
+        if auto_apply:
+            self._apply_results(results, journal)
+
+        shared = sum(1 for r in results if 'duplicate_of' in r['analysis'])
+        if shared:
+            print(f"\n🧩 {shared} near-duplicate emails reused another email's analysis")
+        print(f"\n✅ Processed {len(results)} emails")
+        return results
 
+    def _apply_results(self, results: List[Dict], journal: Optional[Journal] = None):
+        """Plan and apply the actions of processed emails in bulk."""
+        analyzed = [r for r in results if "error" not in r['analysis']]
+        planner = ActionPlanner(self.gmail)
+
+        with tracing.start_span('apply_actions', emails=len(analyzed)):
+            plan = planner.plan((r['email'], self.plan_actions(r['analysis'])) for r in analyzed)
+            applied = planner.apply(plan, journal)
+
+        for result in analyzed:
+            email_id = result['email']['id']
+            result['actions'] = [self.describe_action(a) for a in applied.get(email_id, [])]
+        print(f"\n🏷️  {plan.report()}")
+
+    @staticmethod
+    def _print_result(result: Dict):
+        """One-line progress report for an email processed in the pipeline."""
+        email, analysis = result['email'], result['analysis']
+        print(f"📧 {email['subject'][:60]}")
         if "error" in analysis:
             print(f"   ⚠️ Analysis failed: {analysis['error']}")
-            return {"email": email, "analysis": analysis, "actions": []}
+            return
+        line = (f"   {analysis.get('category', 'Unknown')} / "
+                f"{analysis.get('priority', 'Unknown')}: {analysis.get('summary', 'N/A')}")
+        print(line)
+        for action in result['actions']:
+            print(f"   ✓ {action}")
+
+    def analyze_thread(self, thread: Dict) -> Dict:
+        """
+        Analyze a whole conversation with one Claude call.
+
+        Args:
+            thread: Thread dictionary from GmailHelper.get_thread()
+
+        Returns:
+            Analysis results as a dictionary (same fields as analyze_email)
+        """
+        response_text = None
+        try:
+            prompt = prompts.get_thread_analysis_prompt(thread)
+            response_text = self._complete(prompt, 'thread_analysis')
+            with tracing.start_span('parse_analysis'):
+                return parse_json_response(response_text)
+
+        except json.JSONDecodeError as e:
+            print(f"⚠️ Could not parse AI response as JSON: {e}")
+            return {"error": "JSON parsing failed", "raw": response_text}
+
+        except Exception as e:
+            print(f"❌ Error analyzing thread: {e}")
+            return {"error": str(e)}
+
+    def process_thread(self, thread: Dict, auto_apply: bool = False) -> Dict:
+        """
+        Analyze a conversation and optionally act on the whole thread.
+
+        Labels and read state are applied with one threads.modify call
+        instead of one call per message.
+
+        Args:
+            thread: Thread to process
+            auto_apply: If True, automatically apply recommendations
+
+        Returns:
+            Dictionary with analysis and actions taken
+        """
+        with tracing.start_span('process_thread', thread_id=thread['id'],
+                                messages=len(thread['messages'])):
+            return self._process_thread(thread, auto_apply)
+
+    def _process_thread(self, thread: Dict, auto_apply: bool) -> Dict:
+        print(f"\n🧵 Processing thread: {thread['subject']} "
+              f"({len(thread['messages'])} messages)")
+
+        analysis = self.analyze_thread(thread)
+
+        if "error" in analysis:
+            print(f"   ⚠️ Analysis failed: {analysis['error']}")
+            return {"thread": thread, "analysis": analysis, "actions": []}
 
-        # Display analysis
         print(f"   Category: {analysis.get('category', 'Unknown')}")
         print(f"   Priority: {analysis.get('priority', 'Unknown')}")
         print(f"   Summary: {analysis.get('summary', 'N/A')}")
 
         actions_taken = []
 
-        # ACT: Apply recommendations (if enabled)
+        # ACT: one threads.modify for all of the thread's changes, skipping what's done
         if auto_apply:
-            # Apply suggested labels
-            for label in analysis.get('suggested_labels', []):
-                if self.gmail.add_label(email['id'], label):
-                    actions_taken.append(f"Added label: {label}")
-                    print(f"   ✓ Added label: {label}")
-
-            # Mark as read if low priority
-            if analysis.get('priority') == 'low':
-                if self.gmail.mark_as_read(email['id']):
-                    actions_taken.append("Marked as read")
-                    print(f"   ✓ Marked as read")
+            planner = ActionPlanner(self.gmail)
+            needed, skipped = planner.plan_thread(thread, self.plan_actions(analysis))
+            if needed and planner.apply_thread(thread['id'], needed):
+                for action in needed:
+                    actions_taken.append(self.describe_action(action))
+                    print(f"   ✓ {self.describe_action(action)}")
+            if skipped:
+                print(f"   ⏭️  {skipped} action(s) already applied")
 
         return {
-            "email": email,
+            "thread": thread,
             "analysis": analysis,
             "actions": actions_taken
         }
 
-    def process_inbox(self, max_emails: int = 10, auto_apply: bool = False) -> List[Dict]:
+    def process_threads(self, max_threads: int = 10, auto_apply: bool = False,
+                        query: str = 'is:unread') -> List[Dict]:
         """
-        Process multiple emails from the inbox.
+        Process conversations instead of individual messages.
+
+        Each thread is fetched once (threads.get), analyzed once and
+        labeled once, however many messages it contains.
 
         Args:
-            max_emails: Maximum number of emails to process
+            max_threads: Maximum number of threads to process
             auto_apply: If True, automatically apply recommendations
+            query: Gmail search query selecting the threads
 
         Returns:
             List of processing results
         """
-        print(f"\n🤖 Agent starting - processing up to {max_emails} emails...")
+        print(f"\n🤖 Agent starting - processing up to {max_threads} threads...")
 
-        # PERCEIVE: Get emails from Gmail
-        emails = self.gmail.get_unread_emails(max_results=max_emails)
+        threads = self.gmail.get_recent_threads(max_results=max_threads, query=query)
 
-        if not emails:
-            print("✅ No unread emails found!")
+        if not threads:
+            print("✅ No matching threads found!")
             return []
 
-        print(f"📬 Found {len(emails)} unread emails\n")
+        messages = sum(len(t['messages']) for t in threads)
+        print(f"📬 Found {len(threads)} threads ({messages} messages)\n")
 
-        # Process each email
-        results = []
-        for email in emails:
-            result = self.process_email(email, auto_apply=auto_apply)
-            results.append(result)
+        results = [self.process_thread(thread, auto_apply=auto_apply) for thread in threads]
 
-        print(f"\n✅ Processed {len(results)} emails")
+        print(f"\n✅ Processed {len(results)} threads")
         return results
 
     def run_custom_analysis(self, email: Dict, custom_prompt: str) -> str:
@@ -270,16 +752,7 @@ Body:
 {custom_prompt}
 """
 
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                messages=[{
-                    "role": "user",
-                    "content": full_prompt
-                }]
-            )
-
-            return response.content[0].text
+            return self._complete(full_prompt, 'custom')
 
         except Exception as e:
             print(f"❌ Error in custom analysis: {e}")
@@ -316,3 +789,5 @@ if __name__ == '__main__':
 
     else:
         print("No emails found to test with!")
+
+    metrics.print_summary()
@@ -0,0 +1,234 @@
+"""
+Analysis Memo - Remember analyses of recurring template mail
+
+Newsletters, receipts and notifications arrive every day from the same
+sender with the same layout, and Claude analyzes each one the same way:
+"Newsletter, low priority, no action needed". The memo remembers those
+answers across runs:
+
+- Key: the normalized sender plus a SimHash of the email's normalized
+  subject and body (numbers, URLs and addresses masked - see dedupe.py),
+  so "Your order 1234 has shipped" matches "Your order 5678 has shipped"
+- A stored analysis is reused when the fingerprints differ in at most
+  max_distance of 64 bits (similarity >= 95% by default)
+- Entries expire after max_age (templates change, priorities shift)
+- A small random sample of hits is analyzed anyway; if Claude now
+  disagrees, the stale entry is replaced
+
+Entries are kept in a JSONL file so they survive restarts.
+
+Usage:
+    agent = EmailAgent(memo=AnalysisMemo())
+    agent.analyze_email(email)   # model call the first time, lookup after
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import metrics
+from dedupe import (BANDS, BAND_BITS, DEFAULT_MAX_DISTANCE, HASH_BITS, email_fingerprint,
+                    hamming_distance, normalize_sender)
+
+DEFAULT_MEMO_PATH = os.path.join('.cache', 'analysis_memo.jsonl')
+
+# Fields that must agree for a revalidated entry to be kept
+COMPARED_FIELDS = ('category', 'priority', 'action_needed')
+
+
+class AnalysisMemo:
+    """Stores analyses by sender and template, with expiry and spot checks."""
+
+    def __init__(self, path: Optional[str] = DEFAULT_MEMO_PATH,
+                 max_distance: int = DEFAULT_MAX_DISTANCE,
+                 max_age: float = 7 * 86400, revalidate_rate: float = 0.05,
+                 max_entries: int = 50000, seed: Optional[int] = None):
+        """
+        Args:
+            path: JSONL file to keep entries in (None: memory only)
+            max_distance: Most fingerprint bits (of 64) that may differ for a match
+            max_age: Seconds an entry stays valid
+            revalidate_rate: Fraction of hits that are analyzed again to check them
+            max_entries: Oldest entries are dropped beyond this
+            seed: Random seed for revalidation sampling (for repeatable tests)
+        """
+        if max_distance >= BANDS:
+            raise ValueError(f"max_distance must be less than {BANDS}")
+        self.path = path
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.revalidate_rate = revalidate_rate
+        self.max_entries = max_entries
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}        # email ID -> entry
+        self._buckets: Dict[tuple, List[str]] = {}  # (sender, band, value) -> email IDs
+
+        self._file = None
+        if path:
+            folder = os.path.dirname(path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            records = self._load()
+            if records > 2 * len(self._entries) + 100:
+                self._rewrite()
+            self._file = open(path, 'a', encoding='utf-8')
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def similarity(self) -> float:
+        """Lowest fingerprint similarity that counts as the same template."""
+        return 1 - self.max_distance / HASH_BITS
+
+    def analyze(self, email: Dict, analyze: Callable[[Dict], Dict]) -> Dict:
+        """
+        Return a remembered analysis for the email's template, or analyze(email).
+
+        Reused analyses get a 'template_of' field with the ID of the email
+        they were made for.
+        """
+        sender = normalize_sender(email.get('from', ''))
+        fingerprint = email_fingerprint(email)
+        entry = self.lookup(sender, fingerprint)
+
+        if entry is not None:
+            if self._random.random() >= self.revalidate_rate:
+                metrics.registry.inc('agentsmith_memo_lookups_total', result='hit')
+                return dict(entry['analysis'], template_of=entry['id'])
+
+            # Spot check: is the remembered answer still what Claude says?
+            analysis = analyze(email)
+            if "error" in analysis:
+                return dict(entry['analysis'], template_of=entry['id'])
+            agrees = all(analysis.get(f) == entry['analysis'].get(f) for f in COMPARED_FIELDS)
+            metrics.registry.inc('agentsmith_memo_lookups_total',
+                                 result='revalidated' if agrees else 'stale')
+            if not agrees:
+                self.forget(entry['id'])
+                self.store(email, analysis, sender, fingerprint)
+            return analysis
+
+        metrics.registry.inc('agentsmith_memo_lookups_total', result='miss')
+        analysis = analyze(email)
+        if "error" not in analysis:
+            self.store(email, analysis, sender, fingerprint)
+        return analysis
+
+    def lookup(self, sender: str, fingerprint: int) -> Optional[Dict]:
+        """The closest unexpired entry for this sender and fingerprint, if any."""
+        now = time.time()
+        best, best_distance = None, self.max_distance + 1
+        expired = []
+        with self._lock:
+            for key in self._keys(sender, fingerprint):
+                for email_id in self._buckets.get(key, ()):
+                    entry = self._entries.get(email_id)
+                    if entry is None:
+                        continue
+                    if now - entry['created_at'] > self.max_age:
+                        expired.append(email_id)
+                        continue
+                    distance = hamming_distance(fingerprint, entry['fingerprint'])
+                    if distance < best_distance:
+                        best, best_distance = entry, distance
+        for email_id in expired:
+            self.forget(email_id)
+        return best
+
+    def store(self, email: Dict, analysis: Dict, sender: Optional[str] = None,
+              fingerprint: Optional[int] = None):
+        """Remember an analysis for the email's template."""
+        entry = {
+            'id': email['id'],
+            'sender': sender if sender is not None else normalize_sender(email.get('from', '')),
+            'fingerprint': fingerprint if fingerprint is not None else email_fingerprint(email),
+            # Never reuse the marker of an earlier reuse
+            'analysis': {k: v for k, v in analysis.items()
+                         if k not in ('template_of', 'duplicate_of')},
+            'created_at': time.time(),
+        }
+        with self._lock:
+            self._add(entry)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+            self._append({'op': 'put', **entry})
+
+    def forget(self, email_id: str):
+        """Drop an entry (e.g. when it turned out to be wrong)."""
+        with self._lock:
+            if email_id in self._entries:
+                self._remove(email_id)
+                self._append({'op': 'drop', 'id': email_id})
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # ---- internals (call with the lock held) ----
+
+    def _add(self, entry: Dict):
+        if entry['id'] in self._entries:
+            self._remove(entry['id'])
+        self._entries[entry['id']] = entry
+        for key in self._keys(entry['sender'], entry['fingerprint']):
+            self._buckets.setdefault(key, []).append(entry['id'])
+
+    def _remove(self, email_id: str):
+        entry = self._entries.pop(email_id)
+        for key in self._keys(entry['sender'], entry['fingerprint']):
+            bucket = self._buckets.get(key)
+            if bucket and email_id in bucket:
+                bucket.remove(email_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    @staticmethod
+    def _keys(sender: str, fingerprint: int):
+        mask = (1 << BAND_BITS) - 1
+        for band in range(BANDS):
+            yield (sender, band, fingerprint >> (band * BAND_BITS) & mask)
+
+    def _append(self, record: Dict):
+        if self._file is not None:
+            self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+            self._file.flush()
+
+    def _load(self) -> int:
+        """Read entries back from the file; returns the number of records read."""
+        if not os.path.exists(self.path):
+            return 0
+        now = time.time()
+        records = 0
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records += 1
+                if record.get('op') == 'put':
+                    del record['op']
+                    if now - record['created_at'] <= self.max_age:
+                        self._add(record)
+                elif record.get('op') == 'drop' and record.get('id') in self._entries:
+                    self._remove(record['id'])
+        return records
+
+    def _rewrite(self):
+        """Replace the file with just the live entries."""
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for entry in self._entries.values():
+                f.write(json.dumps({'op': 'put', **entry}, separators=(',', ':')) + '\n')
+        os.replace(temp_path, self.path)
+
+
+metrics.registry.describe('agentsmith_memo_lookups_total',
+                          'Analysis memo lookups by result (hit, miss, revalidated, stale).')
@@ -0,0 +1,167 @@
+"""
+Attachments - Lazy attachment access with an on-disk cache
+
+GmailHelper only describes attachments when it fetches an email. The
+bytes are downloaded the first time you actually ask for them, and are
+then kept in a content-addressed cache on disk:
+
+    .cache/attachments/
+    ├── blobs/3f/3f9a...c1    <- file contents, named by SHA-256
+    └── index/8b/8b20...7e    <- "message + part" -> SHA-256 of its blob
+
+The same invoice attached to ten emails is stored once, and nothing is
+downloaded twice. Large files can be memory-mapped instead of read into
+memory.
+
+Usage:
+    for attachment in gmail.get_attachments(email):
+        if attachment.mime_type == 'text/calendar':
+            print(attachment.read().decode())
+"""
+
+import base64
+import hashlib
+import mmap
+import os
+import tempfile
+from typing import BinaryIO, Dict, Optional
+
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'attachments')
+
+# Base64 is decoded to disk in blocks of this many characters (multiple of 4)
+_DECODE_BLOCK = 64 * 1024
+
+
+class AttachmentCache:
+    """Content-addressed store for attachment bytes."""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, 'blobs')
+        self.index_dir = os.path.join(cache_dir, 'index')
+
+    def lookup(self, message_id: str, part_id: str) -> Optional[str]:
+        """Path of the cached file for a message part, or None."""
+        try:
+            with open(self._index_path(message_id, part_id)) as f:
+                digest = f.read().strip()
+        except FileNotFoundError:
+            return None
+
+        path = self.blob_path(digest)
+        return path if os.path.exists(path) else None
+
+    def store_base64(self, message_id: str, part_id: str, data: str) -> str:
+        """
+        Decode base64url data into the cache and return the file path.
+
+        The data is decoded and hashed block by block, so the decoded bytes
+        are never all held in memory at once.
+        """
+        os.makedirs(self.blob_dir, exist_ok=True)
+        digest = hashlib.sha256()
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.blob_dir, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for start in range(0, len(data), _DECODE_BLOCK):
+                    block = data[start:start + _DECODE_BLOCK]
+                    block += '=' * (-len(block) % 4)
+                    chunk = base64.urlsafe_b64decode(block)
+                    digest.update(chunk)
+                    f.write(chunk)
+
+            path = self.blob_path(digest.hexdigest())
+            if os.path.exists(path):
+                # Same content already cached (e.g. attached to another email)
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._write_index(message_id, part_id, digest.hexdigest())
+        return path
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def _index_path(self, message_id: str, part_id: str) -> str:
+        key = hashlib.sha1(f"{message_id}:{part_id}".encode('utf-8')).hexdigest()
+        return os.path.join(self.index_dir, key[:2], key)
+
+    def _write_index(self, message_id: str, part_id: str, digest: str):
+        path = self._index_path(message_id, part_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        with os.fdopen(fd, 'w') as f:
+            f.write(digest)
+        os.replace(tmp_path, path)
+
+
+class AttachmentHandle:
+    """
+    One attachment of one email. Nothing is downloaded until you call
+    path(), read(), open() or mmap().
+    """
+
+    def __init__(self, gmail, message_id: str, info: Dict, cache: AttachmentCache):
+        """
+        Args:
+            gmail: GmailHelper used to download the attachment
+            message_id: ID of the email the attachment belongs to
+            info: Attachment description from email['attachments']
+            cache: Where downloaded attachments are stored
+        """
+        self.gmail = gmail
+        self.message_id = message_id
+        self.info = info
+        self.cache = cache
+
+    @property
+    def filename(self) -> str:
+        return self.info['filename']
+
+    @property
+    def mime_type(self) -> str:
+        return self.info['mime_type']
+
+    @property
+    def size(self) -> int:
+        return self.info['size']
+
+    def path(self) -> str:
+        """Path of the attachment in the cache, downloading it if needed."""
+        part_id = self.info['part_id']
+        path = self.cache.lookup(self.message_id, part_id)
+        if path is None:
+            data = self.gmail.download_attachment(self.message_id, self.info)
+            path = self.cache.store_base64(self.message_id, part_id, data)
+        return path
+
+    def read(self) -> bytes:
+        """The attachment's contents (use mmap() for large files)."""
+        with self.open() as f:
+            return f.read()
+
+    def open(self) -> BinaryIO:
+        """Open the cached file for reading."""
+        return open(self.path(), 'rb')
+
+    def mmap(self) -> mmap.mmap:
+        """
+        Memory-map the attachment read-only.
+
+        The operating system pages the file in as you read it, so even
+        very large attachments don't need to fit in memory.
+        """
+        with self.open() as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError(f"Cannot memory-map empty attachment {self.filename!r}")
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __repr__(self):
+        return f"<AttachmentHandle {self.filename!r} {self.mime_type} {self.size} bytes>"
@@ -0,0 +1,371 @@
+"""
+AgentSmith CLI - One command for scripted and scheduled runs
+
+The examples ask questions with input() and have their sizes written
+into the code - fine for learning, awkward for a cron job. This command
+line runs the same building blocks without asking anything, with every
+size and speed setting as an option:
+
+    python agentsmith.py sync --since 30d                 # fill/refresh the local index
+    python agentsmith.py triage --since 2d --dry-run      # show what would change
+    python agentsmith.py triage --max-emails 2000 --batch-size 200 --concurrency 8
+    python agentsmith.py triage --rules examples/rules.json
+    python agentsmith.py summarize --since 1d --output today.md
+    python agentsmith.py bench --batch-size 500 --model-latency 0.8
+    python agentsmith.py serve --port 5001
+
+Options shared by every command:
+    --concurrency N    Claude calls at once (Gmail fetches use 2*N threads)
+    --profile [FILE]   Run under cProfile; print the hot spots, or save
+                       them to FILE for snakeviz/pstats
+    --token/--credentials  Which Gmail account to use
+
+Run `python agentsmith.py <command> --help` for each command's options.
+"""
+
+import argparse
+import cProfile
+import os
+import pstats
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Dict, List, Optional
+
+import metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TRIAGE_JOURNAL = os.path.join('.cache', 'triage.journal')
+
+
+def since_query(value: str) -> str:
+    """
+    Turn a --since value into a Gmail query term.
+
+    '7d', '3m', '1y' (days, months, years) -> 'newer_than:7d'
+    '2w'                                   -> 'newer_than:14d'
+    '2026-10-01'                           -> 'after:2026/10/01'
+    """
+    match = re.fullmatch(r'(\d+)([dwmy])', value.strip().lower())
+    if match:
+        number, unit = int(match.group(1)), match.group(2)
+        if unit == 'w':
+            number, unit = number * 7, 'd'
+        return f'newer_than:{number}{unit}'
+    try:
+        day = date.fromisoformat(value.strip())
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"expected an age like 7d, 2w, 3m, 1y or a date like 2026-10-01, got {value!r}") from None
+    return f'after:{day:%Y/%m/%d}'
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def build_query(*terms: Optional[str]) -> str:
+    return ' '.join(term for term in terms if term)
+
+
+def make_agent(args, index=None):
+    """An agent for the chosen account, with the CLI's concurrency settings."""
+    from agent import EmailAgent
+    from analysis_memo import AnalysisMemo
+    from gmail_helper import GmailHelper
+    from rate_limit import RateLimiter
+    from sender_profiles import SenderProfileStore
+
+    # High concurrency must still stay under the Gmail quota
+    gmail = GmailHelper(credentials_file=args.credentials, token_file=args.token,
+                        rate_limiter=RateLimiter(), index=index)
+    agent = EmailAgent(gmail=gmail, memo=AnalysisMemo(), profiles=SenderProfileStore())
+    if args.concurrency:
+        agent.pipeline_workers = {'fetch': 2 * args.concurrency, 'analyze': args.concurrency}
+        agent.summarizer.max_workers = args.concurrency
+    return agent
+
+
+def batches(items: List, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# ---- commands ----
+
+def cmd_sync(args) -> int:
+    from mail_index import MailIndex
+    from mail_sync import MailSync
+
+    agent = make_agent(args, index=MailIndex(args.index))
+    sync = MailSync(agent.gmail, max_messages=args.max_emails,
+                    workers=2 * (args.concurrency or 4),
+                    query=args.since or '')
+    print(f"🔄 Syncing {args.index}...")
+    stats = sync.sync()
+    print(f"✅ {stats['mode']} sync: {stats['added']} added, {stats['deleted']} deleted, "
+          f"{stats['relabeled']} relabeled in {stats['seconds']}s")
+    if stats['failed']:
+        print(f"⚠️  {stats['failed']} emails couldn't be downloaded; the next sync retries them")
+    print(f"📚 {len(agent.gmail.index)} emails indexed")
+    return 1 if stats['failed'] else 0
+
+
+def cmd_triage(args) -> int:
+    from action_planner import ActionPlanner
+    from journal import Journal
+
+    agent = make_agent(args)
+    query = build_query(args.query, args.since)
+    rules = None
+    if args.rules:
+        from rules import load_rules
+        rules = load_rules(args.rules)
+        print(f"📜 {len(rules)} rules from {args.rules}")
+
+    journal = None
+    if not args.dry_run:
+        journal = Journal(args.journal)
+        resumed = journal.replay(agent.apply_action)
+        if resumed:
+            print(f"🔁 Finished {len(resumed)} email(s) left over from an interrupted run")
+
+    print(f"📬 Listing up to {args.max_emails} emails matching '{query}'...")
+    email_ids = agent.gmail.list_message_ids(max_results=args.max_emails, query=query)
+    if journal is not None:
+        email_ids = [i for i in email_ids if not journal.is_finished(i)]
+    if not email_ids:
+        print("✅ Nothing to do!")
+        return 0
+
+    planner = ActionPlanner(agent.gmail)
+    totals = {'emails': 0, 'planned': 0, 'skipped': 0, 'api_calls': 0, 'errors': 0}
+    start = time.perf_counter()
+    for number, batch in enumerate(batches(email_ids, args.batch_size), 1):
+        print(f"\n📦 Batch {number}: {len(batch)} emails "
+              f"({totals['emails'] + len(batch)}/{len(email_ids)})")
+        if rules is not None:
+            plan = _triage_with_rules(agent, planner, rules, batch, args, journal, totals)
+        else:
+            plan = _triage_with_analysis(agent, planner, batch, args, journal, totals)
+        totals['emails'] += len(batch)
+        totals['planned'] += plan.planned
+        totals['skipped'] += plan.skipped
+        totals['api_calls'] += plan.api_calls
+
+    seconds = time.perf_counter() - start
+    verb = "would be made" if args.dry_run else "made"
+    print(f"\n✅ Triaged {totals['emails']} emails in {seconds:.1f}s "
+          f"({totals['emails'] / seconds:.1f} emails/s): {totals['planned']} changes {verb}, "
+          f"{totals['skipped']} already in place, {totals['errors']} analysis errors")
+    if journal is not None:
+        journal.compact()
+        journal.close()
+    return 1 if totals['errors'] else 0
+
+
+def _triage_with_analysis(agent, planner, batch, args, journal, totals):
+    """Analyze a batch with the pipeline and plan (or apply) the suggested changes."""
+    results = agent.process_message_ids(batch, auto_apply=False, journal=journal)
+    analyzed = [r for r in results if "error" not in r['analysis']]
+    totals['errors'] += len(results) - len(analyzed)
+    plan = planner.plan((r['email'], agent.plan_actions(r['analysis'])) for r in analyzed)
+    if args.dry_run:
+        _print_plan(plan, {r['email']['id']: r['email'] for r in analyzed})
+    else:
+        planner.apply(plan, journal)
+    print(f"🏷️  {plan.report()}")
+    return plan
+
+
+def _triage_with_rules(agent, planner, rules, batch, args, journal, totals):
+    """Match a batch against the rules file and plan (or apply) the result."""
+    with ThreadPoolExecutor(max_workers=agent.pipeline_workers['fetch']) as pool:
+        emails = [email for email in pool.map(agent.gmail.get_email, batch) if email is not None]
+    totals['errors'] += len(batch) - len(emails)
+    result = rules.plan(emails, planner, analyze_many=agent.analyze_emails,
+                        profiles=agent.profiles)
+    for name, count in result.rule_counts().items():
+        print(f"   {name}: {count}")
+    if args.dry_run:
+        _print_plan(result.plan, {email['id']: email for email in emails})
+    else:
+        planner.apply(result.plan, journal)
+    print(f"🏷️  {result.plan.report()}")
+    return result.plan
+
+
+def _print_plan(plan, emails: Dict):
+    from agent import EmailAgent
+
+    for email_id, actions in plan.actions.items():
+        subject = emails[email_id]['subject'] if email_id in emails else email_id
+        print(f"   {subject[:60]}")
+        for action in actions:
+            print(f"      → {EmailAgent.describe_action(action)}")
+
+
+def cmd_summarize(args) -> int:
+    from summarizer import chunk_emails
+
+    agent = make_agent(args)
+    query = build_query(args.query, args.since)
+    print(f"📬 Fetching up to {args.max_emails} emails matching '{query}'...")
+    emails = agent.gmail.get_recent_emails(max_results=args.max_emails, query=query)
+    if not emails:
+        print("✅ No emails to summarize!")
+        return 0
+
+    if args.dry_run:
+        chunks = chunk_emails(emails, agent.summarizer.token_budget)
+        prompts = len(chunks) + (1 if len(chunks) > 1 else 0)
+        print(f"📝 Would summarize {len(emails)} emails with {prompts} Claude call(s)")
+        return 0
+
+    print(f"🤔 Summarizing {len(emails)} emails...")
+    summary = agent.summarize_inbox(emails)
+    if not summary:
+        return 1
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(summary)
+        print(f"✅ Saved to {args.output}")
+    else:
+        print("\n" + summary)
+    return 0
+
+
+def cmd_bench(args) -> int:
+    sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+    import run_benchmarks
+
+    argv = list(args.bench_args)
+    if argv[:1] == ['--']:
+        argv = argv[1:]
+    if args.batch_size:
+        argv += ['--emails', str(args.batch_size)]
+    if args.concurrency:
+        argv += ['--concurrency', str(args.concurrency)]
+    run_benchmarks.main(argv)
+    return 0
+
+
+def cmd_serve(args) -> int:
+    import threading
+    import webbrowser
+
+    sys.path.insert(0, ROOT)
+    import web_gui
+
+    url = f'http://{args.host}:{args.port}'
+    if not args.no_browser:
+        threading.Timer(1.5, webbrowser.open, args=(url,)).start()
+    print(f"🤖 AgentSmith Web GUI at {url} (Ctrl+C to stop)")
+    web_gui.app.run(debug=False, host=args.host, port=args.port, threaded=True)
+    return 0
+
+
+# ---- argument parsing ----
+
+def add_selection(parser: argparse.ArgumentParser, max_emails: int, what: str):
+    """--max-emails and --since, with a default that suits the command."""
+    parser.add_argument('--max-emails', type=positive_int, default=max_emails,
+                        help=f"Most emails {what} (default: {max_emails})")
+    parser.add_argument('--since', type=since_query,
+                        help="Only emails newer than this: 7d, 2w, 3m, 1y or a date like 2026-10-01")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--concurrency', type=positive_int, default=0,
+                        help="Claude calls at once; Gmail fetches use twice as many threads "
+                             "(default: the agent's own settings)")
+    common.add_argument('--profile', nargs='?', const='-', metavar='FILE',
+                        help="Profile the run with cProfile: print the top functions, "
+                             "or save the stats to FILE")
+    common.add_argument('--token', default='token.json', help="Gmail token file (default: token.json)")
+    common.add_argument('--credentials', default='credentials.json',
+                        help="Gmail OAuth client file (default: credentials.json)")
+
+    parser = argparse.ArgumentParser(
+        prog='agentsmith', description="AgentSmith - your Gmail AI agent, non-interactive")
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    sync = commands.add_parser('sync', parents=[common],
+                               help="Download new mail into the local search index")
+    add_selection(sync, max_emails=1000, what="the first sync downloads")
+    sync.add_argument('--index', default=os.path.join('.cache', 'mail_index.sqlite3'),
+                      help="Index database file")
+    sync.set_defaults(func=cmd_sync)
+
+    triage = commands.add_parser('triage', parents=[common],
+                                 help="Analyze emails and apply labels")
+    add_selection(triage, max_emails=100, what="to triage")
+    triage.add_argument('--query', default='is:unread',
+                        help="Gmail query selecting the emails (default: is:unread)")
+    triage.add_argument('--batch-size', type=positive_int, default=50,
+                        help="Emails analyzed before their changes are applied (default: 50)")
+    triage.add_argument('--rules', metavar='FILE', help="Use a rules file (see src/rules.py) "
+                                                        "instead of the analysis' suggestions")
+    triage.add_argument('--dry-run', action='store_true',
+                        help="Show the changes without making them")
+    triage.add_argument('--journal', default=TRIAGE_JOURNAL,
+                        help="Journal that lets an interrupted run resume")
+    triage.set_defaults(func=cmd_triage)
+
+    summarize = commands.add_parser('summarize', parents=[common],
+                                    help="Summarize recent email")
+    add_selection(summarize, max_emails=30, what="to summarize")
+    summarize.add_argument('--query', default='', help="Gmail query selecting the emails")
+    summarize.add_argument('--output', metavar='FILE', help="Write the summary to FILE")
+    summarize.add_argument('--dry-run', action='store_true',
+                           help="Only count the emails and Claude calls needed")
+    summarize.set_defaults(func=cmd_summarize)
+
+    bench = commands.add_parser('bench', parents=[common],
+                                help="Offline benchmarks against fake Gmail and Claude")
+    bench.add_argument('--batch-size', type=positive_int,
+                       help="Emails per benchmark run (run_benchmarks.py --emails)")
+    bench.add_argument('bench_args', nargs=argparse.REMAINDER,
+                       help="Further run_benchmarks.py options, e.g. --model-latency 0.8")
+    bench.set_defaults(func=cmd_bench)
+
+    serve = commands.add_parser('serve', parents=[common], help="Start the web GUI")
+    serve.add_argument('--host', default='127.0.0.1', help="Address to listen on")
+    serve.add_argument('--port', type=int, default=5000, help="Port (default: 5000)")
+    serve.add_argument('--no-browser', action='store_true', help="Don't open a browser")
+    serve.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    from agent import load_env
+
+    args = build_parser().parse_args(argv)
+    # Before the first span: tracing reads AGENTSMITH_TRACE_FILE and
+    # AGENTSMITH_OTLP_ENDPOINT (possibly set in .env) only once
+    load_env()
+
+    if not args.profile:
+        status = args.func(args)
+    else:
+        profiler = cProfile.Profile()
+        status = profiler.runcall(args.func, args)
+        if args.profile == '-':
+            print("\n⏱️  Profile (top 25 by cumulative time)")
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+        else:
+            profiler.dump_stats(args.profile)
+            print(f"\n⏱️  Profile saved to {args.profile}")
+
+    if args.command != 'bench':
+        metrics.print_summary()
+    return status
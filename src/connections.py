@@ -0,0 +1,332 @@
+"""
+Connections - Shared HTTP clients and always-fresh credentials
+
+Opening a connection to Gmail or Claude costs a DNS lookup, a TCP
+handshake and a TLS handshake - often more than the API call itself.
+And Gmail access tokens last one hour: a web GUI left running, or a
+long triage run, used to stall on the first call after expiry while the
+token was refreshed (and the refreshed token was never saved).
+
+This module keeps one of each per process:
+
+- Credentials per token file, shared by every GmailHelper using it. A
+  background thread refreshes them a few minutes before they expire and
+  saves the new token atomically (write a temp file, then rename), so an
+  API call never waits for a refresh and token.json is never half-written.
+- One Gmail service per token file, plus a small pool of keep-alive
+  httplib2 connections. A connection isn't thread-safe, so each request
+  borrows one from the pool and gives it back afterwards - pipeline
+  workers and web requests start new threads all the time, but the
+  connections (and their TLS sessions) outlive them.
+- One Anthropic client per API key. It keeps its own connection pool
+  and is safe to share between threads.
+
+Usage:
+    service = gmail_service('token.json', 'credentials.json', GmailHelper.SCOPES)
+    with gmail_http('token.json', 'credentials.json', GmailHelper.SCOPES) as http:
+        profile = service.users().getProfile(userId='me').execute(http=http)
+    client = anthropic_client(api_key)
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import metrics
+
+# Refresh tokens this many seconds before they expire
+REFRESH_MARGIN = 300
+
+# Seconds to wait for Gmail before giving up on a request
+HTTP_TIMEOUT = 60
+
+# Idle Gmail connections kept per token file
+POOL_SIZE = 16
+
+_lock = threading.Lock()
+_credentials: Dict[str, 'SharedCredentials'] = {}
+_anthropic_clients: Dict[str, object] = {}
+_gmail_services: Dict[str, object] = {}
+_gmail_pools: Dict[str, 'HttpPool'] = {}
+_refresher: Optional['TokenRefresher'] = None
+
+
+def save_token(path: str, creds):
+    """Write credentials to a token file atomically, readable only by you."""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(temp_path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(creds.to_json())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+class AuthorizationRequired(RuntimeError):
+    """No usable token, and opening a browser to authorize wasn't allowed."""
+
+
+class SharedCredentials:
+    """OAuth credentials of one token file, refreshed under a lock."""
+
+    def __init__(self, token_file: str, credentials_file: str, scopes: List[str]):
+        self.token_file = token_file
+        self.credentials_file = credentials_file
+        self.scopes = scopes
+        self.creds = None
+        self._lock = threading.Lock()
+
+    def get(self, interactive: bool = True):
+        """
+        The credentials, loaded (or authorized in the browser) on first use.
+
+        Args:
+            interactive: Allow opening a browser to authorize; if False,
+                         raise AuthorizationRequired instead (for workers
+                         and scheduled runs, where nobody could click)
+        """
+        with self._lock:
+            if self.creds is None:
+                self.creds = self._load(interactive)
+            elif not self.creds.valid:
+                # The refresher missed it (e.g. the machine slept)
+                self._refresh()
+            return self.creds
+
+    def seconds_left(self) -> Optional[float]:
+        """Seconds until the access token expires (None if unknown)."""
+        expiry = getattr(self.creds, 'expiry', None)
+        if expiry is None:
+            return None
+        # google-auth keeps expiry as naive UTC
+        return (expiry - datetime.utcnow()).total_seconds()
+
+    def refresh_if_needed(self, margin: float = REFRESH_MARGIN) -> bool:
+        """Refresh if the token expires within `margin` seconds; True if refreshed."""
+        with self._lock:
+            if self.creds is None or not getattr(self.creds, 'refresh_token', None):
+                return False
+            left = self.seconds_left()
+            if left is not None and left > margin:
+                return False
+            self._refresh()
+            return True
+
+    def _load(self, interactive: bool = True):
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        creds = None
+        if os.path.exists(self.token_file):
+            creds = Credentials.from_authorized_user_file(self.token_file, self.scopes)
+
+        if creds and (creds.valid or creds.refresh_token):
+            if not creds.valid:
+                self.creds = creds
+                self._refresh()
+            return creds
+
+        if not interactive:
+            raise AuthorizationRequired(
+                f"{self.token_file} has no usable token - authorize this account first")
+
+        # First time: Open browser for authorization
+        flow = InstalledAppFlow.from_client_secrets_file(self.credentials_file, self.scopes)
+        creds = flow.run_local_server(port=0)
+        save_token(self.token_file, creds)
+        return creds
+
+    def _refresh(self):
+        """Refresh and save (call with the lock held)."""
+        from google.auth.transport.requests import Request
+
+        with metrics.registry.timer('agentsmith_token_refresh_seconds',
+                                    error_counter='agentsmith_token_refresh_errors_total'):
+            self.creds.refresh(Request())
+        save_token(self.token_file, self.creds)
+
+
+class TokenRefresher:
+    """Background thread refreshing every shared credential before it expires."""
+
+    def __init__(self, margin: float = REFRESH_MARGIN, interval: float = 60):
+        """
+        Args:
+            margin: Refresh tokens expiring within this many seconds
+            interval: Seconds between checks
+        """
+        self.margin = margin
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='token-refresher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def check(self) -> int:
+        """Refresh whatever is due now; returns how many were refreshed."""
+        with _lock:
+            shared = list(_credentials.values())
+        refreshed = 0
+        for credentials in shared:
+            try:
+                refreshed += credentials.refresh_if_needed(self.margin)
+            except Exception as e:
+                # Try again next round; a call made meanwhile refreshes inline
+                print(f"⚠️  Could not refresh {credentials.token_file}: {e}")
+        return refreshed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+
+def shared_credentials(token_file: str, credentials_file: str,
+                       scopes: List[str]) -> SharedCredentials:
+    """The process-wide credentials for a token file (starts the refresher)."""
+    global _refresher
+    key = os.path.abspath(token_file)
+    with _lock:
+        shared = _credentials.get(key)
+        if shared is None:
+            shared = _credentials[key] = SharedCredentials(token_file, credentials_file, scopes)
+        if _refresher is None:
+            _refresher = TokenRefresher()
+            _refresher.start()
+    return shared
+
+
+class HttpPool:
+    """Keep-alive HTTP connections that threads borrow one at a time."""
+
+    def __init__(self, factory, size: int = POOL_SIZE):
+        """
+        Args:
+            factory: Function creating a new connection
+            size: Most idle connections kept; extra ones are closed when returned
+        """
+        self.factory = factory
+        self.size = size
+        self._idle: List[object] = []
+        self._lock = threading.Lock()
+
+    def checkout(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        metrics.registry.inc('agentsmith_connections_opened_total', client='gmail')
+        return self.factory()
+
+    def checkin(self, http):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(http)
+                return
+        _close(http)
+
+    @contextmanager
+    def connection(self):
+        http = self.checkout()
+        try:
+            yield http
+        finally:
+            self.checkin(http)
+
+
+def _close(http):
+    for connection in getattr(getattr(http, 'http', http), 'connections', {}).values():
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def gmail_service(token_file: str, credentials_file: str, scopes: List[str],
+                  interactive: bool = True):
+    """
+    The process-wide Gmail service for a token file, built on first use.
+
+    Requests built from it are run with a connection from gmail_http().
+    With interactive=False, a missing token raises AuthorizationRequired
+    instead of opening a browser.
+    """
+    key = os.path.abspath(token_file)
+    with _lock:
+        service = _gmail_services.get(key)
+    if service is None:
+        from googleapiclient.discovery import build
+
+        # static_discovery uses the discovery document bundled with
+        # google-api-python-client instead of downloading it every time.
+        # Its own connection is only a fallback; requests borrow pooled ones.
+        service = build('gmail', 'v1', http=_gmail_pool(key, token_file, credentials_file,
+                                                        scopes, interactive).factory(),
+                        static_discovery=True, cache_discovery=False)
+        with _lock:
+            service = _gmail_services.setdefault(key, service)
+    return service
+
+
+@contextmanager
+def gmail_http(token_file: str, credentials_file: str, scopes: List[str],
+               interactive: bool = True):
+    """Borrow an authorized keep-alive connection for one Gmail request."""
+    pool = _gmail_pool(os.path.abspath(token_file), token_file, credentials_file, scopes,
+                       interactive)
+    with pool.connection() as http:
+        yield http
+
+
+def _gmail_pool(key: str, token_file: str, credentials_file: str,
+                scopes: List[str], interactive: bool = True) -> HttpPool:
+    with _lock:
+        pool = _gmail_pools.get(key)
+    if pool is not None:
+        return pool
+
+    creds = shared_credentials(token_file, credentials_file, scopes).get(interactive)
+
+    def connect():
+        import google_auth_httplib2
+        import httplib2
+        return google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+
+    with _lock:
+        return _gmail_pools.setdefault(key, HttpPool(connect))
+
+
+def anthropic_client(api_key: str):
+    """The process-wide Anthropic client for an API key."""
+    with _lock:
+        client = _anthropic_clients.get(api_key)
+        if client is None:
+            from anthropic import Anthropic
+            client = _anthropic_clients[api_key] = Anthropic(api_key=api_key)
+            metrics.registry.inc('agentsmith_connections_opened_total', client='anthropic')
+        return client
+
+
+def _after_fork():
+    """A forked worker process starts clean: threads and sockets don't carry over."""
+    global _lock, _refresher
+    _lock = threading.Lock()
+    _credentials.clear()
+    _anthropic_clients.clear()
+    _gmail_services.clear()
+    _gmail_pools.clear()
+    _refresher = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+metrics.registry.describe('agentsmith_connections_opened_total',
+                          'API clients created (each opens its own keep-alive connections).')
+metrics.registry.describe('agentsmith_token_refresh_seconds', 'Time taken to refresh Gmail tokens.')
+metrics.registry.describe('agentsmith_token_refresh_errors_total', 'Failed Gmail token refreshes.')
@@ -0,0 +1,196 @@
+"""
+Near-Duplicate Detection - Group look-alike emails together
+
+CI alerts, shipping updates and social notifications arrive in floods of
+almost identical emails. Analyzing each one separately wastes model calls,
+so we group them first and only analyze one email per group.
+
+How it works:
+- Normalize subject + body (lowercase, hide numbers, URLs and IDs)
+- Compute a 64-bit SimHash: similar texts get hashes that differ in few bits
+- Emails from the same sender whose hashes are within a few bits of each
+  other are treated as near-duplicates
+"""
+
+import hashlib
+import re
+import threading
+from concurrent.futures import Future
+from email.utils import parseaddr
+from typing import Dict, List, Optional, Tuple
+
+HASH_BITS = 64
+
+# Split the hash into bands for fast lookup. With 4 bands, two hashes that
+# differ in at most 3 bits must match exactly in at least one band.
+BANDS = 4
+BAND_BITS = HASH_BITS // BANDS
+
+DEFAULT_MAX_DISTANCE = 3
+
+_URL_RE = re.compile(r'https?://\S+|www\.\S+')
+_EMAIL_RE = re.compile(r'\S+@\S+')
+_NUMBER_RE = re.compile(r'\b\w*\d\w*\b')
+_WORD_RE = re.compile(r'\w+')
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase text and mask the parts that change between notifications."""
+    text = text.lower()
+    text = _URL_RE.sub(' url ', text)
+    text = _EMAIL_RE.sub(' addr ', text)
+    text = _NUMBER_RE.sub(' num ', text)
+    return ' '.join(_WORD_RE.findall(text))
+
+
+def normalize_sender(sender: str) -> str:
+    """Reduce a From header to a lowercase email address."""
+    return parseaddr(sender)[1].lower() or sender.strip().lower()
+
+
+def _feature_hash(feature: str) -> int:
+    digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def simhash(text: str) -> int:
+    """
+    Compute a 64-bit SimHash of text using word 3-grams as features.
+    """
+    words = text.split()
+    if len(words) < 3:
+        features = words or ['']
+    else:
+        features = [' '.join(words[i:i + 3]) for i in range(len(words) - 2)]
+
+    counts = [0] * HASH_BITS
+    for feature in features:
+        h = _feature_hash(feature)
+        for bit in range(HASH_BITS):
+            counts[bit] += 1 if h >> bit & 1 else -1
+
+    value = 0
+    for bit in range(HASH_BITS):
+        if counts[bit] > 0:
+            value |= 1 << bit
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of bits that differ between two hashes."""
+    return bin(a ^ b).count('1')
+
+
+def email_fingerprint(email: Dict, body_chars: int = 2000) -> int:
+    """SimHash of an email's normalized subject and the start of its body."""
+    text = f"{email.get('subject', '')} {email.get('body', '')[:body_chars]}"
+    return simhash(normalize_text(text))
+
+
+class NearDuplicateIndex:
+    """
+    Finds previously added emails that look like a new one.
+
+    Usage:
+        index = NearDuplicateIndex()
+        for email in emails:
+            match = index.find(email)     # ID of a look-alike, or None
+            index.add(email)
+    """
+
+    def __init__(self, max_distance: int = DEFAULT_MAX_DISTANCE):
+        if max_distance >= BANDS:
+            raise ValueError(f"max_distance must be less than {BANDS}")
+        self.max_distance = max_distance
+        # (sender, band number, band value) -> [(fingerprint, email id)]
+        self._buckets: Dict[tuple, List[tuple]] = {}
+
+    def find(self, email: Dict, fingerprint: Optional[int] = None) -> Optional[str]:
+        """Return the ID of a near-duplicate already in the index, if any."""
+        if fingerprint is None:
+            fingerprint = email_fingerprint(email)
+        for key in self._keys(email, fingerprint):
+            for other_fingerprint, other_id in self._buckets.get(key, ()):
+                if hamming_distance(fingerprint, other_fingerprint) <= self.max_distance:
+                    return other_id
+        return None
+
+    def add(self, email: Dict, fingerprint: Optional[int] = None):
+        """Add an email to the index."""
+        if fingerprint is None:
+            fingerprint = email_fingerprint(email)
+        for key in self._keys(email, fingerprint):
+            self._buckets.setdefault(key, []).append((fingerprint, email['id']))
+
+    @staticmethod
+    def _keys(email: Dict, fingerprint: int):
+        sender = normalize_sender(email.get('from', ''))
+        mask = (1 << BAND_BITS) - 1
+        for band in range(BANDS):
+            yield (sender, band, fingerprint >> (band * BAND_BITS) & mask)
+
+
+def cluster_emails(emails: List[Dict],
+                   max_distance: int = DEFAULT_MAX_DISTANCE) -> List[List[Dict]]:
+    """
+    Group near-duplicate emails.
+
+    Returns a list of clusters. The first email of each cluster is its
+    representative; clusters keep the order in which emails were given.
+    """
+    index = NearDuplicateIndex(max_distance)
+    clusters: Dict[str, List[Dict]] = {}
+
+    for email in emails:
+        fingerprint = email_fingerprint(email)
+        representative_id = index.find(email, fingerprint)
+        if representative_id is None:
+            clusters[email['id']] = [email]
+            index.add(email, fingerprint)
+        else:
+            clusters[representative_id].append(email)
+
+    return list(clusters.values())
+
+
+class StreamingDeduplicator:
+    """
+    Shares one result between near-duplicates while emails arrive one by one.
+
+    Safe to use from several threads: if a look-alike email is still
+    being analyzed by another thread, we wait for its result instead of
+    starting a second analysis.
+
+    Usage:
+        dedupe = StreamingDeduplicator()
+        analysis, duplicate_of = dedupe.run(email, agent.analyze_email)
+    """
+
+    def __init__(self, max_distance: int = DEFAULT_MAX_DISTANCE):
+        self.index = NearDuplicateIndex(max_distance)
+        self._lock = threading.Lock()
+        self._futures: Dict[str, Future] = {}
+
+    def run(self, email: Dict, func) -> Tuple[object, Optional[str]]:
+        """
+        Return (func(email) or a look-alike's result, look-alike's ID or None).
+        """
+        fingerprint = email_fingerprint(email)
+        with self._lock:
+            representative_id = self.index.find(email, fingerprint)
+            if representative_id is None:
+                future = self._futures[email['id']] = Future()
+                self.index.add(email, fingerprint)
+            else:
+                future = self._futures[representative_id]
+
+        if representative_id is not None:
+            return future.result(), representative_id
+
+        try:
+            result = func(email)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        future.set_result(result)
+        return result, None
@@ -0,0 +1,270 @@
+"""
+Draft Cache - Have replies ready before you ask for them
+
+Drafting a reply takes Claude several seconds, and that wait used to
+start only when you clicked "Draft reply". But once an email has been
+analyzed we already know which ones need an answer (action_needed), so
+the ReplyDrafter writes those replies in the background while you are
+still reading - and clicking shows the finished draft at once.
+
+Drafts are cached per email, along with a version of its conversation
+(how many messages it has and which is the latest). When you open the
+draft, the version is checked again: if someone has replied in the
+meantime the draft is out of date, so it is written again with the
+conversation's later messages added to the prompt.
+
+Usage:
+    drafter = ReplyDrafter(agent)
+    drafter.schedule(email, analysis)       # after analyzing
+    ...
+    draft = drafter.get(email, wait=True)   # instant if it's done
+    print(draft['reply'])
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import metrics
+import prompts
+import tracing
+
+DEFAULT_DRAFTS_PATH = os.path.join('.cache', 'reply_drafts.jsonl')
+
+
+class DraftCache:
+    """Generated replies by email ID, kept in a JSONL file."""
+
+    def __init__(self, path: Optional[str] = DEFAULT_DRAFTS_PATH,
+                 max_age: float = 3 * 86400, max_entries: int = 5000):
+        """
+        Args:
+            path: JSONL file to keep drafts in (None: memory only)
+            max_age: Seconds a draft stays usable
+            max_entries: Oldest drafts are dropped beyond this
+        """
+        self.path = path
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+
+        self._file = None
+        if path:
+            folder = os.path.dirname(path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            records = self._load()
+            if records > 2 * len(self._entries) + 100:
+                self._rewrite()
+            self._file = open(path, 'a', encoding='utf-8')
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, email_id: str) -> Optional[Dict]:
+        """The cached entry ({'id', 'reply', 'thread_version', 'created_at'}) or None."""
+        with self._lock:
+            entry = self._entries.get(email_id)
+        if entry is not None and time.time() - entry['created_at'] > self.max_age:
+            self.forget(email_id)
+            return None
+        return entry
+
+    def put(self, email_id: str, reply: str, thread_version: Optional[str] = None):
+        entry = {'id': email_id, 'reply': reply, 'thread_version': thread_version,
+                 'created_at': time.time()}
+        with self._lock:
+            self._entries.pop(email_id, None)
+            self._entries[email_id] = entry
+            while len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+            self._append({'op': 'put', **entry})
+
+    def forget(self, email_id: str):
+        with self._lock:
+            if self._entries.pop(email_id, None) is not None:
+                self._append({'op': 'drop', 'id': email_id})
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _append(self, record: Dict):
+        if self._file is not None:
+            self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+            self._file.flush()
+
+    def _load(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        now = time.time()
+        records = 0
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records += 1
+                if record.get('op') == 'put':
+                    del record['op']
+                    self._entries.pop(record['id'], None)
+                    if now - record['created_at'] <= self.max_age:
+                        self._entries[record['id']] = record
+                elif record.get('op') == 'drop':
+                    self._entries.pop(record.get('id'), None)
+        return records
+
+    def _rewrite(self):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for entry in self._entries.values():
+                f.write(json.dumps({'op': 'put', **entry}, separators=(',', ':')) + '\n')
+        os.replace(temp_path, self.path)
+
+
+class ReplyDrafter:
+    """Writes replies in background threads and serves them from a DraftCache."""
+
+    def __init__(self, agent, cache: Optional[DraftCache] = None, workers: int = 2):
+        """
+        Args:
+            agent: EmailAgent that writes the replies
+            cache: Where drafts are kept (default: a DraftCache in .cache/)
+            workers: Replies written at the same time
+        """
+        self.agent = agent
+        self.cache = cache if cache is not None else DraftCache()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='drafter')
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+
+    def schedule(self, email: Dict, analysis: Optional[Dict] = None) -> bool:
+        """
+        Start drafting a reply in the background if the email needs one.
+
+        Args:
+            email: The email
+            analysis: Its analysis; nothing is drafted unless action_needed
+                      (None: draft regardless)
+
+        Returns:
+            True if a draft was started
+        """
+        if analysis is not None and (not analysis.get('action_needed') or "error" in analysis):
+            return False
+        with self._lock:
+            if email['id'] in self._pending or self.cache.get(email['id']) is not None:
+                return False
+            self._submit(email)
+        metrics.registry.inc('agentsmith_reply_drafts_total', result='scheduled')
+        return True
+
+    def schedule_many(self, emails: List[Dict], analyses: Dict[str, Dict]) -> int:
+        """Schedule drafts for every email whose analysis needs action; returns how many."""
+        return sum(self.schedule(email, analyses.get(email['id'], {})) for email in emails)
+
+    def status(self, email_id: str) -> str:
+        """'ready', 'pending' or 'none'."""
+        if self.cache.get(email_id) is not None:
+            return 'ready'
+        with self._lock:
+            return 'pending' if email_id in self._pending else 'none'
+
+    def get(self, email: Dict, wait: bool = False, verify: bool = True) -> Optional[Dict]:
+        """
+        The reply for an email.
+
+        Args:
+            email: The email
+            wait: If no draft is ready, wait for (or write) one instead of
+                  returning None
+            verify: Check the conversation hasn't changed since the draft
+                    was written (one small Gmail call)
+
+        Returns:
+            {'reply': text, 'cached': True if it was written ahead of time}
+            or None
+        """
+        entry = self.cache.get(email['id'])
+        if entry is not None and verify and not self._is_current(email, entry):
+            # Someone replied since: redraft with the newer messages in the prompt
+            metrics.registry.inc('agentsmith_reply_drafts_total', result='stale')
+            self.cache.forget(email['id'])
+            entry = None
+            with self._lock:
+                if email['id'] not in self._pending:
+                    self._submit(email, with_thread=True)
+        if entry is not None:
+            metrics.registry.inc('agentsmith_reply_drafts_total', result='hit')
+            return {'reply': entry['reply'], 'cached': True}
+
+        with self._lock:
+            future = self._pending.get(email['id'])
+        if not wait:
+            return None
+
+        metrics.registry.inc('agentsmith_reply_drafts_total', result='miss')
+        if future is not None:
+            reply = future.result()
+        else:
+            reply = self._draft(email)
+        return {'reply': reply, 'cached': False} if reply else None
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+    def _submit(self, email: Dict, with_thread: bool = False):
+        """Start drafting in the pool (call with self._lock held)."""
+        self._pending[email['id']] = self._pool.submit(
+            tracing.propagate(self._draft), email, with_thread)
+
+    def _draft(self, email: Dict, with_thread: bool = False) -> str:
+        try:
+            # Note the version first: a reply arriving while we draft makes the draft stale
+            version = self._thread_version(email)
+            context = self._later_messages(email) if with_thread else ""
+            reply = self.agent.draft_reply(email, context)
+            if reply:
+                self.cache.put(email['id'], reply, version)
+            return reply
+        finally:
+            with self._lock:
+                self._pending.pop(email['id'], None)
+
+    def _thread_version(self, email: Dict) -> Optional[str]:
+        if not email.get('thread_id'):
+            return None
+        try:
+            return self.agent.gmail.get_thread_version(email['thread_id'])
+        except Exception as e:
+            print(f"Error checking thread {email['thread_id']}: {e}")
+            return None
+
+    def _later_messages(self, email: Dict) -> str:
+        """Prompt context with the thread's messages newer than the email ('' if none)."""
+        thread = self.agent.gmail.get_thread(email['thread_id']) if email.get('thread_id') else None
+        if not thread:
+            return ""
+        # Our own unsent drafts (e.g. a reply saved earlier) aren't part of the conversation
+        messages = [m for m in thread['messages'] if 'DRAFT' not in (m.get('labels') or [])]
+        ids = [message['id'] for message in messages]
+        later = messages[ids.index(email['id']) + 1:] if email['id'] in ids else []
+        return prompts.get_thread_reply_context(later) if later else ""
+
+    def _is_current(self, email: Dict, entry: Dict) -> bool:
+        if entry.get('thread_version') is None:
+            return True
+        current = self._thread_version(email)
+        # If Gmail can't be asked, the draft is still the best we have
+        return current is None or current == entry['thread_version']
+
+
+metrics.registry.describe('agentsmith_reply_drafts_total',
+                          'Background reply drafts by result (scheduled, hit, miss, stale).')
@@ -0,0 +1,164 @@
+"""
+Email Record - A compact, dictionary-like email
+
+An email used to be a plain dict holding its full decoded body. With
+tens of thousands of emails in memory (the web GUI keeps every fetched
+email) that adds up fast. EmailRecord stores the same data in far less
+space:
+
+- __slots__ instead of a per-object dict
+- label IDs and senders are interned (one shared copy of 'INBOX', etc.)
+- bodies are kept zlib-compressed, or not kept at all and loaded on
+  demand through a body_loader function
+
+It still behaves like the old dict, so email['subject'], email.get('body')
+and dict(email) keep working everywhere.
+"""
+
+import sys
+import zlib
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterator, List, Optional
+
+# Bodies shorter than this aren't worth compressing
+COMPRESS_MIN_CHARS = 256
+
+# Dictionary key -> attribute name ('from' is a Python keyword)
+_FIELDS = {
+    'id': 'id',
+    'thread_id': 'thread_id',
+    'subject': 'subject',
+    'from': 'sender',
+    'to': 'to',
+    'date': 'date',
+    'body': 'body',
+    'labels': 'labels',
+    'snippet': 'snippet',
+    'attachments': 'attachments',
+    'message_id': 'message_id',
+    'references': 'references',
+    'reply_to': 'reply_to',
+}
+
+
+class EmailRecord(Mapping):
+    """
+    One email, readable like a dictionary.
+
+    Usage:
+        email = EmailRecord(id='18c...', subject='Hello', body='...')
+        print(email['subject'], email['from'])
+        data = email.to_dict()   # plain dict, e.g. for JSON
+    """
+
+    __slots__ = ('id', 'thread_id', 'subject', 'sender', 'to', 'date',
+                 'snippet', 'message_id', 'references', 'reply_to',
+                 '_labels', '_attachments', '_body', '_body_loader')
+
+    def __init__(self, id: str, thread_id: str = '', subject: str = '',
+                 sender: str = '', to: str = '', date: str = '',
+                 body: Optional[str] = None, labels: Optional[List[str]] = None,
+                 snippet: str = '', attachments: Optional[List[Dict]] = None,
+                 body_loader: Optional[Callable[[str], str]] = None,
+                 message_id: str = '', references: str = '', reply_to: str = ''):
+        """
+        Args:
+            body: Body text; leave as None and pass body_loader to load it lazily
+            body_loader: Function called with the email ID to fetch the body
+                         the first time it is needed
+            message_id, references, reply_to: Message-ID, References and
+                         Reply-To headers, needed to thread a reply
+        """
+        self.id = id
+        self.thread_id = thread_id
+        self.subject = subject
+        self.sender = sys.intern(sender)
+        self.to = to
+        self.date = date
+        self.snippet = snippet
+        self.message_id = message_id
+        self.references = references
+        self.reply_to = reply_to
+        self._labels = tuple(sys.intern(label) for label in labels or ())
+        self._attachments = tuple(attachments or ())
+        self._body_loader = body_loader
+        self._body = None
+        if body is not None:
+            self.body = body
+
+    @classmethod
+    def from_dict(cls, data: Dict, body_loader: Optional[Callable[[str], str]] = None):
+        """Build a record from an email dictionary."""
+        return cls(
+            id=data['id'],
+            thread_id=data.get('thread_id', ''),
+            subject=data.get('subject', ''),
+            sender=data.get('from', ''),
+            to=data.get('to', ''),
+            date=data.get('date', ''),
+            body=data.get('body'),
+            labels=data.get('labels'),
+            snippet=data.get('snippet', ''),
+            attachments=data.get('attachments'),
+            body_loader=body_loader,
+            message_id=data.get('message_id', ''),
+            references=data.get('references', ''),
+            reply_to=data.get('reply_to', ''),
+        )
+
+    @property
+    def body(self) -> str:
+        """Body text, decompressed (or loaded) on access."""
+        if self._body is None:
+            if self._body_loader is None:
+                return ''
+            # Loaded bodies are not kept - the loader is the storage
+            return self._body_loader(self.id)
+        if isinstance(self._body, bytes):
+            return zlib.decompress(self._body).decode('utf-8')
+        return self._body
+
+    @body.setter
+    def body(self, text: str):
+        if len(text) >= COMPRESS_MIN_CHARS:
+            self._body = zlib.compress(text.encode('utf-8'), 1)
+        else:
+            self._body = text
+
+    @property
+    def labels(self) -> List[str]:
+        return list(self._labels)
+
+    @property
+    def attachments(self) -> List[Dict]:
+        return list(self._attachments)
+
+    def has_label(self, label_id: str) -> bool:
+        return label_id in self._labels
+
+    def to_dict(self) -> Dict:
+        """A plain dictionary copy (with the body decompressed)."""
+        return {key: getattr(self, attr) for key, attr in _FIELDS.items()}
+
+    # Mapping interface - what makes email['subject'] work
+
+    def __getitem__(self, key: str):
+        try:
+            attr = _FIELDS[key]
+        except KeyError:
+            raise KeyError(key) from None
+        return getattr(self, attr)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(_FIELDS)
+
+    def __len__(self) -> int:
+        return len(_FIELDS)
+
+    def __reduce__(self):
+        # Pickle as a plain dict so records can cross process boundaries
+        # (a body_loader usually can't be pickled)
+        return (EmailRecord.from_dict, (self.to_dict(),))
+
+    def __repr__(self):
+        return f"<EmailRecord {self.id} {self.subject[:40]!r}>"
@@ -5,14 +5,21 @@ This module makes it easy to interact with Gmail without dealing with
 the complexity of the Google API directly.
 """
 
-import os
 import base64
-from email.mime.text import MIMEText
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+
+import connections
+import metrics
+import tracing
+from email_record import EmailRecord
+from attachments import DEFAULT_CACHE_DIR, AttachmentCache, AttachmentHandle
+from mime_parser import DEFAULT_MAX_BODY_BYTES, extract_body, iter_parts, list_attachments
+from replies import build_reply
+
+# The Google client libraries are slow to import, so they are imported
+# (in connections.py) only when we actually talk to Gmail.
 
 
 class GmailHelper:
@@ -34,50 +41,92 @@ class GmailHelper:
         'https://www.googleapis.com/auth/gmail.modify'
     ]
 
-    def __init__(self, credentials_file='credentials.json', token_file='token.json'):
+    # Most message IDs messages.batchModify accepts per call
+    BATCH_MODIFY_LIMIT = 1000
+
+    def __init__(self, credentials_file='credentials.json', token_file='token.json',
+                 service=None, max_body_bytes=DEFAULT_MAX_BODY_BYTES,
+                 attachment_cache_dir=DEFAULT_CACHE_DIR, rate_limiter=None, index=None,
+                 interactive=True):
         """
         Initialize Gmail connection.
 
+        Nothing is loaded here - authentication runs on the first API call.
+
         Args:
             credentials_file: Path to OAuth credentials from Google Cloud
             token_file: Path where the access token will be stored
+            service: Ready-made Gmail API service to use instead of authenticating
+            max_body_bytes: Decode at most this many bytes of each email body
+            attachment_cache_dir: Where downloaded attachments are kept
+            rate_limiter: Optional RateLimiter (in Gmail quota units) that
+                          every API call waits on
+            index: Optional MailIndex that search() answers from once synced
+                   (see mail_sync.py)
+            interactive: Open a browser to authorize if there is no usable
+                         token; if False, API calls raise
+                         connections.AuthorizationRequired instead
         """
         self.credentials_file = credentials_file
         self.token_file = token_file
-        self.service = self._authenticate()
+        self.max_body_bytes = max_body_bytes
+        self.attachment_cache = AttachmentCache(attachment_cache_dir)
+        self.rate_limiter = rate_limiter
+        self.index = index
+        self.interactive = interactive
+        self._service = service
+        self._label_lock = threading.Lock()
+        self._label_ids: Optional[Dict[str, str]] = None  # label name -> ID
+
+    @property
+    def service(self):
+        """
+        The Gmail API service, authenticated on first access.
+
+        Shared by every GmailHelper in the process using the same token
+        file; each request borrows a pooled keep-alive connection in
+        _execute, so connections are opened once and reused by whichever
+        thread comes next (see connections.py).
+        """
+        if self._service is not None:
+            return self._service
+        return self._authenticate()
 
     def _authenticate(self):
         """
         Handles OAuth authentication with Gmail.
 
         First time: Opens browser for authorization
-        After: Uses saved token
+        After: Uses saved token, refreshed in the background before it expires
         """
-        creds = None
+        return connections.gmail_service(self.token_file, self.credentials_file, self.SCOPES,
+                                         self.interactive)
 
-        # Load existing token if it exists
-        if os.path.exists(self.token_file):
-            creds = Credentials.from_authorized_user_file(self.token_file, self.SCOPES)
+    def _get_credentials(self):
+        """OAuth credentials for this token file (shared within the process)."""
+        return connections.shared_credentials(
+            self.token_file, self.credentials_file, self.SCOPES).get(self.interactive)
 
-        # If no valid credentials, authenticate
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                # Refresh expired token
-                creds.refresh(Request())
-            else:
-                # First time: Open browser for authorization
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    self.credentials_file, self.SCOPES)
-                creds = flow.run_local_server(port=0)
+    def _execute(self, method: str, request):
+        """
+        Run one Gmail API request, recording its latency, errors and quota
+        (and a trace span when tracing is on).
 
-            # Save credentials for next time
-            with open(self.token_file, 'w') as token:
-                token.write(creds.to_json())
+        Args:
+            method: API method name for metrics (e.g. 'messages.get')
+            request: The request object built by the Gmail service
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(metrics.GMAIL_QUOTA_UNITS.get(method, 5))
 
-        # Build and return the Gmail service
-        return build('gmail', 'v1', credentials=creds)
+        with tracing.start_span(f'gmail.{method}'), metrics.record_gmail_call(method):
+            if self._service is not None:
+                return request.execute()
+            with connections.gmail_http(self.token_file, self.credentials_file,
+                                        self.SCOPES, self.interactive) as http:
+                return request.execute(http=http)
 
-    def get_recent_emails(self, max_results=10, query='') -> List[Dict]:
+    def get_recent_emails(self, max_results=10, query='') -> List[EmailRecord]:
         """
         Get recent emails from inbox.
 
@@ -86,22 +135,17 @@ class GmailHelper:
             query: Gmail search query (e.g., 'is:unread', 'from:boss@company.com')
 
         Returns:
-            List of email dictionaries with 'id', 'subject', 'from', 'body', etc.
+            List of emails (EmailRecord - read them like dictionaries:
+            email['subject'], email['from'], email['body'], etc.)
         """
         try:
             # Search for messages
-            results = self.service.users().messages().list(
-                userId='me',
-                maxResults=max_results,
-                q=query
-            ).execute()
-
-            messages = results.get('messages', [])
+            message_ids = self.list_message_ids(max_results=max_results, query=query)
 
             # Get full details for each message
             emails = []
-            for message in messages:
-                email = self.get_email(message['id'])
+            for message_id in message_ids:
+                email = self.get_email(message_id)
                 if email:
                     emails.append(email)
 
@@ -111,11 +155,53 @@ class GmailHelper:
             print(f"Error fetching emails: {e}")
             return []
 
-    def get_unread_emails(self, max_results=10) -> List[Dict]:
+    def list_message_ids(self, max_results=10, query='') -> List[str]:
+        """
+        Get the IDs of matching messages, newest first, without fetching them.
+
+        Follows result pages until max_results IDs are found.
+        """
+        message_ids = []
+        page_token = None
+        while len(message_ids) < max_results:
+            results = self._execute('messages.list', self.service.users().messages().list(
+                userId='me',
+                maxResults=min(500, max_results - len(message_ids)),
+                q=query,
+                pageToken=page_token
+            ))
+            message_ids.extend(m['id'] for m in results.get('messages', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+        return message_ids
+
+    def search(self, query: str, max_results=10) -> List[EmailRecord]:
+        """
+        Find emails matching a Gmail query.
+
+        Answered from the local index (no API calls) when there is a synced
+        index and it understands the query; otherwise Gmail is asked, like
+        get_recent_emails().
+        """
+        if self.index is not None and self.index.history_id is not None:
+            try:
+                ids = self.index.search(query, max_results, label_ids=self.get_label_ids())
+            except Exception as e:
+                print(f"Error searching index: {e}")
+                ids = None
+            if ids is not None:
+                metrics.registry.inc('agentsmith_search_total', source='index')
+                return [email for email in map(self.index.get, ids) if email is not None]
+
+        metrics.registry.inc('agentsmith_search_total', source='api')
+        return self.get_recent_emails(max_results=max_results, query=query)
+
+    def get_unread_emails(self, max_results=10) -> List[EmailRecord]:
         """Get unread emails."""
         return self.get_recent_emails(max_results=max_results, query='is:unread')
 
-    def get_email(self, email_id: str) -> Optional[Dict]:
+    def get_email(self, email_id: str) -> Optional[EmailRecord]:
         """
         Get full details of a specific email.
 
@@ -123,44 +209,211 @@ class GmailHelper:
             email_id: Gmail message ID
 
         Returns:
-            Dictionary with email details
+            EmailRecord with email details (works like a dictionary)
         """
         try:
-            message = self.service.users().messages().get(
+            return self._parse_message(self.get_message(email_id))
+
+        except Exception as e:
+            print(f"Error fetching email {email_id}: {e}")
+            return None
+
+    def get_message(self, email_id: str) -> Dict:
+        """The raw Gmail API message (format='full'), e.g. for its internalDate."""
+        return self._execute('messages.get', self.service.users().messages().get(
+            userId='me',
+            id=email_id,
+            format='full'
+        ))
+
+    def get_profile(self) -> Dict:
+        """Mailbox profile: emailAddress, messagesTotal and the current historyId."""
+        return self._execute('getProfile', self.service.users().getProfile(userId='me'))
+
+    def list_history(self, start_history_id: str,
+                     history_types: Optional[List[str]] = None) -> tuple:
+        """
+        Changes to the mailbox since start_history_id.
+
+        Returns:
+            (history records, oldest first; the latest history ID)
+
+        Raises:
+            The API's HttpError (status 404) if start_history_id is too old
+            - then a full sync is needed
+        """
+        records = []
+        page_token = None
+        while True:
+            results = self._execute('history.list', self.service.users().history().list(
                 userId='me',
-                id=email_id,
-                format='full'
-            ).execute()
+                startHistoryId=start_history_id,
+                historyTypes=history_types,
+                maxResults=500,
+                pageToken=page_token
+            ))
+            records.extend(results.get('history', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return records, results.get('historyId', start_history_id)
+
+    def _parse_message(self, message: Dict) -> EmailRecord:
+        """Turn a Gmail API message (format='full') into an email record."""
+        # Extract headers
+        headers = message['payload']['headers']
+        subject = self._get_header(headers, 'Subject')
+        from_email = self._get_header(headers, 'From')
+        date = self._get_header(headers, 'Date')
+        to = self._get_header(headers, 'To')
+
+        # Extract body
+        body = self._get_body(message['payload'])
+
+        # Get labels
+        labels = message.get('labelIds', [])
+
+        return EmailRecord(
+            id=message['id'],
+            thread_id=message['threadId'],
+            subject=subject,
+            sender=from_email,
+            to=to,
+            date=date,
+            body=body,
+            labels=labels,
+            snippet=message.get('snippet', ''),
+            attachments=list_attachments(message['payload']),
+            # Needed to thread replies (see replies.py)
+            message_id=self._get_header(headers, 'Message-ID'),
+            references=self._get_header(headers, 'References'),
+            reply_to=self._get_header(headers, 'Reply-To')
+        )
+
+    def get_recent_threads(self, max_results=10, query='') -> List[Dict]:
+        """
+        Get recent conversations (threads) from the mailbox.
 
-            # Extract headers
-            headers = message['payload']['headers']
-            subject = self._get_header(headers, 'Subject')
-            from_email = self._get_header(headers, 'From')
-            date = self._get_header(headers, 'Date')
-            to = self._get_header(headers, 'To')
+        Args:
+            max_results: Maximum number of threads to fetch
+            query: Gmail search query (e.g., 'is:unread')
 
-            # Extract body
-            body = self._get_body(message['payload'])
+        Returns:
+            List of thread dictionaries (see get_thread)
+        """
+        try:
+            results = self._execute('threads.list', self.service.users().threads().list(
+                userId='me',
+                maxResults=max_results,
+                q=query
+            ))
+
+            threads = []
+            for item in results.get('threads', []):
+                thread = self.get_thread(item['id'])
+                if thread:
+                    threads.append(thread)
+
+            return threads
 
-            # Get labels
-            labels = message.get('labelIds', [])
+        except Exception as e:
+            print(f"Error fetching threads: {e}")
+            return []
+
+    def get_thread(self, thread_id: str) -> Optional[Dict]:
+        """
+        Get a whole conversation with a single API call.
+
+        Args:
+            thread_id: Gmail thread ID (email['thread_id'])
+
+        Returns:
+            Dictionary with 'id', 'subject', 'messages' (email dictionaries,
+            oldest first), 'labels' (union over all messages) and 'snippet'
+        """
+        try:
+            thread = self._execute('threads.get', self.service.users().threads().get(
+                userId='me',
+                id=thread_id,
+                format='full'
+            ))
+
+            messages = [self._parse_message(m) for m in thread.get('messages', [])]
+            if not messages:
+                return None
+
+            labels = []
+            for message in messages:
+                for label in message['labels']:
+                    if label not in labels:
+                        labels.append(label)
 
             return {
-                'id': email_id,
-                'thread_id': message['threadId'],
-                'subject': subject,
-                'from': from_email,
-                'to': to,
-                'date': date,
-                'body': body,
+                'id': thread_id,
+                'subject': messages[0]['subject'],
+                'messages': messages,
                 'labels': labels,
-                'snippet': message.get('snippet', '')
+                'snippet': messages[-1]['snippet']
             }
 
         except Exception as e:
-            print(f"Error fetching email {email_id}: {e}")
+            print(f"Error fetching thread {thread_id}: {e}")
             return None
 
+    def get_thread_version(self, thread_id: str) -> str:
+        """
+        A short string that changes when a message is added to or removed
+        from a thread (but not when labels change), e.g. '3:18c4...'.
+
+        Drafts don't count: saving a reply mustn't make the thread look changed.
+        """
+        thread = self._execute('threads.get', self.service.users().threads().get(
+            userId='me',
+            id=thread_id,
+            format='minimal',
+            fields='messages(id,labelIds)'
+        ))
+        ids = [message['id'] for message in thread.get('messages', [])
+               if 'DRAFT' not in message.get('labelIds', [])]
+        return f"{len(ids)}:{ids[-1] if ids else ''}"
+
+    def get_attachments(self, email: Dict) -> List[AttachmentHandle]:
+        """
+        Get handles for an email's attachments.
+
+        Nothing is downloaded yet - call read(), path() or mmap() on a
+        handle to fetch it (once) into the attachment cache.
+        """
+        return [
+            AttachmentHandle(self, email['id'], info, self.attachment_cache)
+            for info in email.get('attachments', [])
+        ]
+
+    def download_attachment(self, message_id: str, info: Dict) -> str:
+        """
+        Download one attachment's contents as base64url text.
+
+        Prefer AttachmentHandle.read(), which caches the result.
+        """
+        if info.get('attachment_id'):
+            request = self.service.users().messages().attachments().get(
+                userId='me',
+                messageId=message_id,
+                id=info['attachment_id']
+            )
+            result = self._execute('messages.attachments.get', request)
+            return result.get('data', '')
+
+        # Small attachments come inline with the message itself
+        message = self._execute('messages.get', self.service.users().messages().get(
+            userId='me',
+            id=message_id,
+            format='full'
+        ))
+        for part in iter_parts(message['payload']):
+            if part.get('partId') == info['part_id']:
+                return part.get('body', {}).get('data', '')
+        raise KeyError(f"Attachment part {info['part_id']} not found in {message_id}")
+
     def _get_header(self, headers: List[Dict], name: str) -> str:
         """Extract a specific header value."""
         for header in headers:
@@ -171,25 +424,11 @@ class GmailHelper:
     def _get_body(self, payload: Dict) -> str:
         """
         Extract email body from payload.
-        Handles plain text and HTML.
-        """
-        body = ''
-
-        if 'parts' in payload:
-            # Multipart message
-            for part in payload['parts']:
-                if part['mimeType'] == 'text/plain':
-                    if 'data' in part['body']:
-                        body = base64.urlsafe_b64decode(
-                            part['body']['data']).decode('utf-8')
-                        break
-        else:
-            # Simple message
-            if 'data' in payload['body']:
-                body = base64.urlsafe_b64decode(
-                    payload['body']['data']).decode('utf-8')
-
-        return body
+
+        Searches nested multipart parts for text/plain, falls back to
+        HTML converted to text, and decodes at most max_body_bytes.
+        """
+        return extract_body(payload, self.max_body_bytes)
 
     def add_label(self, email_id: str, label_name: str) -> bool:
         """
@@ -208,11 +447,11 @@ class GmailHelper:
             label_id = self._get_or_create_label(label_name)
 
             # Add label to message
-            self.service.users().messages().modify(
+            self._execute('messages.modify', self.service.users().messages().modify(
                 userId='me',
                 id=email_id,
                 body={'addLabelIds': [label_id]}
-            ).execute()
+            ))
 
             return True
 
@@ -227,11 +466,11 @@ class GmailHelper:
             if not label_id:
                 return False
 
-            self.service.users().messages().modify(
+            self._execute('messages.modify', self.service.users().messages().modify(
                 userId='me',
                 id=email_id,
                 body={'removeLabelIds': [label_id]}
-            ).execute()
+            ))
 
             return True
 
@@ -239,24 +478,40 @@ class GmailHelper:
             print(f"Error removing label: {e}")
             return False
 
+    def get_label_ids(self, refresh: bool = False) -> Dict[str, str]:
+        """
+        All labels as {name: ID}.
+
+        Fetched once and cached - labels rarely change, and looking them
+        up for every add_label used to cost a labels.list call each time.
+        """
+        if self._label_ids is None or refresh:
+            results = self._execute('labels.list',
+                                    self.service.users().labels().list(userId='me'))
+            self._label_ids = {label['name']: label['id']
+                               for label in results.get('labels', [])}
+        return self._label_ids
+
     def _get_label_id(self, label_name: str) -> Optional[str]:
         """Get label ID by name."""
         try:
-            results = self.service.users().labels().list(userId='me').execute()
-            labels = results.get('labels', [])
-
-            for label in labels:
-                if label['name'] == label_name:
-                    return label['id']
-
-            return None
+            label_id = self.get_label_ids().get(label_name)
+            if label_id is None:
+                # Maybe created elsewhere since we cached the list
+                label_id = self.get_label_ids(refresh=True).get(label_name)
+            return label_id
 
         except Exception as e:
             print(f"Error getting label: {e}")
             return None
 
-    def _get_or_create_label(self, label_name: str) -> str:
+    def _get_or_create_label(self, label_name: str) -> Optional[str]:
         """Get existing label ID or create new label."""
+        # Locked so two threads can't both create the same label
+        with self._label_lock:
+            return self._get_or_create_label_locked(label_name)
+
+    def _get_or_create_label_locked(self, label_name: str) -> Optional[str]:
         # Try to get existing label
         label_id = self._get_label_id(label_name)
         if label_id:
@@ -264,29 +519,115 @@ class GmailHelper:
 
         # Create new label
         try:
-            label = self.service.users().labels().create(
+            label = self._execute('labels.create', self.service.users().labels().create(
                 userId='me',
                 body={
                     'name': label_name,
                     'labelListVisibility': 'labelShow',
                     'messageListVisibility': 'show'
                 }
-            ).execute()
+            ))
 
+            self.get_label_ids()[label_name] = label['id']
             return label['id']
 
         except Exception as e:
             print(f"Error creating label: {e}")
             return None
 
+    def add_label_to_thread(self, thread_id: str, label_name: str) -> bool:
+        """
+        Add a label to every message in a thread with one API call.
+        Creates the label if it doesn't exist.
+        """
+        try:
+            label_id = self._get_or_create_label(label_name)
+
+            self._execute('threads.modify', self.service.users().threads().modify(
+                userId='me',
+                id=thread_id,
+                body={'addLabelIds': [label_id]}
+            ))
+
+            return True
+
+        except Exception as e:
+            print(f"Error adding label to thread: {e}")
+            return False
+
+    def mark_thread_as_read(self, thread_id: str) -> bool:
+        """Mark every message in a thread as read."""
+        try:
+            self._execute('threads.modify', self.service.users().threads().modify(
+                userId='me',
+                id=thread_id,
+                body={'removeLabelIds': ['UNREAD']}
+            ))
+            return True
+        except Exception as e:
+            print(f"Error marking thread as read: {e}")
+            return False
+
+    def modify_thread(self, thread_id: str, add_label_ids: Optional[List[str]] = None,
+                      remove_label_ids: Optional[List[str]] = None) -> bool:
+        """Add and remove several labels (by ID) on every message of a thread in one call."""
+        try:
+            self._execute('threads.modify', self.service.users().threads().modify(
+                userId='me',
+                id=thread_id,
+                body={'addLabelIds': list(add_label_ids or []),
+                      'removeLabelIds': list(remove_label_ids or [])}
+            ))
+            return True
+        except Exception as e:
+            print(f"Error modifying thread: {e}")
+            return False
+
+    def modify_labels(self, email_id: str, add_label_ids: Optional[List[str]] = None,
+                      remove_label_ids: Optional[List[str]] = None) -> bool:
+        """Add and remove several labels (by ID) on one email in a single call."""
+        try:
+            self._execute('messages.modify', self.service.users().messages().modify(
+                userId='me',
+                id=email_id,
+                body={'addLabelIds': list(add_label_ids or []),
+                      'removeLabelIds': list(remove_label_ids or [])}
+            ))
+            return True
+        except Exception as e:
+            print(f"Error modifying labels: {e}")
+            return False
+
+    def batch_modify(self, email_ids: List[str], add_label_ids: Optional[List[str]] = None,
+                     remove_label_ids: Optional[List[str]] = None) -> bool:
+        """
+        Apply the same label change to many emails at once.
+
+        Uses messages.batchModify (up to 1000 messages per call) - much
+        cheaper than one messages.modify per email.
+        """
+        try:
+            for start in range(0, len(email_ids), self.BATCH_MODIFY_LIMIT):
+                self._execute('messages.batchModify',
+                              self.service.users().messages().batchModify(
+                                  userId='me',
+                                  body={'ids': email_ids[start:start + self.BATCH_MODIFY_LIMIT],
+                                        'addLabelIds': list(add_label_ids or []),
+                                        'removeLabelIds': list(remove_label_ids or [])}
+                              ))
+            return True
+        except Exception as e:
+            print(f"Error modifying emails: {e}")
+            return False
+
     def mark_as_read(self, email_id: str) -> bool:
         """Mark an email as read."""
         try:
-            self.service.users().messages().modify(
+            self._execute('messages.modify', self.service.users().messages().modify(
                 userId='me',
                 id=email_id,
                 body={'removeLabelIds': ['UNREAD']}
-            ).execute()
+            ))
             return True
         except Exception as e:
             print(f"Error marking as read: {e}")
@@ -295,11 +636,11 @@ class GmailHelper:
     def mark_as_unread(self, email_id: str) -> bool:
         """Mark an email as unread."""
         try:
-            self.service.users().messages().modify(
+            self._execute('messages.modify', self.service.users().messages().modify(
                 userId='me',
                 id=email_id,
                 body={'addLabelIds': ['UNREAD']}
-            ).execute()
+            ))
             return True
         except Exception as e:
             print(f"Error marking as unread: {e}")
@@ -308,11 +649,11 @@ class GmailHelper:
     def archive_email(self, email_id: str) -> bool:
         """Archive an email (remove from inbox)."""
         try:
-            self.service.users().messages().modify(
+            self._execute('messages.modify', self.service.users().messages().modify(
                 userId='me',
                 id=email_id,
                 body={'removeLabelIds': ['INBOX']}
-            ).execute()
+            ))
             return True
         except Exception as e:
             print(f"Error archiving email: {e}")
@@ -321,11 +662,11 @@ class GmailHelper:
     def star_email(self, email_id: str) -> bool:
         """Star an email."""
         try:
-            self.service.users().messages().modify(
+            self._execute('messages.modify', self.service.users().messages().modify(
                 userId='me',
                 id=email_id,
                 body={'addLabelIds': ['STARRED']}
-            ).execute()
+            ))
             return True
         except Exception as e:
             print(f"Error starring email: {e}")
@@ -335,6 +676,9 @@ class GmailHelper:
         """
         Create a draft email.
 
+        To answer an email, use create_reply_drafts() instead: it keeps
+        the draft in the same conversation.
+
         Args:
             to: Recipient email address
             subject: Email subject
@@ -343,23 +687,91 @@ class GmailHelper:
         Returns:
             True if successful
         """
-        try:
-            message = MIMEText(body)
-            message['to'] = to
-            message['subject'] = subject
+        from email.mime.text import MIMEText
 
-            raw = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
+        message = MIMEText(body)
+        message['to'] = to
+        message['subject'] = subject
 
-            self.service.users().drafts().create(
-                userId='me',
-                body={'message': {'raw': raw}}
-            ).execute()
+        raw = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
+        return self.create_drafts([{'message': {'raw': raw}}])[0] is not None
 
-            return True
+    def create_drafts(self, drafts: List[Dict], workers: int = 8) -> List[Optional[str]]:
+        """
+        Create many drafts at once.
 
+        Requests run on several threads, each still waiting its turn on
+        the rate limiter (drafts.create costs 10 quota units).
+
+        Args:
+            drafts: Draft resources, e.g. from replies.build_reply()
+            workers: Drafts created in parallel
+
+        Returns:
+            The new draft IDs, in order (None where creation failed)
+        """
+        def create(draft):
+            try:
+                return self._execute('drafts.create', self.service.users().drafts().create(
+                    userId='me',
+                    body=draft
+                ))['id']
+            except Exception as e:
+                print(f"Error creating draft: {e}")
+                return None
+
+        if len(drafts) <= 1:
+            return [create(draft) for draft in drafts]
+        with ThreadPoolExecutor(max_workers=min(workers, len(drafts))) as pool:
+            return list(pool.map(tracing.propagate(create), drafts))
+
+    def create_reply_drafts(self, replies: List[tuple], workers: int = 8) -> Dict[str, Optional[str]]:
+        """
+        Save replies as drafts threaded under the emails they answer.
+
+        Args:
+            replies: (email, reply text) pairs
+            workers: Drafts created in parallel
+
+        Returns:
+            {email_id: draft ID, or None if it failed}
+        """
+        drafts, email_ids = [], []
+        for email, text in replies:
+            if not email.get('message_id'):
+                # e.g. emails read from the local index: fetch the headers
+                email = dict(email, **self._reply_headers(email['id']))
+            try:
+                drafts.append(build_reply(email, text))
+                email_ids.append(email['id'])
+            except ValueError as e:
+                print(f"Error building reply: {e}")
+
+        results = {email['id']: None for email, _ in replies}
+        results.update(zip(email_ids, self.create_drafts(drafts, workers)))
+        return results
+
+    def _reply_headers(self, email_id: str) -> Dict[str, str]:
+        """Threading headers of an email, read without downloading its body."""
+        try:
+            message = self._execute('messages.get', self.service.users().messages().get(
+                userId='me',
+                id=email_id,
+                format='metadata',
+                metadataHeaders=['Message-ID', 'References', 'Reply-To', 'From', 'Subject']
+            ))
         except Exception as e:
-            print(f"Error creating draft: {e}")
-            return False
+            print(f"Error fetching headers of {email_id}: {e}")
+            return {}
+        headers = message.get('payload', {}).get('headers', [])
+        return {'thread_id': message.get('threadId', ''),
+                'message_id': self._get_header(headers, 'Message-ID'),
+                'references': self._get_header(headers, 'References'),
+                'reply_to': self._get_header(headers, 'Reply-To')}
+
+
+metrics.registry.describe('agentsmith_search_total',
+                          'Searches answered from the local index or the Gmail API.')
 
 
 # Quick test when run directly
@@ -377,3 +789,4 @@ if __name__ == '__main__':
         print(f"   From: {email['from']}")
         print(f"   Preview: {email['snippet'][:60]}...")
         print()
+
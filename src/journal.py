@@ -0,0 +1,215 @@
+"""
+Journal - Resume interrupted runs without redoing work
+
+Processing a big backlog takes a while, and a crash (or Ctrl+C) halfway
+used to mean starting over: every email analyzed again (paying for the
+same Claude calls twice) and labels applied again.
+
+The journal is a write-ahead log: before the agent touches Gmail it
+writes down what it is about to do, and afterwards that it did it.
+
+    {"op": "analysis", "id": "18c3...", "analysis": {...}}
+    {"op": "plan",     "id": "18c3...", "actions": [["add_label", "Work"], ["mark_as_read"]]}
+    {"op": "done",     "id": "18c3...", "action": ["add_label", "Work"]}
+    {"op": "finished", "id": "18c3..."}
+
+On restart the agent:
+- skips emails that are finished
+- reuses recorded analyses instead of asking Claude again
+- replays only the planned actions that never completed
+
+Replaying is safe because every action is idempotent: adding a label
+an email already has, or marking a read email as read, changes nothing.
+
+Usage:
+    journal = Journal('.cache/inbox.journal')
+    agent.process_inbox(max_emails=500, auto_apply=True, journal=journal)
+"""
+
+import json
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+
+class Journal:
+    """Append-only JSONL log of analyses and Gmail actions."""
+
+    def __init__(self, path: str, fsync: bool = True):
+        """
+        Args:
+            path: Journal file (created, with its folder, if missing)
+            fsync: Force every record to disk before continuing. Slower,
+                   but nothing recorded is lost if the machine crashes.
+        """
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._analyses: Dict[str, Dict] = {}
+        self._plans: Dict[str, List[tuple]] = {}
+        self._done: Dict[str, set] = {}
+        self._finished: set = set()
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        torn = self._load()
+        self._file = open(path, 'a', encoding='utf-8')
+        if torn:
+            self._file.write('\n')
+
+    # ---- reading state ----
+
+    def is_finished(self, email_id: str) -> bool:
+        """True once all of the email's actions have been applied."""
+        return email_id in self._finished
+
+    def analysis(self, email_id: str) -> Optional[Dict]:
+        """The recorded analysis of an email, if any."""
+        return self._analyses.get(email_id)
+
+    def has_plan(self, email_id: str) -> bool:
+        """True if actions were planned for the email (finished or not)."""
+        return email_id in self._plans or email_id in self._finished
+
+    def pending_actions(self, email_id: str) -> List[tuple]:
+        """Planned actions of an email that have not completed yet."""
+        done = self._done.get(email_id, set())
+        return [action for action in self._plans.get(email_id, []) if action not in done]
+
+    def unfinished(self) -> List[str]:
+        """IDs of emails with a plan that was never finished."""
+        return [email_id for email_id in self._plans if email_id not in self._finished]
+
+    # ---- writing state ----
+
+    def record_analysis(self, email_id: str, analysis: Dict):
+        self._analyses[email_id] = analysis
+        self._write({'op': 'analysis', 'id': email_id, 'analysis': analysis})
+
+    def record_plan(self, email_id: str, actions: List[tuple]):
+        actions = [tuple(action) for action in actions]
+        self._plans[email_id] = actions
+        self._write({'op': 'plan', 'id': email_id, 'actions': [list(a) for a in actions]})
+
+    def record_done(self, email_id: str, action: tuple):
+        self._done.setdefault(email_id, set()).add(tuple(action))
+        self._write({'op': 'done', 'id': email_id, 'action': list(action)})
+
+    def record_finished(self, email_id: str):
+        self._finished.add(email_id)
+        self._write({'op': 'finished', 'id': email_id})
+
+    def run_plan(self, email_id: str, actions: List[tuple],
+                 apply: Callable[[str, tuple], bool]) -> List[tuple]:
+        """
+        Apply an email's actions with write-ahead logging.
+
+        The plan is recorded first (unless one exists from an earlier run,
+        in which case only its pending actions run). Each action is marked
+        done once apply(email_id, action) returns True; the email is
+        finished when nothing is left pending.
+
+        Returns:
+            The actions that were applied now
+        """
+        if email_id in self._finished:
+            return []
+        if email_id not in self._plans:
+            self.record_plan(email_id, actions)
+
+        applied = []
+        for action in self.pending_actions(email_id):
+            if apply(email_id, action):
+                self.record_done(email_id, action)
+                applied.append(action)
+
+        if not self.pending_actions(email_id):
+            self.record_finished(email_id)
+        return applied
+
+    def replay(self, apply: Callable[[str, tuple], bool]) -> Dict[str, List[tuple]]:
+        """
+        Finish the plans of an interrupted run.
+
+        Returns:
+            {email_id: actions applied} for every email that was resumed
+        """
+        return {email_id: self.run_plan(email_id, [], apply) for email_id in self.unfinished()}
+
+    def compact(self):
+        """
+        Rewrite the file without history that is no longer needed.
+
+        Finished emails keep their analysis and finished marker; unfinished
+        ones keep everything. The new file replaces the old one atomically.
+        """
+        with self._lock:
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for email_id, analysis in self._analyses.items():
+                    f.write(self._line({'op': 'analysis', 'id': email_id, 'analysis': analysis}))
+                for email_id in self.unfinished():
+                    f.write(self._line({'op': 'plan', 'id': email_id,
+                                        'actions': [list(a) for a in self._plans[email_id]]}))
+                    for action in self._done.get(email_id, ()):
+                        f.write(self._line({'op': 'done', 'id': email_id, 'action': list(action)}))
+                for email_id in self._finished:
+                    f.write(self._line({'op': 'finished', 'id': email_id}))
+                f.flush()
+                os.fsync(f.fileno())
+
+            self._file.close()
+            os.replace(temp_path, self.path)
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+            self._plans = {k: v for k, v in self._plans.items() if k not in self._finished}
+            self._done = {k: v for k, v in self._done.items() if k not in self._finished}
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---- internals ----
+
+    def _write(self, record: Dict):
+        line = self._line(record)
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    @staticmethod
+    def _line(record: Dict) -> str:
+        return json.dumps(record, separators=(',', ':')) + '\n'
+
+    def _load(self) -> bool:
+        """Read the file back into memory. Returns True if the last line is incomplete."""
+        if not os.path.exists(self.path):
+            return False
+        line = '\n'
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave half a line at the end - ignore it
+                    continue
+
+                op, email_id = record.get('op'), record.get('id')
+                if op == 'analysis':
+                    self._analyses[email_id] = record['analysis']
+                elif op == 'plan':
+                    self._plans[email_id] = [tuple(a) for a in record['actions']]
+                elif op == 'done':
+                    self._done.setdefault(email_id, set()).add(tuple(record['action']))
+                elif op == 'finished':
+                    self._finished.add(email_id)
+        return not line.endswith('\n')
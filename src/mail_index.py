@@ -0,0 +1,339 @@
+"""
+Mail Index - Search synced mail locally, in milliseconds
+
+Every Gmail search is a messages.list call plus one messages.get per
+result. For searches the agent runs again and again (newsletters, VIP
+senders...) that is a lot of waiting and quota.
+
+The index is a SQLite database with a full-text (FTS5) table over the
+subject, sender, recipients, snippet and body of every synced email.
+mail_sync.py keeps it up to date; GmailHelper.search() answers queries
+from it whenever it can:
+
+    gmail = GmailHelper(index=MailIndex())
+    MailSync(gmail).sync()
+    gmail.search('from:newsletter OR subject:unsubscribe newer_than:7d')
+
+Supported Gmail operators: plain words, "exact phrases", from:, to:,
+subject:, label:, in:inbox/sent/starred/spam/trash, is:unread/read/
+starred/important, newer_than:/older_than: (d, m, y), OR, AND and
+-negation. Queries using anything else return None from search() and
+GmailHelper falls back to the Gmail API.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from email_record import EmailRecord
+
+DEFAULT_INDEX_PATH = os.path.join('.cache', 'mail_index.sqlite3')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT UNIQUE NOT NULL,
+    thread_id TEXT,
+    subject TEXT,
+    sender TEXT,
+    recipients TEXT,
+    date TEXT,
+    snippet TEXT,
+    body TEXT,
+    labels TEXT,            -- ' INBOX UNREAD Label_3 ' (padded for LIKE)
+    attachments TEXT,       -- JSON list
+    internal_date INTEGER   -- milliseconds since the epoch
+);
+CREATE INDEX IF NOT EXISTS messages_date ON messages (internal_date);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    subject, sender, recipients, snippet, body,
+    content='messages', content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+-- Keep the full-text table in step with the messages table
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, subject, sender, recipients, snippet, body)
+    VALUES (new.rowid, new.subject, new.sender, new.recipients, new.snippet, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, subject, sender, recipients, snippet, body)
+    VALUES ('delete', old.rowid, old.subject, old.sender, old.recipients, old.snippet, old.body);
+END;
+
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# Gmail's "in:" locations that are plain system labels
+_LOCATIONS = {'inbox': 'INBOX', 'sent': 'SENT', 'starred': 'STARRED',
+              'spam': 'SPAM', 'trash': 'TRASH', 'drafts': 'DRAFT', 'important': 'IMPORTANT'}
+
+_DAYS_PER_UNIT = {'d': 1, 'm': 30, 'y': 365}
+
+# Optional '-', optional 'operator:', then a "quoted phrase" or a bare word
+_TOKEN_RE = re.compile(r'(-?)(?:(\w+):)?("[^"]*"|[^\s"]+)')
+
+
+class UnsupportedQuery(Exception):
+    """The query uses syntax the index can't answer - ask Gmail instead."""
+
+
+def _fts_phrase(text: str) -> str:
+    """Quote text as one FTS5 phrase."""
+    return '"' + text.strip('"').replace('"', '""') + '"'
+
+
+def _like(text: str) -> str:
+    escaped = text.strip('"').lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+class MailIndex:
+    """SQLite full-text index of synced emails."""
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        """
+        Args:
+            path: Database file (':memory:' for a throwaway index)
+        """
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        # One connection shared by all threads, serialized by the lock
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    # ---- sync state ----
+
+    @property
+    def history_id(self) -> Optional[str]:
+        """Gmail history ID the index is up to date with (None before the first sync)."""
+        return self._get_meta('history_id')
+
+    @history_id.setter
+    def history_id(self, value: Optional[str]):
+        self._set_meta('history_id', value)
+
+    @property
+    def retry_ids(self) -> List[str]:
+        """Messages a sync couldn't download; the next sync fetches them first."""
+        return (self._get_meta('retry_ids') or '').split()
+
+    @retry_ids.setter
+    def retry_ids(self, value: List[str]):
+        self._set_meta('retry_ids', ' '.join(sorted(value)) or None)
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM messages').fetchone()[0]
+
+    # ---- writing ----
+
+    def upsert(self, email: Dict, internal_date: int = 0):
+        """Add an email to the index, replacing an older copy."""
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM messages WHERE id = ?', (email['id'],))
+            self._db.execute(
+                'INSERT INTO messages (id, thread_id, subject, sender, recipients, date, '
+                'snippet, body, labels, attachments, internal_date) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (email['id'], email.get('thread_id', ''), email.get('subject', ''),
+                 email.get('from', ''), email.get('to', ''), email.get('date', ''),
+                 email.get('snippet', ''), email.get('body', ''),
+                 self._pack_labels(email.get('labels') or []),
+                 json.dumps(list(email.get('attachments') or [])), int(internal_date)))
+
+    def set_labels(self, email_id: str, labels: List[str]):
+        """Update the labels of an indexed email (no-op if it isn't indexed)."""
+        with self._lock, self._db:
+            self._db.execute('UPDATE messages SET labels = ? WHERE id = ?',
+                             (self._pack_labels(labels), email_id))
+
+    def delete(self, email_id: str):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM messages WHERE id = ?', (email_id,))
+
+    def clear(self):
+        """Forget everything (used before a full resync)."""
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM messages')
+            self._db.execute('DELETE FROM meta')
+
+    # ---- reading ----
+
+    def contains(self, email_id: str) -> bool:
+        with self._lock:
+            return self._db.execute('SELECT 1 FROM messages WHERE id = ?',
+                                    (email_id,)).fetchone() is not None
+
+    def get(self, email_id: str) -> Optional[EmailRecord]:
+        """An indexed email; its body is read from the database when accessed."""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT id, thread_id, subject, sender, recipients, date, snippet, labels, '
+                'attachments FROM messages WHERE id = ?', (email_id,)).fetchone()
+        if row is None:
+            return None
+        return EmailRecord(
+            id=row[0], thread_id=row[1], subject=row[2], sender=row[3], to=row[4],
+            date=row[5], snippet=row[6], labels=row[7].split(),
+            attachments=json.loads(row[8]), body_loader=self.get_body)
+
+    def get_body(self, email_id: str) -> str:
+        with self._lock:
+            row = self._db.execute('SELECT body FROM messages WHERE id = ?',
+                                   (email_id,)).fetchone()
+        return row[0] if row else ''
+
+    def search(self, query: str, max_results: int = 10,
+               label_ids: Optional[Dict[str, str]] = None) -> Optional[List[str]]:
+        """
+        Message IDs matching a Gmail-style query, newest first.
+
+        Args:
+            query: Gmail search query
+            max_results: Maximum number of IDs to return
+            label_ids: {label name: ID}, needed for label: queries
+
+        Returns:
+            Matching IDs, or None if the query uses unsupported syntax
+        """
+        try:
+            where, params = self.compile_query(query, label_ids or {})
+        except UnsupportedQuery:
+            return None
+
+        sql = f'SELECT id FROM messages WHERE {where} ORDER BY internal_date DESC LIMIT ?'
+        with self._lock:
+            rows = self._db.execute(sql, params + [max_results]).fetchall()
+        return [row[0] for row in rows]
+
+    # ---- query parsing ----
+
+    def compile_query(self, query: str, label_ids: Dict[str, str]) -> Tuple[str, list]:
+        """
+        Translate a Gmail query into an SQL WHERE clause.
+
+        Terms are ANDed; OR joins the terms on either side of it.
+
+        Raises:
+            UnsupportedQuery: If the query can't be answered from the index
+        """
+        groups: List[List[Tuple[str, list]]] = []   # AND of ORs
+        join_next = False
+
+        for match in _TOKEN_RE.finditer(query):
+            negate, operator, value = match.groups()
+            if not operator and not negate and value in ('OR', '|'):
+                if not groups:
+                    raise UnsupportedQuery(query)
+                join_next = True
+                continue
+            if not operator and not negate and value == 'AND':
+                continue
+
+            sql, params = self._compile_term(operator, value, label_ids)
+            if negate:
+                sql = f'NOT ({sql})'
+            if join_next:
+                groups[-1].append((sql, params))
+                join_next = False
+            else:
+                groups.append([(sql, params)])
+
+        if join_next:
+            raise UnsupportedQuery(query)
+        if not groups:
+            return '1', []
+
+        clauses, params = [], []
+        for group in groups:
+            clauses.append('(' + ' OR '.join(sql for sql, _ in group) + ')')
+            for _, group_params in group:
+                params.extend(group_params)
+        return ' AND '.join(clauses), params
+
+    def _compile_term(self, operator: Optional[str], value: str,
+                      label_ids: Dict[str, str]) -> Tuple[str, list]:
+        operator = (operator or '').lower()
+        if '(' in value or ')' in value or '{' in value or '}' in value:
+            raise UnsupportedQuery(value)
+
+        if not operator:
+            return self._fts(_fts_phrase(value))
+        if operator == 'subject':
+            return self._fts('subject : ' + _fts_phrase(value))
+        if operator == 'from':
+            return "LOWER(sender) LIKE ? ESCAPE '\\'", [_like(value)]
+        if operator == 'to':
+            return "LOWER(recipients) LIKE ? ESCAPE '\\'", [_like(value)]
+
+        if operator == 'is':
+            value = value.lower()
+            if value == 'read':
+                return 'labels NOT LIKE ?', ['% UNREAD %']
+            if value in ('unread', 'starred', 'important'):
+                return 'labels LIKE ?', [f'% {value.upper()} %']
+        if operator == 'in' and value.lower() in _LOCATIONS:
+            return 'labels LIKE ?', [f'% {_LOCATIONS[value.lower()]} %']
+        if operator == 'label':
+            label_id = self._find_label(value.strip('"'), label_ids)
+            if label_id is None:
+                return '0', []          # Gmail finds nothing for unknown labels
+            return 'labels LIKE ?', [f'% {label_id} %']
+
+        if operator in ('newer_than', 'older_than'):
+            age = re.fullmatch(r'(\d+)([dmy])', value.lower())
+            if age:
+                cutoff_ms = int((time.time() - int(age.group(1))
+                                 * _DAYS_PER_UNIT[age.group(2)] * 86400) * 1000)
+                comparison = '>=' if operator == 'newer_than' else '<'
+                return f'internal_date {comparison} ?', [cutoff_ms]
+
+        raise UnsupportedQuery(f'{operator}:{value}')
+
+    @staticmethod
+    def _fts(match: str) -> Tuple[str, list]:
+        return 'rowid IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)', [match]
+
+    @staticmethod
+    def _find_label(name: str, label_ids: Dict[str, str]) -> Optional[str]:
+        """Gmail matches label: case-insensitively, with '-' standing for spaces and '/'."""
+        wanted = name.lower()
+        for label_name, label_id in label_ids.items():
+            simple = label_name.lower()
+            if wanted in (simple, simple.replace(' ', '-').replace('/', '-')):
+                return label_id
+        return None
+
+    # ---- internals ----
+
+    @staticmethod
+    def _pack_labels(labels: List[str]) -> str:
+        return ' ' + ' '.join(labels) + ' '
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: Optional[str]):
+        with self._lock, self._db:
+            if value is None:
+                self._db.execute('DELETE FROM meta WHERE key = ?', (key,))
+            else:
+                self._db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                                 (key, str(value)))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
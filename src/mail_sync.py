@@ -0,0 +1,172 @@
+"""
+Mail Sync - Keep the local index in step with Gmail
+
+The first sync downloads recent mail into the index (mail_index.py).
+After that, Gmail's history API tells us exactly what changed since the
+last sync - new messages, deleted ones, label changes - so keeping the
+index current costs a couple of API calls instead of re-downloading
+everything:
+
+    first run:   getProfile + messages.list + one messages.get per email
+    later runs:  history.list (+ messages.get for new mail only)
+
+A message that fails to download is remembered in the index and fetched
+again by the next sync, so one Gmail error can't hide it from search().
+
+Usage:
+    gmail = GmailHelper(index=MailIndex())
+    sync = MailSync(gmail)
+    sync.sync()          # call again whenever you want fresh results
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+import tracing
+from mail_index import MailIndex
+
+HISTORY_TYPES = ['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved']
+
+
+class MailSync:
+    """Initial and incremental sync from Gmail into a MailIndex."""
+
+    def __init__(self, gmail, index: Optional[MailIndex] = None,
+                 max_messages: int = 1000, workers: int = 8, query: str = ''):
+        """
+        Args:
+            gmail: GmailHelper to read from
+            index: Index to fill (default: gmail.index, created if missing)
+            max_messages: How many recent messages the first sync downloads
+            workers: Threads fetching messages in parallel
+            query: Gmail query limiting what the first sync downloads
+                   (e.g. 'newer_than:30d'); later syncs follow all changes
+        """
+        if index is None:
+            if gmail.index is None:
+                gmail.index = MailIndex()
+            index = gmail.index
+        self.gmail = gmail
+        self.index = index
+        self.max_messages = max_messages
+        self.workers = workers
+        self.query = query
+
+    def sync(self) -> Dict:
+        """
+        Bring the index up to date.
+
+        Returns:
+            Counts of what changed: {'mode', 'added', 'deleted', 'relabeled',
+            'failed', 'seconds'}; failed messages are retried by the next sync
+        """
+        start = time.perf_counter()
+        with tracing.start_span('mail_sync') as span:
+            stats = None
+            if self.index.history_id is not None:
+                stats = self._incremental_sync()
+            if stats is None:
+                stats = self._full_sync()
+            if span is not None:
+                span.set_attribute('mode', stats['mode'])
+
+        stats['seconds'] = round(time.perf_counter() - start, 3)
+        for change in ('added', 'deleted', 'relabeled'):
+            metrics.registry.inc('agentsmith_sync_messages_total', stats[change], change=change)
+        return stats
+
+    def _full_sync(self) -> Dict:
+        """Download the most recent messages into an empty index."""
+        # Note the history ID first: changes made while we download are
+        # picked up by the next incremental sync
+        history_id = self.gmail.get_profile()['historyId']
+        message_ids = self.gmail.list_message_ids(max_results=self.max_messages, query=self.query)
+
+        self.index.clear()
+        added, failed = self._fetch(message_ids)
+        self.index.retry_ids = failed
+        self.index.history_id = history_id
+        return {'mode': 'full', 'added': added, 'deleted': 0, 'relabeled': 0,
+                'failed': len(failed)}
+
+    def _incremental_sync(self) -> Optional[Dict]:
+        """Apply changes since the last sync; None if a full sync is needed."""
+        try:
+            records, history_id = self.gmail.list_history(self.index.history_id, HISTORY_TYPES)
+        except Exception as e:
+            # Gmail keeps history for about a week - after that, start over
+            if getattr(getattr(e, 'resp', None), 'status', None) == 404:
+                return None
+            raise
+
+        added, deleted, labels = set(), set(), {}
+        for record in records:
+            for change in record.get('messagesAdded', []):
+                added.add(change['message']['id'])
+                deleted.discard(change['message']['id'])
+            for change in record.get('messagesDeleted', []):
+                deleted.add(change['message']['id'])
+                added.discard(change['message']['id'])
+            for kind in ('labelsAdded', 'labelsRemoved'):
+                for change in record.get(kind, []):
+                    # Each change carries the message's labels after it
+                    message = change['message']
+                    labels[message['id']] = message.get('labelIds', [])
+
+        for message_id in deleted:
+            self.index.delete(message_id)
+        relabeled = 0
+        for message_id, label_ids in labels.items():
+            if message_id not in added and message_id not in deleted:
+                self.index.set_labels(message_id, label_ids)
+                relabeled += 1
+        # Messages an earlier sync failed to download are fetched again too
+        retry = set(self.index.retry_ids) - deleted
+        fetched, failed = self._fetch(sorted(added | retry))
+
+        self.index.retry_ids = failed
+        self.index.history_id = history_id
+        return {'mode': 'incremental', 'added': fetched, 'deleted': len(deleted),
+                'relabeled': relabeled, 'failed': len(failed)}
+
+    def _fetch(self, message_ids) -> Tuple[int, List[str]]:
+        """Download messages into the index; returns (how many were stored, IDs that failed)."""
+        def fetch(message_id):
+            try:
+                message = self.gmail.get_message(message_id)
+            except Exception as e:
+                # Deleted since it was listed - nothing left to fetch
+                if getattr(getattr(e, 'resp', None), 'status', None) == 404:
+                    return None
+                print(f"Error syncing email {message_id}: {e}")
+                return False
+            self.index.upsert(self.gmail._parse_message(message),
+                              internal_date=int(message.get('internalDate', 0)))
+            return True
+
+        if not message_ids:
+            return 0, []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(tracing.propagate(fetch), message_ids))
+        failed = [message_id for message_id, ok in zip(message_ids, results) if ok is False]
+        return sum(1 for ok in results if ok), failed
+
+
+metrics.registry.describe('agentsmith_sync_messages_total',
+                          'Messages added, deleted or relabeled in the local index by sync.')
+
+
+# Quick test when run directly
+if __name__ == '__main__':
+    from gmail_helper import GmailHelper
+
+    gmail = GmailHelper(index=MailIndex())
+    print("🔄 Syncing...")
+    stats = MailSync(gmail).sync()
+    print(f"✅ {stats['mode']} sync: {stats['added']} added, {stats['deleted']} deleted, "
+          f"{stats['relabeled']} relabeled in {stats['seconds']}s")
+    if stats['failed']:
+        print(f"⚠️  {stats['failed']} emails couldn't be downloaded; the next sync retries them")
+    print(f"📚 {len(gmail.index)} emails indexed")
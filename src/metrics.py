@@ -0,0 +1,266 @@
+"""
+Metrics - Where does a run spend its time (and money)?
+
+A tiny, dependency-free metrics registry. GmailHelper and EmailAgent
+record into the shared `registry`:
+
+- agentsmith_gmail_request_seconds      latency of every Gmail API call
+- agentsmith_gmail_errors_total         failed Gmail calls, by error type
+- agentsmith_gmail_quota_units_total    Gmail quota units spent, by method
+- agentsmith_model_request_seconds      latency of every Claude call
+- agentsmith_model_errors_total         failed Claude calls, by error type
+- agentsmith_model_tokens_total         input/output tokens, by model and prompt type
+
+The web GUI serves them at /metrics in Prometheus text format, and CLI
+scripts print a summary when they finish:
+
+    import metrics
+    metrics.print_summary()
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Gmail API quota units per method (https://developers.google.com/gmail/api/reference/quota)
+GMAIL_QUOTA_UNITS = {
+    'messages.list': 5,
+    'messages.get': 5,
+    'messages.modify': 5,
+    'messages.batchModify': 50,
+    'messages.attachments.get': 5,
+    'threads.list': 10,
+    'threads.get': 10,
+    'threads.modify': 10,
+    'labels.list': 1,
+    'labels.create': 5,
+    'drafts.create': 10,
+    'history.list': 2,
+    'getProfile': 1,
+}
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, like a Prometheus histogram."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self) -> List[int]:
+        total = 0
+        result = []
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+    def quantile(self, q: float) -> float:
+        """Estimated quantile (the upper bound of the bucket it falls in)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        for bound, cumulative in zip(self.buckets, self.cumulative()):
+            if cumulative >= rank:
+                return bound
+        return math.inf
+
+
+class MetricsRegistry:
+    """Thread-safe store of counters and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelSet, float]] = {}
+        self._histograms: Dict[str, Dict[LabelSet, Histogram]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str):
+        """Set the HELP text shown for a metric."""
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Add value to a counter."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """Record one value (usually seconds) in a histogram."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, error_counter: str = '', **labels) -> Iterator[None]:
+        """
+        Time a block of code into histogram `name`.
+
+        If the block raises and error_counter is given, that counter is
+        incremented with an extra error=<exception class> label.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            if error_counter:
+                self.inc(error_counter, error=type(e).__name__, **labels)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter_value(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+    def reset(self):
+        """Forget all recorded values (HELP texts are kept)."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                self._header(lines, name, 'counter')
+                for labels, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+            for name in sorted(self._histograms):
+                self._header(lines, name, 'histogram')
+                for labels, histogram in sorted(self._histograms[name].items()):
+                    for bound, cumulative in zip(histogram.buckets, histogram.cumulative()):
+                        le = labels + (('le', _format_value(bound)),)
+                        lines.append(f"{name}_bucket{_format_labels(le)} {cumulative}")
+                    inf = labels + (('le', '+Inf'),)
+                    lines.append(f"{name}_bucket{_format_labels(inf)} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """Human-readable summary of latencies, errors and token usage."""
+        lines = []
+        with self._lock:
+            for name in sorted(self._histograms):
+                lines.append(f"{_short_name(name)}:")
+                for labels, h in sorted(self._histograms[name].items()):
+                    label_text = ' '.join(v for _, v in labels) or '(all)'
+                    lines.append(
+                        f"  {label_text:<40} calls={h.count:<6} "
+                        f"avg={h.sum / h.count * 1000:>8.1f}ms  "
+                        f"p95<={_format_seconds(h.quantile(0.95))}"
+                    )
+            for name in sorted(self._counters):
+                lines.append(f"{_short_name(name)}:")
+                for labels, value in sorted(self._counters[name].items()):
+                    label_text = ' '.join(v for _, v in labels) or '(all)'
+                    lines.append(f"  {label_text:<40} {_format_value(value)}")
+        return "\n".join(lines)
+
+    def _header(self, lines: List[str], name: str, kind: str):
+        if name in self._help:
+            lines.append(f"# HELP {name} {self._help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+
+def _label_key(labels: Dict[str, str]) -> LabelSet:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: LabelSet) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        f'{k}="' + v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for k, v in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_seconds(seconds: float) -> str:
+    if math.isinf(seconds):
+        return '>60s'
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:g}s"
+
+
+def _short_name(name: str) -> str:
+    return name.replace('agentsmith_', '').replace('_', ' ')
+
+
+# The shared registry everything records into
+registry = MetricsRegistry()
+
+registry.describe('agentsmith_gmail_request_seconds', 'Latency of Gmail API calls by method.')
+registry.describe('agentsmith_gmail_errors_total', 'Failed Gmail API calls by method and error type.')
+registry.describe('agentsmith_gmail_quota_units_total', 'Gmail API quota units spent by method.')
+registry.describe('agentsmith_model_request_seconds',
+                  'Latency of Claude calls by model and prompt type.')
+registry.describe('agentsmith_model_errors_total',
+                  'Failed Claude calls by model, prompt type and error type.')
+registry.describe('agentsmith_model_tokens_total',
+                  'Claude tokens by model, prompt type and direction (input/output).')
+
+
+def record_gmail_call(method: str):
+    """Context manager timing one Gmail API call and charging its quota."""
+    registry.inc('agentsmith_gmail_quota_units_total',
+                 GMAIL_QUOTA_UNITS.get(method, 5), method=method)
+    return registry.timer('agentsmith_gmail_request_seconds',
+                          error_counter='agentsmith_gmail_errors_total', method=method)
+
+
+def record_model_call(model: str, prompt_type: str):
+    """Context manager timing one Claude call."""
+    return registry.timer('agentsmith_model_request_seconds',
+                          error_counter='agentsmith_model_errors_total',
+                          model=model, prompt_type=prompt_type)
+
+
+def record_token_usage(model: str, prompt_type: str, usage):
+    """Count the tokens reported in response.usage."""
+    if usage is None:
+        return
+    registry.inc('agentsmith_model_tokens_total', getattr(usage, 'input_tokens', 0) or 0,
+                 model=model, prompt_type=prompt_type, direction='input')
+    registry.inc('agentsmith_model_tokens_total', getattr(usage, 'output_tokens', 0) or 0,
+                 model=model, prompt_type=prompt_type, direction='output')
+
+
+def print_summary():
+    """Print the metrics summary at the end of a CLI run (if anything was recorded)."""
+    text = registry.summary()
+    if text:
+        print("\n📈 Run metrics")
+        print("-" * 60)
+        print(text)
@@ -0,0 +1,228 @@
+"""
+MIME Parser - Pull readable text out of Gmail message payloads
+
+Real emails are trees of MIME parts, for example:
+
+    multipart/mixed
+    ├── multipart/alternative
+    │   ├── text/plain      <- what we want
+    │   └── text/html       <- fallback if there is no text/plain
+    └── application/pdf     <- attachment, skipped
+
+This module walks the whole tree, picks the best text part and decodes
+at most max_bytes of it, so a 5 MB newsletter costs no more than a short
+note. HTML-only mail is converted to plain text as it is decoded.
+"""
+
+import base64
+import codecs
+import re
+from html.parser import HTMLParser
+from typing import Dict, Iterator, List
+
+# Prompts only use the first 1000-1500 characters; the GUI shows a bit more
+DEFAULT_MAX_BODY_BYTES = 32 * 1024
+
+# Raw HTML is mostly markup, so read up to this many times the cap
+HTML_INPUT_FACTOR = 4
+
+# Base64 is decoded in blocks of this many characters (multiple of 4)
+_DECODE_BLOCK = 16 * 1024
+
+_CHARSET_RE = re.compile(r'charset\s*=\s*"?([\w.:-]+)"?', re.IGNORECASE)
+
+
+def extract_body(payload: Dict, max_bytes: int = DEFAULT_MAX_BODY_BYTES) -> str:
+    """
+    Extract the best plain-text body from a Gmail message payload.
+
+    Args:
+        payload: message['payload'] from messages.get(format='full')
+        max_bytes: Stop decoding after this many bytes of body text
+
+    Returns:
+        Body text (possibly truncated), or '' if the message has no text
+    """
+    plain = None
+    html = None
+    for part in iter_parts(payload):
+        if is_attachment(part) or not part.get('body', {}).get('data'):
+            continue
+        mime_type = part.get('mimeType', '').lower()
+        if mime_type == 'text/plain' and plain is None:
+            plain = part
+            break
+        if mime_type == 'text/html' and html is None:
+            html = part
+
+    if plain is not None:
+        return decode_part_text(plain, max_bytes)
+    if html is not None:
+        return html_part_to_text(html, max_bytes)
+    return ''
+
+
+def iter_parts(payload: Dict) -> Iterator[Dict]:
+    """Yield every part of a payload depth-first, the payload itself first."""
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        yield part
+        # Reversed so children come out in their original order
+        stack.extend(reversed(part.get('parts', [])))
+
+
+def is_attachment(part: Dict) -> bool:
+    """True for parts that are files rather than message text."""
+    if part.get('filename'):
+        return True
+    disposition = get_part_header(part, 'Content-Disposition')
+    return disposition.lower().startswith('attachment')
+
+
+def get_part_header(part: Dict, name: str) -> str:
+    """Value of a header on a MIME part ('' if missing)."""
+    for header in part.get('headers', []):
+        if header['name'].lower() == name.lower():
+            return header['value']
+    return ''
+
+
+def part_charset(part: Dict) -> str:
+    """Charset declared by a part's Content-Type (defaults to UTF-8)."""
+    match = _CHARSET_RE.search(get_part_header(part, 'Content-Type'))
+    charset = match.group(1) if match else 'utf-8'
+    try:
+        codecs.lookup(charset)
+    except LookupError:
+        charset = 'utf-8'
+    return charset
+
+
+def iter_decoded(data: str, max_bytes: int) -> Iterator[bytes]:
+    """
+    Decode base64url data block by block, stopping after max_bytes.
+
+    Only the base64 characters needed for max_bytes are ever decoded.
+    """
+    needed_chars = -(-max_bytes // 3) * 4  # 4 chars for every 3 bytes, rounded up
+    data = data[:needed_chars]
+    remaining = max_bytes
+
+    for start in range(0, len(data), _DECODE_BLOCK):
+        block = data[start:start + _DECODE_BLOCK]
+        block += '=' * (-len(block) % 4)
+        chunk = base64.urlsafe_b64decode(block)[:remaining]
+        remaining -= len(chunk)
+        yield chunk
+        if remaining <= 0:
+            break
+
+
+def iter_part_text(part: Dict, max_bytes: int) -> Iterator[str]:
+    """Decode a part's body to text incrementally, up to max_bytes."""
+    decoder = codecs.getincrementaldecoder(part_charset(part))(errors='replace')
+    for chunk in iter_decoded(part['body']['data'], max_bytes):
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    # A multi-byte character cut in half by the cap is simply dropped
+    # rather than flushed as a replacement character
+
+
+def decode_part_text(part: Dict, max_bytes: int = DEFAULT_MAX_BODY_BYTES) -> str:
+    """Decode a text part to a string, up to max_bytes."""
+    return ''.join(iter_part_text(part, max_bytes))
+
+
+def html_part_to_text(part: Dict, max_bytes: int = DEFAULT_MAX_BODY_BYTES) -> str:
+    """
+    Convert an HTML part to plain text while decoding it.
+
+    Decoding stops as soon as max_bytes of text have been produced.
+    """
+    converter = HTMLToText(max_chars=max_bytes)
+    for text in iter_part_text(part, max_bytes * HTML_INPUT_FACTOR):
+        converter.feed(text)
+        if converter.full:
+            break
+    converter.close()
+    return converter.text()
+
+
+class HTMLToText(HTMLParser):
+    """
+    Minimal streaming HTML to text converter.
+
+    Feed it HTML in pieces; it keeps only visible text, turns block
+    elements into line breaks and stops collecting at max_chars.
+    """
+
+    BLOCK_TAGS = {'p', 'div', 'br', 'tr', 'li', 'h1', 'h2', 'h3', 'h4',
+                  'h5', 'h6', 'table', 'blockquote', 'section', 'hr'}
+    SKIP_TAGS = {'script', 'style', 'head', 'title'}
+
+    def __init__(self, max_chars: int = DEFAULT_MAX_BODY_BYTES):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.length = 0
+        self._pieces: List[str] = []
+        self._skip_depth = 0
+
+    @property
+    def full(self) -> bool:
+        return self.length >= self.max_chars
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self._add('\n')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.BLOCK_TAGS:
+            self._add('\n')
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._add(' '.join(data.split()))
+
+    def _add(self, text: str):
+        if not text or self.full:
+            return
+        if text != '\n' and self._pieces and self._pieces[-1] not in ('\n', ''):
+            text = ' ' + text
+        text = text[:self.max_chars - self.length]
+        self._pieces.append(text)
+        self.length += len(text)
+
+    def text(self) -> str:
+        """The text collected so far, with blank lines collapsed."""
+        text = ''.join(self._pieces)
+        return re.sub(r'\n\s*\n+', '\n\n', text).strip()
+
+
+def list_attachments(payload: Dict) -> List[Dict]:
+    """
+    Describe the attachments of a message without downloading them.
+
+    Returns:
+        List of dictionaries with 'part_id', 'attachment_id', 'filename',
+        'mime_type' and 'size'. attachment_id is None for small files
+        Gmail sends inline with the message.
+    """
+    attachments = []
+    for part in iter_parts(payload):
+        if not is_attachment(part) or part.get('parts'):
+            continue
+        body = part.get('body', {})
+        attachments.append({
+            'part_id': part.get('partId', ''),
+            'attachment_id': body.get('attachmentId'),
+            'filename': part.get('filename', ''),
+            'mime_type': part.get('mimeType', 'application/octet-stream'),
+            'size': body.get('size', 0)
+        })
+    return attachments
@@ -0,0 +1,260 @@
+"""
+Model Calls - Keep going when Claude is busy
+
+Claude's API sometimes answers "overloaded" (529) or "slow down" (429),
+and a network hiccup can leave a request hanging. A single failed call
+used to mean a failed email, and a hung one stopped the whole run.
+
+Every EmailAgent call to Claude now goes through a ModelCallExecutor:
+
+- Deadline: each call gets a time budget (2 minutes by default) shared
+  by all its attempts; every attempt's HTTP timeout is what's left of it
+- Retries: temporary failures (429, 5xx, 529, timeouts, dropped
+  connections) are retried with exponential backoff plus random jitter,
+  waiting at least as long as the API's retry-after header asks
+- Circuit breaker: after several failures in a row the API is treated as
+  down for a while and calls fail at once instead of piling up; one
+  trial call then checks whether it is back
+
+Permanent errors (bad request, wrong API key) are not retried.
+
+Errors are recognized by their HTTP status code or class name, so this
+works with any client that raises anthropic-style errors (and without
+importing anthropic).
+
+Usage:
+    executor = ModelCallExecutor(max_attempts=4, deadline=120)
+    text = executor.call(lambda timeout: client.with_options(timeout=timeout).messages.create(...))
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional, TypeVar
+
+import metrics
+
+T = TypeVar('T')
+
+# HTTP status codes worth trying again (529 = Anthropic "overloaded")
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Exception class names that mean a temporary problem, for errors without a status
+RETRYABLE_ERRORS = {'APIConnectionError', 'APITimeoutError', 'RateLimitError',
+                    'InternalServerError', 'OverloadedError', 'ServiceUnavailableError',
+                    'TimeoutError', 'ConnectionError', 'ConnectionResetError',
+                    'ReadTimeout', 'ConnectTimeout', 'RemoteDisconnected'}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call's time budget ran out before it succeeded."""
+
+
+def status_code(error: Exception) -> Optional[int]:
+    """HTTP status of an API error, if it has one."""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for errors that may go away if we try again."""
+    status = status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the API asked us to wait (retry-after header), if any."""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        milliseconds = headers.get('retry-after-ms')
+        if milliseconds is not None:
+            return max(0.0, float(milliseconds) / 1000)
+        value = headers.get('retry-after')
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            # HTTP date form
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing service for a while.
+
+    closed     normal; `failure_threshold` failures in a row open it
+    open       calls are refused until `reset_timeout` seconds have passed
+    half-open  one trial call is let through: success closes the
+               circuit, failure opens it again
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, name: str = 'model'):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """True if a call may go ahead now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._set_state(self.HALF_OPEN)
+            if self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def retry_in(self) -> float:
+        """Seconds until the open circuit lets a trial call through."""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_running = False
+            if self.state != self.CLOSED:
+                self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == self.HALF_OPEN or \
+                    (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+    def _set_state(self, state: str):
+        self.state = state
+        metrics.registry.inc('agentsmith_circuit_transitions_total', circuit=self.name, state=state)
+        if state == self.OPEN:
+            print(f"⚡ {self.name} API failing - pausing calls for {self.reset_timeout:g}s")
+        elif state == self.CLOSED:
+            print(f"✅ {self.name} API is back")
+
+
+class ModelCallExecutor:
+    """Runs API calls with a deadline, retries and a circuit breaker."""
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 1.0, max_delay: float = 30.0,
+                 deadline: float = 120.0, breaker: Optional[CircuitBreaker] = None,
+                 sleep: Callable[[float], None] = time.sleep):
+        """
+        Args:
+            max_attempts: Tries per call, including the first
+            base_delay: Backoff before the first retry; doubles each time
+            max_delay: Longest backoff between tries
+            deadline: Seconds each call may take in total, retries included
+            breaker: Circuit breaker (share one between executors that call
+                     the same API); default: a new one
+            sleep: Sleep function (replaceable in tests)
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self._sleep = sleep
+        self._random = random.Random()
+
+    def call(self, func: Callable[[float], T], operation: str = 'call',
+             deadline: Optional[float] = None) -> T:
+        """
+        Call func(timeout) until it succeeds or we give up.
+
+        Args:
+            func: Makes the API call; gets the seconds left before the
+                  deadline and should use them as its request timeout
+            operation: Label for metrics (e.g. the prompt type)
+            deadline: Override the executor's deadline for this call
+
+        Raises:
+            CircuitOpenError: The API is considered down
+            DeadlineExceeded: Time ran out while retrying
+            The call's own error if it is permanent or the last attempt failed
+        """
+        give_up_at = time.monotonic() + (deadline if deadline is not None else self.deadline)
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                self._outcome(operation, 'deadline')
+                raise DeadlineExceeded(f"{operation} did not succeed within the deadline")
+            if not self.breaker.allow():
+                self._outcome(operation, 'shed')
+                raise CircuitOpenError(f"{self.breaker.name} API unavailable, "
+                                       f"retrying in {self.breaker.retry_in():.0f}s")
+
+            try:
+                result = func(remaining)
+            except Exception as e:
+                retryable = is_retryable(e)
+                if retryable:
+                    self.breaker.record_failure()
+                else:
+                    # The API answered; the request itself was wrong
+                    self.breaker.record_success()
+                if not retryable or attempt >= self.max_attempts:
+                    self._outcome(operation, 'failed')
+                    raise
+
+                delay = self._backoff(attempt, retry_after(e))
+                if time.monotonic() + delay >= give_up_at:
+                    self._outcome(operation, 'deadline')
+                    raise DeadlineExceeded(
+                        f"{operation} failed ({e}); no time left to retry") from e
+                metrics.registry.inc('agentsmith_model_retries_total', operation=operation,
+                                     reason=str(status_code(e) or type(e).__name__))
+                self._sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            self._outcome(operation, 'ok' if attempt == 1 else 'ok_after_retry')
+            return result
+
+    def _backoff(self, attempt: int, requested: Optional[float]) -> float:
+        """Full-jitter exponential backoff, but never less than retry-after."""
+        delay = self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if requested is not None:
+            delay = max(delay, requested)
+        return delay
+
+    @staticmethod
+    def _outcome(operation: str, outcome: str):
+        metrics.registry.inc('agentsmith_model_calls_total', operation=operation, outcome=outcome)
+
+
+metrics.registry.describe('agentsmith_model_calls_total',
+                          'Claude calls by final outcome (ok, ok_after_retry, failed, deadline, shed).')
+metrics.registry.describe('agentsmith_model_retries_total',
+                          'Claude call retries by operation and reason (status code or error type).')
+metrics.registry.describe('agentsmith_circuit_transitions_total',
+                          'Circuit breaker state changes by circuit and new state.')
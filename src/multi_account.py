@@ -0,0 +1,230 @@
+"""
+Multi-Account Runner - Triage many mailboxes on one machine
+
+One GmailHelper serves one mailbox (one token.json). To triage hundreds
+of mailboxes we spread accounts over a pool of processes - one per CPU
+core by default - and give each account its own Gmail quota limiter.
+
+Accounts live in a directory, one sub-directory per mailbox:
+
+    accounts/
+    ├── alice/
+    │   └── token.json
+    └── bob/
+        ├── token.json
+        └── credentials.json     <- optional, else the shared one is used
+
+Create each token.json once by running any example with that account.
+Workers never open a browser: accounts without a usable token are
+reported as failed.
+
+Usage:
+    python src/multi_account.py accounts/ --max-emails 50 --processes 8
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+from rate_limit import GMAIL_QUOTA_UNITS_PER_SECOND, RateLimiter
+
+
+class Account:
+    """Credentials of one mailbox."""
+
+    def __init__(self, name: str, token_file: str, credentials_file: str = 'credentials.json'):
+        self.name = name
+        self.token_file = token_file
+        self.credentials_file = credentials_file
+
+    def __repr__(self):
+        return f"<Account {self.name}>"
+
+
+def discover_accounts(accounts_dir: str,
+                      credentials_file: str = 'credentials.json') -> List[Account]:
+    """Find every sub-directory of accounts_dir that has a token.json."""
+    accounts = []
+    for name in sorted(os.listdir(accounts_dir)):
+        folder = os.path.join(accounts_dir, name)
+        token_file = os.path.join(folder, 'token.json')
+        if not os.path.isfile(token_file):
+            continue
+        own_credentials = os.path.join(folder, 'credentials.json')
+        accounts.append(Account(
+            name, token_file,
+            own_credentials if os.path.isfile(own_credentials) else credentials_file))
+    return accounts
+
+
+def default_agent_factory(account: Account, options: Dict):
+    """Build the agent for one account (runs inside the worker process)."""
+    from agent import EmailAgent
+    from analysis_memo import AnalysisMemo
+    from sender_profiles import SenderProfileStore
+    from gmail_helper import GmailHelper
+
+    gmail = GmailHelper(
+        credentials_file=account.credentials_file,
+        token_file=account.token_file,
+        rate_limiter=RateLimiter(options['quota_units_per_second']),
+        # Workers can't show a browser (and nobody sees their output)
+        interactive=False,
+    )
+    # Fail now, with a clear error, if the token can't be used as it is
+    gmail._get_credentials()
+    # Each account keeps its own analysis memory, next to its token
+    folder = os.path.dirname(account.token_file)
+    return EmailAgent(gmail=gmail,
+                      memo=AnalysisMemo(os.path.join(folder, 'analysis_memo.jsonl')),
+                      profiles=SenderProfileStore(os.path.join(folder, 'sender_profiles.jsonl')))
+
+
+def process_account(account: Account, options: Dict,
+                    agent_factory: Callable = default_agent_factory) -> Dict:
+    """Triage one mailbox and return a small, picklable summary."""
+    start = time.perf_counter()
+    summary = {
+        'account': account.name,
+        'processed': 0,
+        'actions': 0,
+        'failed_analyses': 0,
+        'categories': {},
+        'priorities': {},
+        'error': None,
+    }
+
+    try:
+        if not os.path.isfile(account.token_file):
+            raise FileNotFoundError(f"{account.token_file} not found - authorize this account first")
+
+        agent = agent_factory(account, options)
+        # Progress output from many processes would be unreadable
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = agent.process_inbox(max_emails=options['max_emails'],
+                                          auto_apply=options['auto_apply'],
+                                          workers=options.get('workers'))
+
+        categories, priorities = Counter(), Counter()
+        for result in results:
+            analysis = result['analysis']
+            if "error" in analysis:
+                summary['failed_analyses'] += 1
+                continue
+            categories[analysis.get('category', 'Unknown')] += 1
+            priorities[analysis.get('priority', 'unknown')] += 1
+            summary['actions'] += len(result['actions'])
+
+        summary['processed'] = len(results)
+        summary['categories'] = dict(categories)
+        summary['priorities'] = dict(priorities)
+
+    except Exception as e:
+        summary['error'] = f"{type(e).__name__}: {e}"
+
+    summary['seconds'] = round(time.perf_counter() - start, 2)
+    return summary
+
+
+def _process_group(accounts: List[Account], options: Dict,
+                   agent_factory: Callable) -> List[Dict]:
+    """Worker process entry point: handle a group of accounts one by one."""
+    return [process_account(account, options, agent_factory) for account in accounts]
+
+
+def run_accounts(accounts: List[Account], max_emails: int = 10, auto_apply: bool = False,
+                 processes: Optional[int] = None, accounts_per_worker: int = 1,
+                 quota_units_per_second: float = GMAIL_QUOTA_UNITS_PER_SECOND,
+                 workers: Optional[Dict[str, int]] = None,
+                 agent_factory: Callable = default_agent_factory) -> Dict:
+    """
+    Triage many mailboxes in parallel processes.
+
+    Args:
+        accounts: Mailboxes to process (see discover_accounts)
+        max_emails: Unread emails to process per account
+        auto_apply: Apply labels / mark as read
+        processes: Worker processes (default: number of CPU cores)
+        accounts_per_worker: Accounts handled by one task, one after another
+        quota_units_per_second: Gmail quota limit per account
+        workers: Pipeline threads per stage inside each account run
+        agent_factory: Picklable function (account, options) -> EmailAgent
+
+    Returns:
+        {'accounts': [per-account summaries], 'totals': {...}}
+    """
+    options = {
+        'max_emails': max_emails,
+        'auto_apply': auto_apply,
+        'quota_units_per_second': quota_units_per_second,
+        'workers': workers,
+    }
+    groups = [accounts[i:i + accounts_per_worker]
+              for i in range(0, len(accounts), accounts_per_worker)]
+
+    summaries = []
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as pool:
+        futures = [pool.submit(_process_group, group, options, agent_factory)
+                   for group in groups]
+        for future in as_completed(futures):
+            summaries.extend(future.result())
+
+    summaries.sort(key=lambda s: s['account'])
+    return {'accounts': summaries, 'totals': aggregate(summaries)}
+
+
+def aggregate(summaries: List[Dict]) -> Dict:
+    """Combine per-account summaries into totals."""
+    categories, priorities = Counter(), Counter()
+    for summary in summaries:
+        categories.update(summary['categories'])
+        priorities.update(summary['priorities'])
+    return {
+        'accounts': len(summaries),
+        'failed_accounts': sum(1 for s in summaries if s['error']),
+        'processed': sum(s['processed'] for s in summaries),
+        'actions': sum(s['actions'] for s in summaries),
+        'failed_analyses': sum(s['failed_analyses'] for s in summaries),
+        'categories': dict(categories.most_common()),
+        'priorities': dict(priorities.most_common()),
+    }
+
+
+def print_report(report: Dict):
+    """Print the result of run_accounts."""
+    for summary in report['accounts']:
+        if summary['error']:
+            print(f"❌ {summary['account']}: {summary['error']}")
+        else:
+            print(f"✅ {summary['account']}: {summary['processed']} emails, "
+                  f"{summary['actions']} actions in {summary['seconds']}s")
+
+    totals = report['totals']
+    print("\n" + "=" * 60)
+    print(f"Accounts: {totals['accounts']} ({totals['failed_accounts']} failed)")
+    print(f"Emails processed: {totals['processed']}  Actions: {totals['actions']}")
+    if totals['categories']:
+        print("Categories: " + ", ".join(f"{k}={v}" for k, v in totals['categories'].items()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Triage many Gmail accounts in parallel")
+    parser.add_argument('accounts_dir', help="Directory with one sub-directory per account")
+    parser.add_argument('--credentials', default='credentials.json',
+                        help="Shared OAuth client file (default: credentials.json)")
+    parser.add_argument('--max-emails', type=int, default=10)
+    parser.add_argument('--apply', action='store_true', help="Apply labels / mark as read")
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--accounts-per-worker', type=int, default=1)
+    args = parser.parse_args()
+
+    accounts = discover_accounts(args.accounts_dir, args.credentials)
+    print(f"🤖 Processing {len(accounts)} accounts...")
+    print_report(run_accounts(accounts, max_emails=args.max_emails, auto_apply=args.apply,
+                              processes=args.processes,
+                              accounts_per_worker=args.accounts_per_worker))
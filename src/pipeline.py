@@ -0,0 +1,144 @@
+"""
+Pipeline - Run fetch, analyze and act at the same time
+
+Processing an inbox one step after another leaves everything idle most
+of the time: while we wait for Claude, Gmail isn't being used, and vice
+versa. A pipeline runs every stage at once:
+
+    email IDs ──► [fetch x8] ──queue──► [analyze x4] ──queue──► [act x2] ──► results
+
+Each stage has its own worker threads. The queues between stages are
+bounded: when analysis falls behind, fetch workers wait instead of
+piling up emails in memory (backpressure). Total time approaches that of
+the slowest stage instead of the sum of all stages.
+
+Usage:
+    pipeline = Pipeline([
+        Stage('fetch', gmail.get_email, workers=8),
+        Stage('analyze', analyze, workers=4),
+    ])
+    results = pipeline.run(email_ids)
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Iterable, List, Optional
+
+import metrics
+import tracing
+
+_DONE = object()
+
+
+class Stage:
+    """One step of a pipeline: a function run by a pool of worker threads."""
+
+    def __init__(self, name: str, func: Callable, workers: int = 1, queue_size: int = 0):
+        """
+        Args:
+            name: Stage name (used in metrics and error messages)
+            func: Called with one item; returns the item for the next stage,
+                  or None to drop it
+            workers: Number of threads running this stage
+            queue_size: Capacity of this stage's input queue
+                        (default: twice the number of workers)
+        """
+        if workers < 1:
+            raise ValueError(f"Stage {name!r} needs at least one worker")
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue_size = queue_size or workers * 2
+
+
+class Pipeline:
+    """Connects stages with bounded queues and runs them concurrently."""
+
+    def __init__(self, stages: List[Stage]):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        self.errors: List[tuple] = []
+
+    def run(self, items: Iterable) -> List:
+        """
+        Push items through every stage.
+
+        Returns the outputs of the last stage, in the order the inputs were
+        given. Items whose stage function raised are dropped and recorded
+        in self.errors as (stage name, item, exception).
+        """
+        self.errors = []
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        results = {}
+        results_lock = threading.Lock()
+        threads = []
+
+        for index, stage in enumerate(self.stages):
+            inbox = queues[index]
+            outbox = queues[index + 1] if index + 1 < len(queues) else None
+            remaining = [stage.workers]  # workers of this stage still running
+            lock = threading.Lock()
+
+            def work(stage=stage, inbox=inbox, outbox=outbox, remaining=remaining, lock=lock,
+                     next_workers=self._next_workers(index)):
+                while True:
+                    entry = inbox.get()
+                    if entry is _DONE:
+                        break
+                    sequence, item = entry
+                    output = self._run_stage(stage, item)
+                    if output is None:
+                        continue
+                    if outbox is None:
+                        with results_lock:
+                            results[sequence] = output
+                    else:
+                        outbox.put((sequence, output))  # blocks when the next stage is behind
+
+                # The last worker of a stage to finish tells the next stage to stop
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last and outbox is not None:
+                    for _ in range(next_workers):
+                        outbox.put(_DONE)
+
+            for n in range(stage.workers):
+                thread = threading.Thread(target=tracing.propagate(work), daemon=True,
+                                          name=f"pipeline-{stage.name}-{n}")
+                thread.start()
+                threads.append(thread)
+
+        # Feed the first stage (blocks when it is full)
+        for sequence, item in enumerate(items):
+            queues[0].put((sequence, item))
+        for _ in range(self.stages[0].workers):
+            queues[0].put(_DONE)
+
+        for thread in threads:
+            thread.join()
+
+        return [results[sequence] for sequence in sorted(results)]
+
+    def _next_workers(self, index: int) -> int:
+        if index + 1 < len(self.stages):
+            return self.stages[index + 1].workers
+        return 0
+
+    def _run_stage(self, stage: Stage, item) -> Optional[object]:
+        start = time.perf_counter()
+        try:
+            return stage.func(item)
+        except Exception as e:
+            self.errors.append((stage.name, item, e))
+            print(f"⚠️ Pipeline stage '{stage.name}' failed: {e}")
+            return None
+        finally:
+            metrics.registry.observe('agentsmith_pipeline_stage_seconds',
+                                     time.perf_counter() - start, stage=stage.name)
+
+
+metrics.registry.describe('agentsmith_pipeline_stage_seconds',
+                          'Time spent per item in each pipeline stage.')
@@ -6,26 +6,8 @@ Think of prompts as "instructions" you give to the AI.
 """
 
 
-def get_email_analysis_prompt(email: dict) -> str:
-    """
-    Prompt for analyzing an email and deciding what to do with it.
-
-    This is the core "thinking" prompt for the agent.
-    """
-    return f"""You are an intelligent email management assistant. Analyze this email and provide structured recommendations.
-
-EMAIL DETAILS:
-Subject: {email['subject']}
-From: {email['from']}
-Date: {email['date']}
-Preview: {email['snippet']}
-
-Body:
-{email['body'][:1000]}
-
-TASK: Analyze this email and respond with a JSON object containing:
-
-1. "category": Choose ONE category that best fits:
+# The JSON fields every analysis prompt asks for
+ANALYSIS_FIELDS = """1. "category": Choose ONE category that best fits:
    - "Work" - Professional emails, projects, meetings
    - "Personal" - Friends, family, personal matters
    - "Finance" - Bills, banking, transactions
@@ -58,6 +40,73 @@ Respond ONLY with valid JSON, no other text:
 """
 
 
+def get_email_analysis_prompt(email: dict, sender_hint: str = '') -> str:
+    """
+    Prompt for analyzing an email and deciding what to do with it.
+
+    This is the core "thinking" prompt for the agent.
+
+    Args:
+        email: The email to analyze
+        sender_hint: Short history of how this sender's emails were
+                     classified before (see sender_profiles.py)
+    """
+    history = (f"\nSENDER HISTORY (how earlier emails were classified - if this one "
+               f"fits the pattern, keep \"reasoning\" to a few words):\n{sender_hint}\n"
+               if sender_hint else "")
+    return f"""You are an intelligent email management assistant. Analyze this email and provide structured recommendations.
+
+EMAIL DETAILS:
+Subject: {email['subject']}
+From: {email['from']}
+Date: {email['date']}
+Preview: {email['snippet']}
+
+Body:
+{email['body'][:1000]}
+{history}
+TASK: Analyze this email and respond with a JSON object containing:
+
+{ANALYSIS_FIELDS}"""
+
+
+def get_thread_analysis_prompt(thread: dict, max_body_chars: int = 3000) -> str:
+    """
+    Prompt for analyzing a whole conversation at once.
+
+    Messages are listed oldest first. When the conversation is long, the
+    newest messages keep their text and older ones are cut down.
+    """
+    messages = thread['messages']
+    per_message = max(200, max_body_chars // len(messages))
+
+    # Give any budget the newest messages don't use to older ones
+    budget = max_body_chars
+    bodies = []
+    for message in reversed(messages):
+        length = min(len(message['body']), max(per_message, budget))
+        bodies.append(message['body'][:length])
+        budget = max(0, budget - length)
+    bodies.reverse()
+
+    conversation = "\n\n".join([
+        f"--- Message {i} ---\nFrom: {m['from']}\nDate: {m['date']}\n\n{body}"
+        for i, (m, body) in enumerate(zip(messages, bodies), 1)
+    ])
+
+    return f"""You are an intelligent email management assistant. Analyze this email conversation and provide structured recommendations.
+
+CONVERSATION:
+Subject: {thread['subject']}
+Messages: {len(messages)}
+
+{conversation}
+
+TASK: Analyze the conversation as a whole (focus on where it stands now) and respond with a JSON object containing:
+
+{ANALYSIS_FIELDS}"""
+
+
 def get_reply_draft_prompt(email: dict, context: str = "") -> str:
     """
     Prompt for drafting a reply to an email.
@@ -85,14 +134,35 @@ Provide ONLY the email body text, no subject line or signatures:
 """
 
 
+def get_thread_reply_context(messages: list, max_body_chars: int = 1500) -> str:
+    """
+    Context for get_reply_draft_prompt listing the messages that arrived
+    after the one being answered, newest last.
+    """
+    per_message = max(200, max_body_chars // max(1, len(messages)))
+    later = "\n\n".join([
+        f"--- From: {m['from']} ({m['date']}) ---\n{m['body'][:per_message]}"
+        for m in messages
+    ])
+    return f"""LATER MESSAGES IN THIS CONVERSATION (the reply should take these into account):
+{later}"""
+
+
+def format_email_for_summary(email: dict) -> str:
+    """
+    The few lines of an email that summary prompts include.
+    """
+    return f"From: {email['from']}\nSubject: {email['subject']}\nPreview: {email['snippet']}"
+
+
 def get_summary_prompt(emails: list) -> str:
     """
     Prompt for summarizing multiple emails.
+
+    Every email is included - EmailAgent.summarize_inbox() splits large
+    inboxes into chunks before they get here.
     """
-    email_list = "\n\n".join([
-        f"From: {e['from']}\nSubject: {e['subject']}\nPreview: {e['snippet']}"
-        for e in emails[:10]  # Limit to 10 for token efficiency
-    ])
+    email_list = "\n\n".join([format_email_for_summary(e) for e in emails])
 
     return f"""You are an email assistant providing a daily inbox summary.
 
@@ -121,6 +191,86 @@ Keep it concise and actionable!
 """
 
 
+def get_chunk_summary_prompt(emails: list) -> str:
+    """
+    Prompt for summarizing one chunk of a large inbox (the "map" step).
+
+    The result is merged with other chunk summaries later, so we ask for
+    compact notes rather than a formatted report.
+    """
+    email_list = "\n\n".join([format_email_for_summary(e) for e in emails])
+
+    return f"""You are an email assistant summarizing one batch of emails from a larger inbox.
+
+EMAILS ({len(emails)}):
+{email_list}
+
+TASK: Write compact notes about this batch that will later be merged with notes about other batches.
+
+Group your notes under these headings, skipping any that are empty:
+URGENT: emails that need immediate attention (include sender and subject)
+WORK: brief points about work emails
+OTHER: brief points about everything else, grouped by theme (e.g. "12 shipping updates")
+
+Be terse - one short line per point.
+"""
+
+
+def get_merge_summary_prompt(summaries: list, total_emails: int = 0,
+                             intermediate: bool = False) -> str:
+    """
+    Prompt for merging partial summaries (the "reduce" step).
+
+    Args:
+        summaries: Partial summaries of separate batches of emails
+        total_emails: Number of emails covered by all summaries together
+        intermediate: True when the result will be merged again later
+    """
+    notes = "\n\n".join([
+        f"--- Batch {i} ---\n{summary}"
+        for i, summary in enumerate(summaries, 1)
+    ])
+
+    if intermediate:
+        return f"""You are an email assistant combining notes about several batches of emails.
+
+NOTES:
+{notes}
+
+TASK: Merge these notes into one set of compact notes, using the same headings
+(URGENT, WORK, OTHER). Combine duplicates and similar items (e.g. "30 CI alerts").
+Keep every urgent item. Be terse - one short line per point.
+"""
+
+    return f"""You are an email assistant providing a daily inbox summary.
+
+The inbox was too large for one pass, so it was summarized in batches.
+
+BATCH NOTES:
+{notes}
+
+TASK: Combine these notes into one brief, organized summary of the whole inbox.
+
+Format your response as:
+
+## 📧 Inbox Summary ({total_emails} emails)
+
+### 🔴 Urgent/Important
+- [List any emails that need immediate attention]
+
+### 💼 Work/Professional
+- [Brief points about work emails]
+
+### 📬 Other
+- [Brief points about other categories]
+
+### 💡 Recommended Actions
+- [2-3 suggested next steps]
+
+Keep it concise and actionable!
+"""
+
+
 def get_smart_filter_prompt(email: dict, user_rules: dict = None) -> str:
     """
     Prompt for deciding whether to filter/auto-archive an email.
@@ -0,0 +1,59 @@
+"""
+Rate Limiting - Stay under API quotas
+
+Gmail allows each user 250 quota units per second (a messages.get costs
+5 units, a batchModify 50 - see metrics.GMAIL_QUOTA_UNITS). Going faster
+just earns 429 errors, so GmailHelper can take a RateLimiter that makes
+callers wait for their turn instead.
+"""
+
+import threading
+import time
+
+# Gmail's per-user limit: https://developers.google.com/gmail/api/reference/quota
+GMAIL_QUOTA_UNITS_PER_SECOND = 250
+
+
+class RateLimiter:
+    """
+    Token bucket: `rate` tokens are added per second, up to `burst`.
+
+    Usage:
+        limiter = RateLimiter(rate=250)     # 250 quota units per second
+        limiter.acquire(5)                  # blocks until 5 units are free
+    """
+
+    def __init__(self, rate: float = GMAIL_QUOTA_UNITS_PER_SECOND, burst: float = None):
+        """
+        Args:
+            rate: Tokens added per second
+            burst: Bucket size - how much can be used at once (default: rate)
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst or rate
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Take tokens, sleeping until they are available.
+
+        Returns:
+            Seconds spent waiting
+        """
+        tokens = min(tokens, self.burst)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
@@ -0,0 +1,85 @@
+"""
+Replies - Build drafts that land in the right conversation
+
+A reply is more than "Re: " + subject. For Gmail (and every other mail
+program) to show it inside the original conversation it needs:
+
+- threadId: the Gmail thread it belongs to
+- In-Reply-To: the Message-ID of the email being answered
+- References: the conversation's earlier Message-IDs, plus that one
+- a subject that still matches (one "Re:", not "Re: Re: Re:")
+
+and it should go to the Reply-To address if the sender set one. Names
+and addresses are parsed with the standard library, so
+'"Smith, Anna" <anna@example.com>' stays one recipient.
+
+Usage:
+    draft = build_reply(email, "Thanks, see you Tuesday!")
+    gmail.create_drafts([draft])
+"""
+
+import base64
+import re
+from email.message import EmailMessage
+from email.utils import formataddr, getaddresses
+from typing import Dict, List, Optional
+
+# Keep References from growing without bound on very long conversations
+MAX_REFERENCES = 20
+
+_REPLY_PREFIX = re.compile(r'^\s*((re|aw|sv|antw)\s*:\s*)+', re.IGNORECASE)
+
+
+def reply_subject(subject: str) -> str:
+    """'Re: ' + subject, without stacking prefixes ('Re: RE: Aw: x' -> 'Re: x')."""
+    return 'Re: ' + _REPLY_PREFIX.sub('', subject or '').strip()
+
+
+def reply_recipients(email: Dict) -> List[str]:
+    """Who a reply goes to: the Reply-To addresses if set, else the sender."""
+    header = email.get('reply_to') or email.get('from', '')
+    return [formataddr((name, address)) for name, address in getaddresses([header]) if address]
+
+
+def reply_address(email: Dict) -> str:
+    """The first reply recipient's bare address ('' if there is none)."""
+    addresses = getaddresses([email.get('reply_to') or email.get('from', '')])
+    return next((address for _, address in addresses if address), '')
+
+
+def build_reply(email: Dict, body: str, from_address: Optional[str] = None) -> Dict:
+    """
+    A Gmail draft resource replying to an email.
+
+    Args:
+        email: The email being answered (needs its message_id for
+               threading; see GmailHelper.create_reply_drafts)
+        body: Plain-text reply
+        from_address: Sender to set (default: Gmail fills in your address)
+
+    Returns:
+        {'message': {'raw': ..., 'threadId': ...}} ready for drafts.create
+    """
+    recipients = reply_recipients(email)
+    if not recipients:
+        raise ValueError(f"No address to reply to in email {email.get('id')}")
+
+    message = EmailMessage()
+    message['To'] = ', '.join(recipients)
+    if from_address:
+        message['From'] = from_address
+    message['Subject'] = reply_subject(email.get('subject', ''))
+
+    message_id = (email.get('message_id') or '').strip()
+    if message_id:
+        references = (email.get('references') or '').split()
+        references = [ref for ref in references if ref != message_id][-(MAX_REFERENCES - 1):]
+        message['In-Reply-To'] = message_id
+        message['References'] = ' '.join(references + [message_id])
+    message.set_content(body)
+
+    raw = base64.urlsafe_b64encode(message.as_bytes()).decode('ascii')
+    draft = {'message': {'raw': raw}}
+    if email.get('thread_id'):
+        draft['message']['threadId'] = email['thread_id']
+    return draft
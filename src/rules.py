@@ -0,0 +1,422 @@
+"""
+Rules - Describe what to do with email in a file instead of code
+
+A rules file (JSON, or YAML if PyYAML is installed) lists conditions and
+actions:
+
+    {"rules": [
+      {"name": "vip",
+       "when": {"from": ["boss@company.com", "client@important.com"], "is": "unread"},
+       "then": ["star", {"add_label": "VIP"}]},
+
+      {"name": "important newsletters",
+       "when": {"any": [{"from": "newsletter"}, {"from": "noreply"}],
+                "analysis.priority": "high"},
+       "then": [{"add_label": "Newsletter-Important"}],
+       "stop": true},
+
+      {"name": "routine newsletters",
+       "when": {"any": [{"from": "newsletter"}, {"from": "noreply"}]},
+       "then": ["mark_as_read", {"add_label": "Newsletter"}, "archive"]}
+    ]}
+
+Conditions (all keys of a "when" must hold):
+    from, to, subject, body, snippet    text contains any of the given strings
+    from_regex, subject_regex, ...      text matches a regular expression
+    label / not_label                   email has (not) this label (name or ID)
+    is                                  unread, read, starred or important (a list: any of them)
+    analysis.<field>                    Claude's analysis field equals (any of) the value(s)
+    profile.category / profile.priority the sender's usual classification
+    profile.min_emails                  the sender has at least this many past emails
+    any / all / not                     combine conditions
+
+Actions: add_label, remove_label, mark_as_read, mark_as_unread, archive, star.
+A rule with "stop": true ends the evaluation for emails it matched.
+
+All rules are checked against a whole batch of emails in one pass. Text
+conditions are indexed, so each email is only tested against rules that
+can possibly match it - adding rules barely adds cost per email. Emails
+are only analyzed by Claude when a rule actually needs the analysis, and
+then all together. The result is one action plan, applied in batches (see
+action_planner.py).
+
+Usage:
+    rules = load_rules('rules.json')
+    result = rules.plan(emails, ActionPlanner(gmail), analyze_many=agent.analyze_emails)
+    ActionPlanner(gmail).apply(result.plan)
+"""
+
+import json
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from action_planner import ActionPlan, ActionPlanner
+from dedupe import normalize_sender
+
+TEXT_FIELDS = {'from': 'from', 'to': 'to', 'subject': 'subject',
+               'body': 'body', 'snippet': 'snippet'}
+
+# Rule action names -> planner actions (named after GmailHelper methods)
+ACTIONS = {
+    'add_label': 'add_label',
+    'remove_label': 'remove_label',
+    'mark_as_read': 'mark_as_read',
+    'mark_as_unread': 'mark_as_unread',
+    'archive': 'archive_email',
+    'star': 'star_email',
+}
+
+_IS_LABELS = {'unread': ('UNREAD', True), 'read': ('UNREAD', False),
+              'starred': ('STARRED', True), 'important': ('IMPORTANT', True)}
+
+
+class RuleError(ValueError):
+    """A rules file that can't be understood."""
+
+
+class NeedsAnalysis(Exception):
+    """Raised while matching when a condition needs an analysis we don't have yet."""
+
+
+class MessageContext:
+    """What conditions look at for one email; text fields are lowercased once."""
+
+    __slots__ = ('email', 'label_ids', 'profiles', 'analysis', '_text')
+
+    def __init__(self, email: Dict, label_ids: Dict[str, str], profiles=None,
+                 analysis: Optional[Dict] = None):
+        self.email = email
+        self.label_ids = label_ids
+        self.profiles = profiles
+        self.analysis = analysis
+        self._text: Dict[str, str] = {}
+
+    def text(self, field: str) -> str:
+        if field not in self._text:
+            self._text[field] = str(self.email.get(field) or '').lower()
+        return self._text[field]
+
+    def has_label(self, label: str) -> bool:
+        labels = self.email.get('labels') or []
+        return label in labels or self.label_ids.get(label) in labels
+
+    def get_analysis(self) -> Dict:
+        if self.analysis is None:
+            raise NeedsAnalysis()
+        return self.analysis
+
+    def sender_profile(self):
+        if self.profiles is None:
+            return None
+        return self.profiles.profile('addr:' + normalize_sender(self.email.get('from', '')))
+
+
+Condition = Callable[[MessageContext], bool]
+
+
+class Rule:
+    """One compiled rule."""
+
+    def __init__(self, index: int, data: Dict):
+        if not isinstance(data, dict) or not isinstance(data.get('then'), list):
+            raise RuleError(f"Rule #{index + 1} needs a 'then' list, e.g. \"then\": [\"star\"]")
+        self.index = index
+        self.name = str(data.get('name', f'rule {index + 1}'))
+        self.stop = bool(data.get('stop', False))
+        self.needs_analysis = False
+        try:
+            self.condition = self._compile(data.get('when', {}))
+            self.actions = [self._compile_action(item) for item in data['then']]
+        except RuleError as e:
+            raise RuleError(f"Rule '{self.name}': {e}") from None
+        self.anchors = self._anchors(data.get('when', {}))
+
+    def matches(self, context: MessageContext) -> bool:
+        return self.condition(context)
+
+    # ---- compiling conditions ----
+
+    def _compile(self, when) -> Condition:
+        """A dict of conditions, all of which must hold (cheap ones first)."""
+        if not isinstance(when, dict):
+            raise RuleError(f"conditions must be an object, got {when!r}")
+        compiled = [self._compile_one(key, value) for key, value in when.items()]
+        # Analysis conditions last: they may need a Claude call
+        compiled.sort(key=lambda item: item[1])
+        conditions = [condition for condition, _ in compiled]
+        if len(conditions) == 1:
+            return conditions[0]
+        return lambda context: all(condition(context) for condition in conditions)
+
+    def _compile_one(self, key: str, value) -> Tuple[Condition, int]:
+        """Returns (condition, cost rank)."""
+        if key == 'any':
+            options = [self._compile(item) for item in _as_list(value)]
+            return (lambda context: any(option(context) for option in options)), 1
+        if key == 'all':
+            options = [self._compile(item) for item in _as_list(value)]
+            return (lambda context: all(option(context) for option in options)), 1
+        if key == 'not':
+            inner = self._compile(value)
+            return (lambda context: not inner(context)), 1
+
+        if key in TEXT_FIELDS:
+            field, needles = TEXT_FIELDS[key], [str(v).lower() for v in _as_list(value)]
+            return (lambda context: any(n in context.text(field) for n in needles)), 0
+        if key.endswith('_regex') and key[:-6] in TEXT_FIELDS:
+            field = TEXT_FIELDS[key[:-6]]
+            try:
+                pattern = re.compile(str(value), re.IGNORECASE)
+            except re.error as e:
+                raise RuleError(f"bad {key}: {e}")
+            return (lambda context: pattern.search(context.text(field)) is not None), 0
+
+        if key in ('label', 'not_label'):
+            labels = [str(v) for v in _as_list(value)]
+            wanted = key == 'label'
+            return (lambda context: any(context.has_label(l) for l in labels) == wanted), 0
+        if key == 'is':
+            states = []
+            for item in _as_list(value):
+                if not isinstance(item, str) or item not in _IS_LABELS:
+                    raise RuleError(f"unknown is: {item!r} (use {', '.join(_IS_LABELS)})")
+                states.append(_IS_LABELS[item])
+            return (lambda context: any(context.has_label(label) == present
+                                        for label, present in states)), 0
+
+        if key.startswith('analysis.'):
+            self.needs_analysis = True
+            field, allowed = key[9:], _as_list(value)
+            return (lambda context: context.get_analysis().get(field) in allowed), 2
+
+        if key == 'profile.min_emails':
+            try:
+                minimum = int(value)
+            except (TypeError, ValueError):
+                raise RuleError(f"profile.min_emails must be a number, got {value!r}") from None
+
+            def has_history(context):
+                profile = context.sender_profile()
+                return profile is not None and profile.count >= minimum
+            return has_history, 1
+        if key in ('profile.category', 'profile.priority'):
+            attribute = 'categories' if key == 'profile.category' else 'priorities'
+            allowed = _as_list(value)
+
+            def usually(context):
+                profile = context.sender_profile()
+                return profile is not None and profile.count > 0 and \
+                    getattr(profile, attribute).most_common(1)[0][0] in allowed
+            return usually, 1
+
+        raise RuleError(f"unknown condition {key!r}")
+
+    @staticmethod
+    def _compile_action(item) -> tuple:
+        if isinstance(item, str):
+            name, argument = item, None
+        elif isinstance(item, dict) and len(item) == 1:
+            name, argument = next(iter(item.items()))
+        else:
+            raise RuleError(f"bad action {item!r}")
+        if name not in ACTIONS:
+            raise RuleError(f"unknown action {name!r} (use {', '.join(ACTIONS)})")
+        if name in ('add_label', 'remove_label'):
+            if not argument:
+                raise RuleError(f"{name} needs a label name")
+            return (ACTIONS[name], str(argument))
+        return (ACTIONS[name],)
+
+    @staticmethod
+    def _anchors(when: Dict) -> Optional[List[Tuple[str, str]]]:
+        """
+        (field, text) pairs at least one of which must appear for the rule
+        to match, or None if the rule has no such text condition.
+        """
+        for key, value in when.items():
+            if key in TEXT_FIELDS:
+                return [(TEXT_FIELDS[key], str(v).lower()) for v in _as_list(value)]
+
+        # {"any": [{"from": ...}, {"subject": ...}]} - one anchor per option
+        options = when.get('any')
+        if isinstance(options, list) and options:
+            anchors = []
+            for option in options:
+                option_anchors = Rule._anchors(option) if isinstance(option, dict) else None
+                if option_anchors is None:
+                    return None
+                anchors.extend(option_anchors)
+            return anchors
+        return None
+
+
+class _TextScanner:
+    """Finds every indexed string contained in a text with one regex scan."""
+
+    def __init__(self, terms: Dict[str, set]):
+        """terms: text -> indexes of the rules anchored on it"""
+        self.terms = terms
+        # Longest first, so each position reports its longest match...
+        ordered = sorted(terms, key=len, reverse=True)
+        self.pattern = re.compile('(?=(' + '|'.join(map(re.escape, ordered)) + '))')
+        # ...and shorter terms that are a prefix of it are added from here
+        self.prefixes = {term: [other for other in ordered
+                                if other != term and term.startswith(other)]
+                         for term in ordered}
+
+    def scan(self, text: str) -> set:
+        found = set()
+        for match in self.pattern.finditer(text):
+            term = match.group(1)
+            if term in found:
+                continue
+            found.add(term)
+            found.update(self.prefixes[term])
+        rules = set()
+        for term in found:
+            rules |= self.terms[term]
+        return rules
+
+
+class RuleResult:
+    """What a rule set decided for a batch of emails."""
+
+    def __init__(self, plan: ActionPlan, matches: Dict[str, List[str]], analyzed: int):
+        self.plan = plan
+        self.matches = matches      # email ID -> names of the rules that matched
+        self.analyzed = analyzed    # emails that needed a Claude analysis
+
+    def rule_counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for names in self.matches.values():
+            for name in names:
+                counts[name] = counts.get(name, 0) + 1
+        return counts
+
+
+class RuleSet:
+    """A compiled list of rules, matched against batches of emails."""
+
+    def __init__(self, rules: List[Dict]):
+        self.rules = [Rule(index, data) for index, data in enumerate(rules)]
+        names = [rule.name for rule in self.rules]
+        duplicates = {name for name in names if names.count(name) > 1}
+        if duplicates:
+            raise RuleError(f"Duplicate rule names: {', '.join(sorted(duplicates))}")
+
+        # Index rules by their anchor texts; the rest are always checked
+        self._unanchored = set()
+        terms: Dict[str, Dict[str, set]] = {}
+        for rule in self.rules:
+            if rule.anchors is None:
+                self._unanchored.add(rule.index)
+                continue
+            for field, text in rule.anchors:
+                if not text:
+                    self._unanchored.add(rule.index)
+                    continue
+                terms.setdefault(field, {}).setdefault(text, set()).add(rule.index)
+        self._scanners = {field: _TextScanner(field_terms) for field, field_terms in terms.items()}
+
+    def __len__(self):
+        return len(self.rules)
+
+    def match(self, context: MessageContext) -> List[Rule]:
+        """
+        Rules matching one email, in file order.
+
+        Raises:
+            NeedsAnalysis: If a rule needs the analysis and the context has none
+        """
+        candidates = set(self._unanchored)
+        for field, scanner in self._scanners.items():
+            candidates |= scanner.scan(context.text(field))
+
+        matched = []
+        for index in sorted(candidates):
+            rule = self.rules[index]
+            if rule.matches(context):
+                matched.append(rule)
+                if rule.stop:
+                    break
+        return matched
+
+    def plan(self, emails: List[Dict], planner: ActionPlanner,
+             analyses: Optional[Dict[str, Dict]] = None,
+             analyze_many: Optional[Callable[[List[Dict]], Dict[str, Dict]]] = None,
+             profiles=None) -> RuleResult:
+        """
+        Match every rule against a batch of emails and plan the resulting actions.
+
+        Args:
+            emails: Emails to check
+            planner: ActionPlanner (skips actions that are already applied)
+            analyses: Analyses already known, by email ID
+            analyze_many: Function analyzing a list of emails at once, returning
+                          {id: analysis} (e.g. EmailAgent.analyze_emails); called
+                          once, only for emails an analysis.* condition needs
+            profiles: SenderProfileStore for profile.* conditions
+        """
+        analyses = dict(analyses or {})
+        label_ids = planner.label_ids()
+        if label_ids is None:
+            # label: conditions can't be checked; leave the batch for the next run
+            plan = ActionPlan()
+            plan.failed = [email['id'] for email in emails]
+            return RuleResult(plan, {}, 0)
+        contexts = [MessageContext(email, label_ids, profiles, analyses.get(email['id']))
+                    for email in emails]
+
+        matches: Dict[str, List[Rule]] = {}
+        waiting = []
+        for context in contexts:
+            try:
+                matches[context.email['id']] = self.match(context)
+            except NeedsAnalysis:
+                waiting.append(context)
+
+        # Second pass for emails whose rules need Claude's analysis
+        if waiting:
+            found = analyze_many([c.email for c in waiting]) if analyze_many else {}
+            for context in waiting:
+                analysis = found.get(context.email['id']) or {}
+                context.analysis = {} if "error" in analysis else analysis
+                matches[context.email['id']] = self.match(context)
+
+        items = []
+        for context in contexts:
+            actions = [action for rule in matches[context.email['id']] for action in rule.actions]
+            items.append((context.email, actions))
+
+        return RuleResult(planner.plan(items),
+                          {email_id: [rule.name for rule in rules]
+                           for email_id, rules in matches.items() if rules},
+                          len(waiting) if analyze_many else 0)
+
+
+def _as_list(value) -> list:
+    return value if isinstance(value, list) else [value]
+
+
+def load_rules(path: str) -> RuleSet:
+    """
+    Load and compile a rules file (.json, or .yaml/.yml with PyYAML installed).
+
+    The file holds either a list of rules or {"rules": [...]}.
+    """
+    with open(path, encoding='utf-8') as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise RuleError("YAML rules need PyYAML: pip install pyyaml "
+                                "(or write the rules as JSON)") from None
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+
+    if isinstance(data, dict):
+        data = data.get('rules', [])
+    if not isinstance(data, list):
+        raise RuleError(f"{path}: expected a list of rules")
+    return RuleSet(data)
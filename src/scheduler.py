@@ -0,0 +1,476 @@
+"""
+Scheduler - Run workflows on a timetable, one at a time
+
+Instead of an external cron job per script, the scheduler runs Python
+functions on cron-style schedules inside one long-running process:
+
+    scheduler = Scheduler()
+    scheduler.add('triage', '*/15 * * * *', triage)         # every 15 minutes
+    scheduler.add('summary', '0 8 * * mon-fri', summarize)   # weekdays at 8:00
+    scheduler.run_forever()
+
+Three things make it safe to run unattended:
+
+- Overlap protection: a job holds a lease (a small file under
+  .cache/locks/) while it runs. A second run of the same job - from this
+  process or another one started by mistake - is skipped instead of
+  doubling the API load and racing on labels. A lease left behind by a
+  crashed process expires after lease_ttl seconds.
+- Coalescing: if runs were missed (the machine slept, the last run took
+  longer than the interval, the process was restarted), the job runs
+  once to catch up, not once per missed slot. A slot that passed while
+  the job was still running is caught up as soon as that run finishes.
+- Jitter: each run starts up to `jitter` seconds late, at random, so many
+  accounts scheduled at the same minute don't hit Gmail and Claude at
+  the same moment.
+
+Schedules use the usual five cron fields - minute, hour, day of month,
+month, day of week - with *, lists (1,15), ranges (9-17), steps (*/10)
+and names (jan, mon), or one of @hourly, @daily, @weekly, @monthly.
+"""
+
+import json
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_STATE_PATH = os.path.join('.cache', 'scheduler.json')
+DEFAULT_LOCK_DIR = os.path.join('.cache', 'locks')
+
+ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+}
+
+_MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+_DAYS = ['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat']
+
+
+class CronSpec:
+    """A parsed cron expression that can find its next matching minute."""
+
+    # (name, lowest, highest, names for values starting at lowest)
+    FIELDS = [('minute', 0, 59, None), ('hour', 0, 23, None),
+              ('day of month', 1, 31, None), ('month', 1, 12, _MONTHS),
+              ('day of week', 0, 6, _DAYS)]
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        fields = ALIASES.get(expression.strip().lower(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron spec needs 5 fields (minute hour day month weekday): {expression!r}")
+
+        # Sunday may also be written as 7
+        fields[4] = ','.join('0' if part == '7' else part for part in fields[4].split(','))
+        (self.minutes, self.hours, self.days, self.months,
+         self.weekdays) = [self._parse(text, *field) for text, field in zip(fields, self.FIELDS)]
+        # Cron quirk: if both day fields are restricted, either may match
+        self._any_day = fields[2] != '*' and fields[4] != '*'
+
+    def __repr__(self):
+        return f"<CronSpec {self.expression!r}>"
+
+    @staticmethod
+    def _parse(text: str, name: str, lowest: int, highest: int, names) -> set:
+        def value(part):
+            if names and part.lower() in names:
+                return names.index(part.lower()) + lowest
+            try:
+                number = int(part)
+            except ValueError:
+                raise ValueError(f"Bad {name} in cron spec: {part!r}") from None
+            if not lowest <= number <= highest:
+                raise ValueError(f"{name} must be {lowest}-{highest}, got {number}")
+            return number
+
+        values = set()
+        for item in text.split(','):
+            item, _, step = item.partition('/')
+            if item == '*':
+                start, end = lowest, highest
+            elif '-' in item:
+                first, _, last = item.partition('-')
+                start, end = value(first), value(last)
+            else:
+                start = end = value(item)
+                if step:
+                    end = highest
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = (moment.isoweekday() % 7) in self.weekdays
+        return (day or weekday) if self._any_day else (day and weekday)
+
+    def next_after(self, moment: datetime) -> datetime:
+        """The first matching minute strictly after `moment`."""
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 5)
+        # Skip whole months, days and hours that can't match
+        while moment < limit:
+            if moment.month not in self.months:
+                year, month = (moment.year + 1, 1) if moment.month == 12 else (moment.year, moment.month + 1)
+                moment = moment.replace(year=year, month=month, day=1, hour=0, minute=0)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron spec never matches: {self.expression!r}")
+
+
+class Lease:
+    """
+    A lock file with an expiry time, shared by every process on the machine
+    (or on a shared disk).
+
+    Usage:
+        lease = Lease('.cache/locks/triage.lease', ttl=600)
+        if lease.acquire():
+            try: ...
+            finally: lease.release()
+    """
+
+    def __init__(self, path: str, ttl: float = 600):
+        """
+        Args:
+            path: Lease file
+            ttl: Seconds the lease stays valid without renew(); a holder
+                 that crashed loses it after this long
+        """
+        self.path = path
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    def holder(self) -> Optional[Dict]:
+        """The current lease record, or None if nobody holds a valid lease."""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if record.get('expires', 0) < time.time():
+            return None
+        return record
+
+    def acquire(self) -> bool:
+        """Take the lease if it is free or expired; False if someone else holds it."""
+        record = json.dumps({'owner': self.owner, 'expires': time.time() + self.ttl})
+        # Write the record first, then link it into place: the lease file
+        # appears complete or not at all, never empty
+        temp_path = self._temp_path()
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(record)
+        try:
+            os.link(temp_path, self.path)
+            return True
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_path)
+
+        # Expired (or ours): take it over - one process at a time, so two
+        # can't both see it expired and both win
+        with self._takeover():
+            current = self.holder()
+            if current is not None and current.get('owner') != self.owner:
+                return False
+            self._write(record)
+            return True
+
+    def renew(self) -> bool:
+        """Extend a lease we hold; False if it was lost."""
+        with self._takeover():
+            current = self.holder()
+            if current is None or current.get('owner') != self.owner:
+                return False
+            self._write(json.dumps({'owner': self.owner, 'expires': time.time() + self.ttl}))
+            return True
+
+    def release(self):
+        """Give the lease up (only if we still hold it)."""
+        with self._takeover():
+            current = self.holder()
+            if current is not None and current.get('owner') == self.owner:
+                try:
+                    os.remove(self.path)
+                except OSError:
+                    pass
+
+    @contextmanager
+    def _takeover(self):
+        """
+        Hold the lease's takeover lock while checking and replacing it.
+
+        An OS file lock, so the system drops it if its holder dies - no
+        leftover lock file to clean up.
+        """
+        fd = os.open(self.path + '.takeover', os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is None:
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+    def _temp_path(self) -> str:
+        return f"{self.path}.{self.owner.replace(':', '_')}.tmp"
+
+    def _write(self, record: str):
+        temp_path = self._temp_path()
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(record)
+        os.replace(temp_path, self.path)
+
+
+class Job:
+    """A function and its schedule."""
+
+    def __init__(self, name: str, spec: str, func: Callable[[], object],
+                 jitter: float = 0.0, lease: Optional[Lease] = None):
+        self.name = name
+        self.cron = CronSpec(spec)
+        self.func = func
+        self.jitter = jitter
+        self.lease = lease
+        self.next_run: Optional[float] = None   # scheduled slot (without jitter)
+        self.start_at: Optional[float] = None   # when it actually starts (with jitter)
+        self.last_run: Optional[float] = None   # slot of the last run
+        self.running = False
+        self.missed = False     # a slot passed while it was running
+
+    def __repr__(self):
+        return f"<Job {self.name} {self.cron.expression!r}>"
+
+
+class Scheduler:
+    """Runs jobs on cron schedules with leases, coalescing and jitter."""
+
+    def __init__(self, state_path: Optional[str] = DEFAULT_STATE_PATH,
+                 lock_dir: str = DEFAULT_LOCK_DIR, lease_ttl: float = 600,
+                 catch_up: bool = True, seed: Optional[int] = None):
+        """
+        Args:
+            state_path: JSON file remembering each job's last run, so runs
+                        missed while the process was down are noticed (None:
+                        don't remember)
+            lock_dir: Folder for the lease files
+            lease_ttl: Seconds a lease lasts; renewed while the job runs
+            catch_up: Run a job once at startup if it missed runs while the
+                      process was down
+            seed: Random seed for jitter (for repeatable tests)
+        """
+        self.state_path = state_path
+        self.lock_dir = lock_dir
+        self.lease_ttl = lease_ttl
+        self.catch_up = catch_up
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.jobs: Dict[str, Job] = {}
+        self._state = self._load_state()
+
+    def add(self, name: str, spec: str, func: Callable[[], object], jitter: float = 0.0) -> Job:
+        """
+        Schedule func() on a cron spec.
+
+        Args:
+            name: Unique job name (also names its lease file)
+            spec: Cron expression, e.g. '*/15 * * * *' or '@daily'
+            func: Function to call, without arguments
+            jitter: Start each run up to this many seconds late, at random
+        """
+        if name in self.jobs:
+            raise ValueError(f"Job already scheduled: {name}")
+        lease = Lease(os.path.join(self.lock_dir, f"{name}.lease"), self.lease_ttl)
+        job = Job(name, spec, func, jitter, lease)
+        job.last_run = self._state.get(name)
+
+        now = time.time()
+        missed = job.last_run is not None and \
+            self._next_slot(job, job.last_run) <= now
+        if missed and self.catch_up:
+            metrics.registry.inc('agentsmith_scheduler_runs_total', job=name, result='caught_up')
+            self._schedule(job, now)
+        else:
+            self._schedule(job, self._next_slot(job, now))
+        self.jobs[name] = job
+        return job
+
+    def run_pending(self, now: Optional[float] = None) -> List[str]:
+        """
+        Start every job that is due (each in its own thread).
+
+        Returns:
+            Names of the jobs started
+        """
+        now = time.time() if now is None else now
+        started = []
+        for job in list(self.jobs.values()):
+            with self._lock:
+                if job.start_at is None or job.start_at > now:
+                    continue
+                slot = job.next_run
+                # Every slot up to now is covered by this one run
+                self._schedule(job, self._next_slot(job, now))
+                if job.running:
+                    # Caught up once the current run finishes
+                    job.missed = True
+                    metrics.registry.inc('agentsmith_scheduler_runs_total',
+                                         job=job.name, result='coalesced')
+                    continue
+                job.running = True
+
+            thread = threading.Thread(target=self._run, args=(job, slot),
+                                      name=f"job-{job.name}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+            started.append(job.name)
+        self._threads = [t for t in self._threads if t.is_alive()]
+        return started
+
+    def run_now(self, name: str) -> bool:
+        """Run a job immediately in this thread; False if it was skipped."""
+        job = self.jobs[name]
+        with self._lock:
+            if job.running:
+                return False
+            job.running = True
+        return self._run(job, time.time())
+
+    def run_forever(self, poll_interval: float = 1.0):
+        """Run due jobs until stop() is called (or Ctrl+C)."""
+        print(f"⏰ Scheduler running {len(self.jobs)} job(s):")
+        for job in self.jobs.values():
+            print(f"   {job.name:<20} {job.cron.expression:<20} next: {self._format(job.start_at)}")
+        try:
+            while not self._stop.is_set():
+                self.run_pending()
+                self._stop.wait(poll_interval)
+        except KeyboardInterrupt:
+            print("\n👋 Scheduler stopped")
+        self.join()
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout: Optional[float] = None):
+        """Wait for running jobs to finish."""
+        for thread in list(self._threads):
+            thread.join(timeout)
+
+    # ---- internals ----
+
+    def _next_slot(self, job: Job, after: float) -> float:
+        return job.cron.next_after(datetime.fromtimestamp(after)).timestamp()
+
+    def _schedule(self, job: Job, slot: float):
+        job.next_run = slot
+        job.start_at = slot + (self._random.uniform(0, job.jitter) if job.jitter else 0)
+
+    def _run(self, job: Job, slot: float) -> bool:
+        try:
+            if not job.lease.acquire():
+                holder = job.lease.holder() or {}
+                print(f"⏭️  {job.name}: already running ({holder.get('owner', 'unknown')}), skipped")
+                metrics.registry.inc('agentsmith_scheduler_runs_total', job=job.name, result='locked')
+                return False
+
+            # Keep the lease while the job runs, however long that is
+            done = threading.Event()
+            renewer = threading.Thread(target=self._renew, args=(job.lease, done), daemon=True)
+            renewer.start()
+            try:
+                print(f"▶️  {job.name} started at {datetime.now():%Y-%m-%d %H:%M:%S}")
+                with metrics.registry.timer('agentsmith_scheduler_run_seconds', job=job.name):
+                    job.func()
+                result = 'ok'
+                print(f"✅ {job.name} finished")
+            except Exception as e:
+                result = 'error'
+                print(f"❌ {job.name} failed: {e}")
+            finally:
+                done.set()
+                renewer.join()
+                job.lease.release()
+
+            metrics.registry.inc('agentsmith_scheduler_runs_total', job=job.name, result=result)
+            job.last_run = slot
+            self._save_state(job.name, slot)
+            return result == 'ok'
+        finally:
+            with self._lock:
+                job.running = False
+                if job.missed:
+                    job.missed = False
+                    self._schedule(job, time.time())
+
+    def _renew(self, lease: Lease, done: threading.Event):
+        while not done.wait(lease.ttl / 3):
+            if not lease.renew():
+                print(f"⚠️  Lost lease {lease.path}")
+                return
+
+    def _load_state(self) -> Dict[str, float]:
+        if not self.state_path or not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error reading scheduler state: {e}")
+            return {}
+
+    def _save_state(self, name: str, slot: float):
+        if not self.state_path:
+            return
+        with self._lock:
+            self._state[name] = slot
+            folder = os.path.dirname(self.state_path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            temp_path = self.state_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._state, f, indent=2)
+            os.replace(temp_path, self.state_path)
+
+    @staticmethod
+    def _format(timestamp: Optional[float]) -> str:
+        return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S') if timestamp else '-'
+
+
+metrics.registry.describe('agentsmith_scheduler_runs_total',
+                          'Scheduled job runs by result (ok, error, locked, coalesced, caught_up).')
+metrics.registry.describe('agentsmith_scheduler_run_seconds',
+                          'Time taken by scheduled job runs.')
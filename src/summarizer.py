@@ -0,0 +1,200 @@
+"""
+Inbox Summarizer - Map-reduce summaries for inboxes of any size
+
+One prompt can only hold so many emails. To summarize hundreds or
+thousands of them we:
+
+1. MAP    - split the emails into chunks that fit a token budget and
+            summarize every chunk in parallel
+2. REDUCE - merge the partial summaries (in rounds, if there are many)
+            into one final summary
+
+Partial summaries are cached per chunk, so when one new email arrives
+only the chunk it lands in has to be summarized again. A chunk whose
+summary fails is left out rather than failing the whole summary.
+"""
+
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import prompts
+import tracing
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (Claude averages about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def chunk_boundary(email_id: str, average_size: int) -> bool:
+    """
+    Decide whether a chunk ends after this email.
+
+    The decision depends only on the email ID, so chunk edges stay put when
+    emails are added or removed elsewhere in the inbox. That is what keeps
+    the per-chunk cache useful.
+    """
+    digest = hashlib.sha1(email_id.encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], 'big') % average_size == 0
+
+
+def chunk_emails(emails: List[Dict], token_budget: int,
+                 average_size: int = 8) -> List[List[Dict]]:
+    """
+    Split emails into chunks that each fit within token_budget.
+
+    Emails are ordered by ID so the same inbox always produces the same
+    chunks, whatever order Gmail returned them in.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for email in sorted(emails, key=lambda e: e['id']):
+        tokens = estimate_tokens(prompts.format_email_for_summary(email))
+
+        if current and current_tokens + tokens > token_budget:
+            chunks.append(current)
+            current, current_tokens = [], 0
+
+        current.append(email)
+        current_tokens += tokens
+
+        if chunk_boundary(email['id'], average_size):
+            chunks.append(current)
+            current, current_tokens = [], 0
+
+    if current:
+        chunks.append(current)
+
+    return chunks
+
+
+class MapReduceSummarizer:
+    """
+    Summarizes any number of emails with a bounded number of model rounds.
+
+    Usage:
+        summarizer = MapReduceSummarizer(complete=agent._complete)
+        print(summarizer.summarize(emails))
+    """
+
+    def __init__(self, complete: Callable[[str, str], str], token_budget: int = 6000,
+                 max_workers: int = 4, max_cache_entries: int = 10000):
+        """
+        Args:
+            complete: Function (prompt, prompt_type) that asks Claude and returns the text
+            token_budget: Approximate input tokens allowed per prompt
+            max_workers: How many chunk summaries to request at once
+            max_cache_entries: Partial summaries to remember between runs
+        """
+        self.complete = complete
+        self.token_budget = token_budget
+        self.max_workers = max_workers
+        self.max_cache_entries = max_cache_entries
+        self._cache: Dict[str, str] = {}
+        # Chunks are summarized by several pool threads at once
+        self._cache_lock = threading.Lock()
+
+    def summarize(self, emails: List[Dict]) -> str:
+        """Summarize all emails, returning the final summary text."""
+        chunks = chunk_emails(emails, self.token_budget)
+
+        # Small inbox: a single prompt, same output as before
+        if len(chunks) == 1:
+            return self.complete(prompts.get_summary_prompt(chunks[0]), 'summary')
+
+        # MAP: summarize chunks in parallel
+        partials = self._parallel(self._summarize_chunk, chunks)
+        partials = [p for p in partials if p]
+        if not partials:
+            return ""
+
+        # REDUCE: merge partial summaries until they fit one prompt
+        while sum(estimate_tokens(p) for p in partials) > self.token_budget:
+            groups = self._group_partials(partials)
+            if len(groups) == len(partials):
+                break
+            merged = self._parallel(self._merge_group, groups)
+            partials = [p for p in merged if p]
+        if not partials:
+            return ""
+        if sum(estimate_tokens(p) for p in partials) > self.token_budget:
+            # Each partial is too big to pair up - shorten them to fit instead
+            partials = self._fit_budget(partials)
+
+        return self.complete(prompts.get_merge_summary_prompt(partials, len(emails)),
+                             'summary_merge')
+
+    def _summarize_chunk(self, chunk: List[Dict]) -> str:
+        """Summarize one chunk, reusing the cached result when unchanged."""
+        key = self._chunk_key(chunk)
+        with self._cache_lock:
+            cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            summary = self.complete(prompts.get_chunk_summary_prompt(chunk), 'summary_chunk')
+        except Exception as e:
+            print(f"⚠️  Skipping a chunk of {len(chunk)} emails: {e}")
+            return ""
+        if summary:
+            with self._cache_lock:
+                while len(self._cache) >= self.max_cache_entries:
+                    # Drop the oldest entry (dicts keep insertion order)
+                    self._cache.pop(next(iter(self._cache)))
+                self._cache[key] = summary
+        return summary
+
+    def _merge_group(self, group: List[str]) -> str:
+        """Merge a group of partial summaries into one intermediate summary."""
+        if len(group) == 1:
+            return group[0]
+        try:
+            return self.complete(prompts.get_merge_summary_prompt(group, intermediate=True),
+                                 'summary_merge')
+        except Exception as e:
+            print(f"⚠️  Skipping {len(group)} partial summaries that couldn't be merged: {e}")
+            return ""
+
+    def _fit_budget(self, partials: List[str]) -> List[str]:
+        """Cut every partial summary to an equal share of the token budget."""
+        share = max(1, self.token_budget // len(partials))
+        return [partial if estimate_tokens(partial) <= share
+                else partial[:share * 4 - 4].rstrip() + ' …'
+                for partial in partials]
+
+    def _group_partials(self, partials: List[str]) -> List[List[str]]:
+        """Pack partial summaries into groups that fit the token budget."""
+        groups = []
+        current = []
+        current_tokens = 0
+        for partial in partials:
+            tokens = estimate_tokens(partial)
+            if current and current_tokens + tokens > self.token_budget:
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(partial)
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+        return groups
+
+    def _parallel(self, func, items: list) -> list:
+        """Run func over items using a small thread pool, keeping order."""
+        if len(items) == 1:
+            return [func(items[0])]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(tracing.propagate(func), items))
+
+    @staticmethod
+    def _chunk_key(chunk: List[Dict]) -> str:
+        """Cache key covering everything the chunk prompt includes."""
+        digest = hashlib.sha1()
+        for email in chunk:
+            digest.update(prompts.format_email_for_summary(email).encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
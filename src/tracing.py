@@ -0,0 +1,285 @@
+"""
+Tracing - Follow one email through perceive -> think -> act
+
+Metrics tell you *that* runs are slow; traces tell you *why a particular
+email* was slow. Every processed email gets a span, with child spans for
+each Gmail call, each Claude call, JSON parsing and each action:
+
+    process_email                        1840 ms
+    ├── anthropic.messages.create        1790 ms
+    ├── parse_analysis                      1 ms
+    ├── action.add_label                   31 ms
+    │   └── gmail.messages.modify          30 ms
+    └── action.mark_as_read                18 ms
+
+Tracing is off unless an exporter is configured, either in code:
+
+    import tracing
+    tracing.configure(jsonl_path='traces.jsonl')
+    tracing.configure(otlp_endpoint='http://localhost:4318')
+
+or with environment variables (read on first use):
+
+    AGENTSMITH_TRACE_FILE=traces.jsonl
+    AGENTSMITH_OTLP_ENDPOINT=http://localhost:4318
+
+Spans use the OpenTelemetry (OTLP/JSON) format, so any OTLP collector
+(Jaeger, Tempo, the OpenTelemetry Collector...) can receive them.
+"""
+
+import atexit
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+SERVICE_NAME = 'agentsmith'
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('agentsmith_span', default=None)
+
+
+class Span:
+    """One timed operation in a trace."""
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start_ns',
+                 'end_ns', 'attributes', 'error')
+
+    def __init__(self, name: str, parent: Optional['Span'] = None, attributes: Dict = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else ''
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = dict(attributes or {})
+        self.error = ''
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_otlp(self) -> Dict:
+        """This span as an OTLP/JSON span object."""
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': 1,  # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            'status': {'code': 2, 'message': self.error} if self.error else {'code': 1},
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+class JsonlExporter:
+    """Appends one OTLP/JSON span per line to a file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None   # opened on the first span, kept open until shutdown()
+
+    def export(self, spans: List[Span]):
+        lines = ''.join(json.dumps(span.to_otlp()) + '\n' for span in spans)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(lines)
+            self._file.flush()
+
+    def shutdown(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class OtlpHttpExporter:
+    """
+    Sends spans to an OTLP/HTTP collector in batches.
+
+    Spans are queued and posted by a background thread every
+    flush_interval seconds (or when max_batch spans are waiting), so
+    tracing never adds network time to the traced code.
+    """
+
+    def __init__(self, endpoint: str, flush_interval: float = 2.0, max_batch: int = 512,
+                 timeout: float = 5.0):
+        self.url = endpoint.rstrip('/')
+        if not self.url.endswith('/v1/traces'):
+            self.url += '/v1/traces'
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._queue: List[Span] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='otlp-exporter', daemon=True)
+        self._thread.start()
+
+    def export(self, spans: List[Span]):
+        with self._lock:
+            self._queue.extend(spans)
+            if len(self._queue) >= self.max_batch:
+                self._wakeup.set()
+
+    def flush(self):
+        with self._lock:
+            batch, self._queue = self._queue, []
+        if not batch:
+            return
+        payload = {
+            'resourceSpans': [{
+                'resource': {'attributes': [_otlp_attribute('service.name', SERVICE_NAME)]},
+                'scopeSpans': [{
+                    'scope': {'name': SERVICE_NAME},
+                    'spans': [span.to_otlp() for span in batch],
+                }],
+            }]
+        }
+        request = urllib.request.Request(
+            self.url, data=json.dumps(payload).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+        except Exception as e:
+            # Losing traces is better than breaking the run
+            print(f"⚠️ Could not export {len(batch)} spans to {self.url}: {e}")
+
+    def shutdown(self):
+        self._stopped = True
+        self._wakeup.set()
+        self._thread.join(timeout=self.timeout)
+        self.flush()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+class Tracer:
+    """Creates spans and hands finished ones to the configured exporters."""
+
+    def __init__(self):
+        self.exporters = []
+        self._configured = False
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        if not self._configured:
+            self.configure_from_env()
+        return bool(self.exporters)
+
+    def configure(self, jsonl_path: Optional[str] = None, otlp_endpoint: Optional[str] = None):
+        """Replace the exporters (call with no arguments to turn tracing off)."""
+        with self._lock:
+            self.shutdown()
+            self.exporters = []
+            if jsonl_path:
+                self.exporters.append(JsonlExporter(jsonl_path))
+            if otlp_endpoint:
+                self.exporters.append(OtlpHttpExporter(otlp_endpoint))
+            self._configured = True
+
+    def configure_from_env(self):
+        self.configure(jsonl_path=os.getenv('AGENTSMITH_TRACE_FILE'),
+                       otlp_endpoint=os.getenv('AGENTSMITH_OTLP_ENDPOINT'))
+
+    def finish(self, span: Span):
+        span.end_ns = time.time_ns()
+        for exporter in self.exporters:
+            exporter.export([span])
+
+    def shutdown(self):
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+
+tracer = Tracer()
+atexit.register(tracer.shutdown)
+
+
+def configure(jsonl_path: Optional[str] = None, otlp_endpoint: Optional[str] = None):
+    """Send spans to a JSONL file and/or an OTLP/HTTP collector."""
+    tracer.configure(jsonl_path=jsonl_path, otlp_endpoint=otlp_endpoint)
+
+
+@contextmanager
+def start_span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """
+    Time a block of code as a span, nested under the current span.
+
+    Yields the Span (or None when tracing is off), so callers can add
+    attributes with span.set_attribute(...) when it is not None.
+    """
+    if not tracer.enabled:
+        yield None
+        return
+
+    span = Span(name, parent=_current_span.get(), attributes=attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        tracer.finish(span)
+
+
+def current_span() -> Optional[Span]:
+    """The innermost active span, if any."""
+    return _current_span.get()
+
+
+def set_attribute(key: str, value):
+    """Add an attribute to the current span (no-op when tracing is off)."""
+    span = _current_span.get()
+    if span is not None:
+        span.set_attribute(key, value)
+
+
+def propagate(func):
+    """
+    Wrap func so it runs inside the caller's trace context.
+
+    Worker threads don't inherit context variables; use this when handing
+    work to a thread pool so child spans keep their parent:
+
+        pool.map(tracing.propagate(work), items)
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return run
+
+
+def _otlp_attribute(key: str, value) -> Dict:
+    if isinstance(value, bool):
+        typed = {'boolValue': value}
+    elif isinstance(value, int):
+        typed = {'intValue': str(value)}
+    elif isinstance(value, float):
+        typed = {'doubleValue': value}
+    else:
+        typed = {'stringValue': str(value)}
+    return {'key': key, 'value': typed}
@@ -3,18 +3,30 @@ AgentSmith - Web-Based GUI
 Modern web interface for Email AI Agent
 """
 
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request
 import sys
 import os
+import gzip
+import hashlib
 import threading
 import json
 import webbrowser
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import lru_cache
+
+try:
+    import brotli  # Optional: smaller responses than gzip when installed
+except ImportError:
+    brotli = None
 
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
 from agent import EmailAgent
+from analysis_memo import AnalysisMemo
+from draft_cache import ReplyDrafter
+from sender_profiles import SenderProfileStore
+import metrics
 import prompts as prompt_module
 
 app = Flask(__name__)
@@ -22,9 +34,69 @@ app.config['SECRET_KEY'] = 'agentsmith-secret-key'
 
 # Global state
 agent = None
+drafter = None  # Writes replies in the background for emails that need one
 emails = []
+emails_by_id = {}
 analysis_results = {}
 
+# Responses smaller than this aren't worth compressing
+COMPRESS_MIN_SIZE = 500
+
+# Static content (prompt templates) never changes while the server runs
+STARTED_AT = datetime.now(timezone.utc).replace(microsecond=0)
+
+# Bumped whenever emails or analysis results change
+state_modified_at = STARTED_AT
+
+
+def mark_state_modified():
+    """Record that emails or analysis results changed (invalidates caches)"""
+    global state_modified_at
+    state_modified_at = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def cached_jsonify(payload, last_modified=None):
+    """
+    Build a JSON response that browsers can revalidate cheaply.
+
+    Adds an ETag and Last-Modified header and answers with
+    304 Not Modified when the client already has this exact payload.
+    """
+    response = jsonify(payload)
+    # Weak ETag: the same payload may be sent gzip'd, brotli'd or plain
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest(), weak=True)
+    response.last_modified = last_modified or state_modified_at
+    # Let the browser keep a copy, but always check with us before using it
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@app.after_request
+def compress_response(response):
+    """Compress JSON/HTML responses with brotli or gzip when the client accepts it"""
+    if (response.direct_passthrough
+            or not 200 <= response.status_code < 300
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in ('application/json', 'text/html')):
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli and accepted['br']:
+        response.set_data(brotli.compress(data))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    return response
+
 
 @app.route('/')
 def index():
@@ -35,10 +107,15 @@ def index():
 @app.route('/api/connect', methods=['POST'])
 def connect():
     """Connect to Gmail and Claude"""
-    global agent
+    global agent, drafter
     try:
         if not agent:
-            agent = EmailAgent()
+            # Clients are created lazily, so this only checks configuration;
+            # Gmail authenticates on the first fetch
+            new_agent = EmailAgent(memo=AnalysisMemo(), profiles=SenderProfileStore())
+            _ = new_agent.api_key  # raises if no key is configured
+            agent = new_agent
+            drafter = ReplyDrafter(agent)
         return jsonify({'success': True, 'message': 'Connected successfully!'})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
@@ -47,7 +124,7 @@ def connect():
 @app.route('/api/fetch_emails', methods=['POST'])
 def fetch_emails():
     """Fetch emails from Gmail"""
-    global agent, emails
+    global agent, emails, emails_by_id
     try:
         if not agent:
             return jsonify({'success': False, 'error': 'Not connected. Please connect first.'})
@@ -56,6 +133,8 @@ def fetch_emails():
         max_emails = data.get('max_emails', 30)
 
         emails = agent.gmail.get_unread_emails(max_results=max_emails)
+        emails_by_id = {email['id']: email for email in emails}
+        mark_state_modified()
 
         email_list = [{
             'id': email['id'],
@@ -73,11 +152,10 @@ def fetch_emails():
 @app.route('/api/email/<email_id>')
 def get_email(email_id):
     """Get email details"""
-    global emails
     try:
-        email = next((e for e in emails if e['id'] == email_id), None)
+        email = emails_by_id.get(email_id)
         if email:
-            return jsonify({'success': True, 'email': email})
+            return cached_jsonify({'success': True, 'email': dict(email)})
         else:
             return jsonify({'success': False, 'error': 'Email not found'})
     except Exception as e:
@@ -87,17 +165,20 @@ def get_email(email_id):
 @app.route('/api/analyze/<email_id>', methods=['POST'])
 def analyze_email(email_id):
     """Analyze a single email"""
-    global agent, emails, analysis_results
+    global agent, analysis_results
     try:
         if not agent:
             return jsonify({'success': False, 'error': 'Not connected'})
 
-        email = next((e for e in emails if e['id'] == email_id), None)
+        email = emails_by_id.get(email_id)
         if not email:
             return jsonify({'success': False, 'error': 'Email not found'})
 
         analysis = agent.analyze_email(email)
         analysis_results[email_id] = analysis
+        mark_state_modified()
+        # Start on the reply while the user reads the analysis
+        drafter.schedule(email, analysis)
 
         return jsonify({'success': True, 'analysis': analysis})
     except Exception as e:
@@ -112,24 +193,78 @@ def analyze_all():
         if not agent:
             return jsonify({'success': False, 'error': 'Not connected'})
 
+        # Near-duplicate emails share one analysis
+        analyses = agent.analyze_emails(emails)
+
         results = []
         for email in emails:
-            analysis = agent.analyze_email(email)
+            analysis = analyses[email['id']]
             analysis_results[email['id']] = analysis
             results.append({
                 'email_id': email['id'],
                 'analysis': analysis
             })
+        mark_state_modified()
+        # Replies for emails that need one are written in the background
+        drafter.schedule_many(emails, analyses)
 
         return jsonify({'success': True, 'results': results, 'count': len(results)})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
 
+@app.route('/api/draft/<email_id>')
+def get_draft(email_id):
+    """
+    Reply draft for an email: instant if it was written in the background.
+
+    ?wait=1 writes one now if none is ready; otherwise the status says
+    whether one is 'pending' (ask again shortly) or not started ('none').
+    """
+    try:
+        if not agent:
+            return jsonify({'success': False, 'error': 'Not connected'})
+
+        email = emails_by_id.get(email_id)
+        if not email:
+            return jsonify({'success': False, 'error': 'Email not found'})
+
+        draft = drafter.get(email, wait=request.args.get('wait') == '1')
+        if draft is None:
+            return jsonify({'success': True, 'status': drafter.status(email_id)})
+        return jsonify({'success': True, 'status': 'ready', 'reply': draft['reply'],
+                        'cached': draft['cached']})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+
+@app.route('/api/draft/<email_id>/save', methods=['POST'])
+def save_draft(email_id):
+    """Save a (possibly edited) reply as a Gmail draft in the email's conversation"""
+    try:
+        if not agent:
+            return jsonify({'success': False, 'error': 'Not connected'})
+
+        email = emails_by_id.get(email_id)
+        if not email:
+            return jsonify({'success': False, 'error': 'Email not found'})
+
+        reply = (request.json or {}).get('reply', '').strip()
+        if not reply:
+            return jsonify({'success': False, 'error': 'Reply is empty'})
+
+        draft_id = agent.gmail.create_reply_drafts([(email, reply)]).get(email_id)
+        if not draft_id:
+            return jsonify({'success': False, 'error': 'Could not save the draft'})
+        return jsonify({'success': True, 'draft_id': draft_id})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+
 @app.route('/api/prompts')
 def get_prompts():
     """Get available prompts"""
-    return jsonify({
+    return cached_jsonify({
         'success': True,
         'prompts': {
             'email_analysis': 'Email Analysis',
@@ -137,33 +272,53 @@ def get_prompts():
             'summary': 'Inbox Summary',
             'smart_filter': 'Smart Filter'
         }
-    })
+    }, last_modified=STARTED_AT)
+
+
+SAMPLE_EMAIL = {
+    'subject': 'Sample Subject',
+    'from': 'sample@example.com',
+    'body': 'Sample email body...',
+    'snippet': 'Sample snippet...',
+    'date': 'Today'
+}
+
+# Prompt types the preview endpoint knows
+PROMPT_PREVIEWS = {
+    'email_analysis': lambda: prompt_module.get_email_analysis_prompt(SAMPLE_EMAIL),
+    'reply_draft': lambda: prompt_module.get_reply_draft_prompt(SAMPLE_EMAIL),
+    'summary': lambda: prompt_module.get_summary_prompt([SAMPLE_EMAIL]),
+    'smart_filter': lambda: prompt_module.get_smart_filter_prompt(SAMPLE_EMAIL),
+}
+
+
+def render_prompt_preview(prompt_type):
+    """
+    Render a prompt template with a sample email.
+
+    Returns None for unknown prompt types - checked before the memoized
+    call, so arbitrary URLs can't grow the cache.
+    """
+    if prompt_type not in PROMPT_PREVIEWS:
+        return None
+    return _render_prompt_preview(prompt_type)
+
+
+@lru_cache(maxsize=len(PROMPT_PREVIEWS))
+def _render_prompt_preview(prompt_type):
+    # The sample never changes, so each preview is rendered once and memoized
+    return PROMPT_PREVIEWS[prompt_type]()
 
 
 @app.route('/api/prompt/<prompt_type>')
 def get_prompt(prompt_type):
     """Get a specific prompt template"""
     try:
-        sample_email = {
-            'subject': 'Sample Subject',
-            'from': 'sample@example.com',
-            'body': 'Sample email body...',
-            'snippet': 'Sample snippet...',
-            'date': 'Today'
-        }
-
-        if prompt_type == 'email_analysis':
-            prompt = prompt_module.get_email_analysis_prompt(sample_email)
-        elif prompt_type == 'reply_draft':
-            prompt = prompt_module.get_reply_draft_prompt(sample_email)
-        elif prompt_type == 'summary':
-            prompt = prompt_module.get_summary_prompt([sample_email])
-        elif prompt_type == 'smart_filter':
-            prompt = prompt_module.get_smart_filter_prompt(sample_email)
-        else:
+        prompt = render_prompt_preview(prompt_type)
+        if prompt is None:
             return jsonify({'success': False, 'error': 'Unknown prompt type'})
 
-        return jsonify({'success': True, 'prompt': prompt})
+        return cached_jsonify({'success': True, 'prompt': prompt}, last_modified=STARTED_AT)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -183,7 +338,7 @@ def get_stats():
         categories[cat] = categories.get(cat, 0) + 1
         priorities[pri] = priorities.get(pri, 0) + 1
 
-    return jsonify({
+    return cached_jsonify({
         'success': True,
         'stats': {
             'total_emails': len(emails),
@@ -194,6 +349,13 @@ def get_stats():
     })
 
 
+@app.route('/metrics')
+def get_metrics():
+    """Latency, error, quota and token metrics in Prometheus text format"""
+    return Response(metrics.registry.render_prometheus(),
+                    mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
 def open_browser():
     """Open browser after a short delay"""
     import time